@@ -0,0 +1,215 @@
+"""
+Styled ASS captions and the font setup used to burn them in.
+
+Captions are written as .ass files with the caption style in the file, so
+renders need no force_style and each output target gets a copy laid out on
+its own canvas (PlayResX/PlayResY = target size). Style sizes are given in
+the 288-unit SRT script scale used by Config (FontSize 20 = 20/288 of the
+reel height), so ASS and SRT captions render identically.
+
+Fonts come from Config.FONTS_DIR via the subtitles filter's fontsdir. When
+that directory has fonts, a minimal fonts.conf limits fontconfig to it and
+keeps its cache under the output directory; warm_font_cache() builds that
+cache once instead of on the first render.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional
+from config import Config
+import ffmpeg_runner
+import subtitles
+from output_targets import SRT_PLAY_RES_Y
+
+FONT_EXTENSIONS = {".ttf", ".otf", ".ttc"}
+
+@dataclass(frozen=True)
+class CaptionStyle:
+    font_name: str = "DejaVu Sans"
+    font_size: float = Config.CAPTION_FONT_SIZE  # Script units (of 288)
+    outline: float = Config.CAPTION_OUTLINE_WIDTH
+    shadow: float = 0
+    bold: bool = False
+    margin: Optional[float] = None  # Bottom margin as a fraction of the height (libass default if None)
+    side_margin: float = 10 / SRT_PLAY_RES_Y  # Left/right margin as a fraction of the height
+    upcoming_colour: str = "&H00A0A0A0"  # Karaoke words not yet spoken (SecondaryColour)
+
+    def for_target(self, target):
+        """This style with the target's caption margin."""
+        if target and target.caption_margin is not None:
+            return replace(self, margin=target.caption_margin)
+        return self
+
+    def ass_styles(self, play_res_y):
+        """Style lines for a script play_res_y units high: Default, and Box (opaque background)."""
+        units = play_res_y / SRT_PLAY_RES_Y
+        margin = self.margin if self.margin is not None else 10 / SRT_PLAY_RES_Y
+        fields = [
+            f"{self.font_size * units:.4g}",
+            "&H00FFFFFF", self.upcoming_colour, "&H00000000", "&H80000000",
+            "-1" if self.bold else "0", "0", "0", "0", "100", "100", "0", "0"
+        ]
+        placement = [
+            "2",
+            str(round(self.side_margin * play_res_y)),
+            str(round(self.side_margin * play_res_y)),
+            str(round(margin * play_res_y)),
+            "1"
+        ]
+        outline = f"{self.outline * units:.4g}"
+        shadow = f"{self.shadow * units:.4g}"
+        box_padding = f"{self.outline * units * 2:.4g}"
+        # BorderStyle 3 draws the outline colour as a box; OutlineColour is then the box colour
+        box_fields = fields[:3] + ["&H60000000", "&H60000000"] + fields[5:]
+        return [
+            "Style: " + ",".join(["Default", self.font_name, *fields, "1", outline, shadow, *placement]),
+            "Style: " + ",".join(["Box", self.font_name, *box_fields, "3", box_padding, "0", *placement])
+        ]
+
+def write_ass(cues, output_file, style=None, target=None):
+    """Write cues to an .ass file laid out for target (default: the 9:16 reel).
+
+    cues are subtitles.Cue objects or (start, end, text) tuples in seconds.
+    Text may contain ASS override tags; SRT line breaks become \\N.
+    """
+    style = (style or CaptionStyle()).for_target(target)
+    width, height = (target.width, target.height) if target else (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT)
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+        "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        *style.ass_styles(height),
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    for cue in subtitles.as_cues(cues):
+        text = cue.text.strip().replace("\r\n", "\n").replace("\n", "\\N")
+        lines.append(f"Dialogue: 0,{subtitles.ass_time(cue.start)},{subtitles.ass_time(cue.end)},Default,,0,0,0,,{text}")
+
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write("\n".join(lines) + "\n")
+    return str(output_path)
+
+def read_ass(ass_file):
+    """(start, end, text) cues of an .ass file's Dialogue events, in file order."""
+    with open(ass_file, 'r', encoding='utf-8-sig') as f:
+        return [(cue.start / 1000, cue.end / 1000, cue.text) for cue in subtitles.parse_ass(f.read())]
+
+def retarget(ass_file, target, output_file=None, style=None):
+    """Copy of an .ass caption file laid out for an output target (<name>.<target>.ass)."""
+    if output_file is None:
+        path = Path(ass_file)
+        output_file = path.with_name(f"{path.stem}.{target.name}{path.suffix}")
+    return write_ass(subtitles.read(ass_file), output_file, style, target)
+
+def is_ass(captions_file):
+    return Path(str(captions_file)).suffix.lower() in (".ass", ".ssa")
+
+def font_files(fonts_dir=None):
+    """Font files bundled in the fonts directory."""
+    directory = Path(fonts_dir or Config.FONTS_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() in FONT_EXTENSIONS)
+
+def configure_fontconfig(fonts_dir=None):
+    """Point fontconfig at the bundled fonts only (inherited by every ffmpeg run).
+
+    Returns the fonts.conf path, or None if there are no bundled fonts or
+    FONTCONFIG_FILE is already set.
+    """
+    configured = os.environ.get("FONTCONFIG_FILE")
+    if configured and configured != str(_fonts_conf_path()):
+        return None
+    if not font_files(fonts_dir):
+        return None
+    conf_path = _fonts_conf_path()
+    conf_path.parent.mkdir(parents=True, exist_ok=True)
+    config = (
+        '<?xml version="1.0"?>\n'
+        '<!DOCTYPE fontconfig SYSTEM "fonts.dtd">\n'
+        '<fontconfig>\n'
+        f'  <dir>{_xml_escape(os.path.abspath(fonts_dir or Config.FONTS_DIR))}</dir>\n'
+        f'  <cachedir>{_xml_escape(os.path.abspath(conf_path.parent / "cache"))}</cachedir>\n'
+        '</fontconfig>\n'
+    )
+    if not conf_path.exists() or conf_path.read_text(encoding='utf-8') != config:
+        conf_path.write_text(config, encoding='utf-8')
+    os.environ["FONTCONFIG_FILE"] = str(conf_path)
+    return str(conf_path)
+
+def warm_font_cache(ffmpeg_path=None, fonts_dir=None):
+    """Build the fontconfig cache for the bundled fonts once (per set of font files).
+
+    Renders one blank frame with a caption, so the first real render doesn't
+    pay for font discovery. Returns True if the cache is ready.
+    """
+    if not configure_fontconfig(fonts_dir):
+        return False
+    fonts = font_files(fonts_dir)
+    fingerprint = hashlib.sha256("|".join(
+        f"{p.name}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in fonts
+    ).encode('utf-8')).hexdigest()[:16]
+    marker = _fonts_conf_path().parent / f"warm-{fingerprint}"
+    if marker.exists():
+        return True
+
+    print(f"🔤 Building font cache for {len(fonts)} bundled fonts")
+    sample = _fonts_conf_path().parent / "warmup.ass"
+    write_ass([(0.0, 1.0, "Καλημέρα")], sample)
+    try:
+        ffmpeg_runner.run_ffmpeg(
+            [
+                '-f', 'lavfi', '-i', 'color=black:s=270x480:d=0.1',
+                '-vf', subtitles_filter(sample, fonts_dir=fonts_dir),
+                '-frames:v', '1',
+                '-f', 'null', '-'
+            ],
+            timeout=120,
+            ffmpeg_path=ffmpeg_path
+        )
+    except ffmpeg_runner.FFmpegError as e:
+        print(f"⚠️ Font cache warm-up failed: {e}")
+        return False
+    for old in marker.parent.glob("warm-*"):
+        old.unlink()
+    marker.touch()
+    return True
+
+def subtitles_filter(captions_file, force_style=None, fonts_dir=None):
+    """subtitles filter burning captions_file with the bundled fonts.
+
+    force_style only applies to SRT input; ASS files carry their own styles.
+    """
+    args = [f"subtitles='{escape_filter_path(captions_file)}'"]
+    directory = fonts_dir or Config.FONTS_DIR
+    if font_files(directory):
+        args.append(f"fontsdir='{escape_filter_path(os.path.abspath(directory))}'")
+    if force_style and not is_ass(captions_file):
+        args.append(f"force_style='{force_style}'")
+    return ":".join(args)
+
+def escape_filter_path(path):
+    """Escape a file path for use inside an ffmpeg filter argument."""
+    return str(path).replace('\\', '/').replace(':', '\\:')
+
+def _fonts_conf_path():
+    # fontconfig resolves a relative FONTCONFIG_FILE against its own config directory
+    return Path(os.path.abspath(Config.OUTPUT_DIR)) / ".fontconfig" / "fonts.conf"
+
+def _xml_escape(value):
+    return re.sub(r"[&<>]", lambda m: {"&": "&amp;", "<": "&lt;", ">": "&gt;"}[m.group()], value.replace('\\', '/'))
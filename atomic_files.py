@@ -0,0 +1,39 @@
+"""
+Write-then-rename file updates.
+
+Caches shared by render-pool threads and parallel batches are rewritten in
+place; writing to a temporary file next to the target and renaming it over
+the target means readers only ever see the old or the new contents, never a
+half-written file.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Open a temporary file to write path's new contents; it replaces path on a clean exit.
+
+    The directory of path is created if needed. On an exception the
+    temporary file is removed and path is left as it was.
+    """
+    path = str(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Unique per process and thread, so concurrent writers never share a temporary file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def save_json(path, data, **dump_args):
+    """Write data to path as JSON (json.dump keyword arguments pass through), atomically."""
+    with atomic_write(path) as f:
+        json.dump(data, f, **dump_args)
@@ -1,33 +1,42 @@
+import base64
 import requests
 import os
 from pathlib import Path
 from config import Config
+import karaoke
+import narration_length
+from media_probe import get_duration
+from ffmpeg_runner import FFmpegError
 
 class GreekAudioGenerator:
     def __init__(self):
         self.api_key = Config.ELEVENLABS_API_KEY
         self.voice_id = Config.ELEVENLABS_VOICE_ID
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = Config.ELEVENLABS_BASE_URL.rstrip('/')
         
         # Ensure output directory exists
         Path(Config.OUTPUT_DIR).mkdir(exist_ok=True)
     
-    def generate_audio(self, text, filename="audio.mp3", voice_settings=None):
-        """Generate Greek audio from text using ElevenLabs API."""
+    def generate_audio(self, text, filename="audio.mp3", voice_settings=None, timestamps=None):
+        """Generate Greek audio from text using ElevenLabs API.
+        
+        With timestamps (default: Config.ELEVENLABS_TIMESTAMPS) the with-timestamps
+        endpoint is used and the character alignment is saved next to the audio
+        (see karaoke.alignment_path), so captions need no separate timing pass.
+        """
+        if timestamps is None:
+            timestamps = Config.ELEVENLABS_TIMESTAMPS
         
         if not self.api_key or not self.voice_id:
             raise ValueError("ElevenLabs API key and Voice ID must be set in .env file")
         
         # Default voice settings optimized for Greek
         if voice_settings is None:
-            voice_settings = {
-                "stability": 0.4,
-                "similarity_boost": 0.75,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
+            voice_settings = Config.ELEVENLABS_VOICE_SETTINGS
         
         url = f"{self.base_url}/text-to-speech/{self.voice_id}"
+        if timestamps:
+            url += "/with-timestamps"
         
         headers = {
             "xi-api-key": self.api_key,
@@ -36,7 +45,7 @@ class GreekAudioGenerator:
         
         data = {
             "text": text,
-            "model_id": "eleven_multilingual_v2",
+            "model_id": Config.ELEVENLABS_MODEL_ID,
             "voice_settings": voice_settings
         }
         
@@ -46,10 +55,26 @@ class GreekAudioGenerator:
             response.raise_for_status()
             
             output_path = Path(Config.OUTPUT_DIR) / filename
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            alignment = None
+            if timestamps:
+                # JSON with base64 audio and per-character start/end times
+                payload = response.json()
+                audio = base64.b64decode(payload["audio_base64"])
+                alignment = payload.get("alignment") or payload.get("normalized_alignment")
+            else:
+                audio = response.content
             with open(output_path, "wb") as f:
-                f.write(response.content)
+                f.write(audio)
+            
+            # Never leave an alignment from an earlier take next to new audio
+            if alignment:
+                karaoke.save_alignment(alignment, output_path)
+            elif os.path.exists(karaoke.alignment_path(output_path)):
+                os.remove(karaoke.alignment_path(output_path))
             
             print(f"Ο ήχος αποθηκεύτηκε στο: {output_path}")
+            self._record_length(text, output_path, voice_settings, alignment)
             return str(output_path)
             
         except requests.exceptions.RequestException as e:
@@ -57,6 +82,22 @@ class GreekAudioGenerator:
             if hasattr(e.response, 'text'):
                 print(f"Λεπτομέρειες σφάλματος: {e.response.text}")
             return None
+        except (KeyError, ValueError) as e:
+            print(f"Σφάλμα στη δημιουργία ήχου: μη έγκυρη απάντηση με χρονισμούς ({e})")
+            return None
+    
+    def _record_length(self, text, audio_path, voice_settings, alignment=None):
+        """Teach the narration length model how long this voice took to say text."""
+        try:
+            if alignment and alignment.get("character_end_times_seconds"):
+                duration = alignment["character_end_times_seconds"][-1]
+            else:
+                duration = get_duration(audio_path)
+            error = narration_length.record_duration(text, duration, self.voice_id, voice_settings)
+        except (OSError, ValueError, KeyError, FFmpegError) as e:
+            print(f"⚠️ Could not record narration length: {e}")
+            return
+        print(f"⏱️ Διάρκεια αφήγησης: {duration:.1f}s (πρόβλεψη {duration - error:.1f}s)")
     
     def get_available_voices(self):
         """Get list of available voices from ElevenLabs."""
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from config import Config
+from atomic_files import save_json
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Serializes index updates between threads; the lock file does it between processes
+_index_lock = threading.Lock()
+# One lock per cache key, so threads missing on the same key build it once
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+class BackgroundCache:
+    """Content-addressed store for prepared background clips.
+
+    Entries are keyed by a hash of the source clip's bytes plus the settings
+    used to prepare it (duration, fps, resolution, crossfade, ...), so the same
+    beach clip prepared the same way is only ever encoded once. The directory
+    is capped at max_bytes; the least recently used entries are evicted first.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or Config.BACKGROUND_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = Config.BACKGROUND_CACHE_MAX_MB * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / self.INDEX_NAME
+
+    def source_hash(self, source):
+        """Hash the contents of a source clip, memoized on path, size and mtime."""
+        stat = os.stat(source)
+        fingerprint = f"{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+        index = self._load_index()
+        cached = index["sources"].get(fingerprint)
+        if cached:
+            return cached
+
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        with self._locked_index() as index:
+            index["sources"][fingerprint] = content_hash
+        return content_hash
+
+    def make_key(self, source, **settings):
+        """Build the cache key for a source clip prepared with the given settings."""
+        payload = {"source": self.source_hash(source), **settings}
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:32]
+
+    def get(self, key, suffix=".mp4"):
+        """Return the cached file for key, or None on a miss."""
+        path = self.cache_dir / f"{key}{suffix}"
+        if not path.exists():
+            return None
+
+        with self._locked_index() as index:
+            entry = index["entries"].setdefault(key, {"file": path.name, "size": path.stat().st_size})
+            entry["last_used"] = time.time()
+        return str(path)
+
+    def put(self, key, produced_file, suffix=".mp4", **meta):
+        """Move a freshly produced file into the cache and evict to the size cap."""
+        path = self.cache_dir / f"{key}{suffix}"
+        os.replace(produced_file, path)
+
+        with self._locked_index() as index:
+            index["entries"][key] = {
+                "file": path.name,
+                "size": path.stat().st_size,
+                "last_used": time.time(),
+                **meta
+            }
+        self.evict(keep=key)
+        return str(path)
+
+    def get_or_create(self, source, build, suffix=".mp4", **settings):
+        """Return the cached result for (source, settings), building it on a miss.
+
+        build is called with a temporary output path and must return a truthy
+        value once the file has been written.
+        """
+        key = self.make_key(source, **settings)
+        cached = self.get(key, suffix)
+        if cached:
+            print(f"♻️ Using cached background: {cached}")
+            return cached
+
+        with _build_locks_guard:
+            build_lock = _build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            # Another thread may have built it while this one waited
+            cached = self.get(key, suffix)
+            if cached:
+                print(f"♻️ Using cached background: {cached}")
+                return cached
+
+            partial = self.cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.partial{suffix}"
+            try:
+                if not build(str(partial)) or not partial.exists():
+                    return None
+                return self.put(key, str(partial), suffix, source=str(source), **settings)
+            finally:
+                if partial.exists():
+                    partial.unlink()
+
+    def entries(self, kind=None):
+        """Cached entries (optionally of one kind) whose files still exist, with their paths."""
+        found = []
+        for entry in self._load_index()["entries"].values():
+            path = self.cache_dir / entry["file"]
+            if (kind is None or entry.get("kind") == kind) and path.exists():
+                found.append({**entry, "path": str(path)})
+        return found
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        with self._locked_index() as index:
+            entries = index["entries"]
+            total = sum(entry.get("size", 0) for entry in entries.values())
+
+            for key in sorted(entries, key=lambda k: entries[k].get("last_used", 0)):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                entry = entries.pop(key)
+                total -= entry.get("size", 0)
+                try:
+                    (self.cache_dir / entry["file"]).unlink()
+                    print(f"🧹 Evicted cached background: {entry['file']}")
+                except OSError:
+                    pass
+                # Drop sidecar files (e.g. normalization markers) along with the clip
+                for sidecar in self.cache_dir.glob(f"{entry['file']}.*"):
+                    sidecar.unlink()
+
+    @contextmanager
+    def _locked_index(self):
+        """Read the index under the thread and file locks and save it back on exit.
+
+        Every read-modify-write goes through here, so concurrent renders
+        (threads or processes) never overwrite each other's entries.
+        """
+        with _index_lock, open(self.cache_dir / f"{self.INDEX_NAME}.lock", 'a+b') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                index = self._load_index()
+                yield index
+                self._save_index(index)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("sources", {})
+        index.setdefault("entries", {})
+        return index
+
+    def _save_index(self, index):
+        # Write-then-rename so a concurrent batch never reads a half-written index
+        save_json(self.index_path, index, ensure_ascii=False, indent=2)
@@ -0,0 +1,274 @@
+"""
+Indexed library of background clips.
+
+Scanning Config.ASSETS_DIR records each clip's duration, resolution, fps,
+codec, keyframe interval, average luminance, tags and whether a normalized
+(mezzanine) or looped derivative exists in an SQLite database. Rescans only
+probe files whose size or mtime changed, so selection logic can query the
+index instead of probing clips on every run.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import Config
+from background_cache import BackgroundCache
+import ffmpeg_runner
+import media_probe
+import mezzanine
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".mkv", ".webm"}
+LUMINANCE_SAMPLES = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    codec TEXT,
+    keyframe_interval REAL,
+    luminance REAL,
+    tags TEXT NOT NULL DEFAULT ',',
+    user_tags TEXT NOT NULL DEFAULT ',',
+    mezzanine TEXT,
+    looped INTEGER NOT NULL DEFAULT 0,
+    scanned_at REAL
+);
+CREATE INDEX IF NOT EXISTS clips_duration ON clips (duration);
+CREATE INDEX IF NOT EXISTS clips_shape ON clips (height, width);
+"""
+
+class BackgroundLibrary:
+    """SQLite index of the background clips under the assets directory.
+
+    Tags are stored as ",tag,tag," strings so queries can match them with
+    LIKE; tags derived from file and folder names are refreshed on every
+    change, tags added with add_tags() are kept.
+    """
+
+    def __init__(self, db_path=None, assets_dir=None, cache=None, ffmpeg_path=None, ffprobe_path=None):
+        self.db_path = db_path or Config.BACKGROUND_LIBRARY_PATH
+        self.assets_dir = Path(assets_dir or Config.ASSETS_DIR)
+        self.cache = cache or BackgroundCache()
+        self.ffmpeg_path = ffmpeg_path
+        self.probe = media_probe.get_probe(ffprobe_path)
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection per library, shared by render-pool threads under a lock
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.create_function("has_tag", 3, _has_tag, deterministic=True)
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Clips indexed before the probe used ffprobe's codec names still carry MP4 fourccs
+            db.executemany("UPDATE clips SET codec = ? WHERE codec = ?", [(name, fourcc) for fourcc, name in media_probe.MP4_CODECS.items()])
+
+    def scan(self):
+        """Index new and changed clips, drop deleted ones and refresh derivative flags."""
+        started = time.time()
+        seen = set()
+        probed = 0
+        derivatives = self._derivative_sources()
+
+        with self._connect() as db:
+            known = {row["path"]: row for row in db.execute("SELECT path, size, mtime_ns, user_tags FROM clips")}
+            for clip in self._clip_files():
+                path = clip.as_posix()
+                seen.add(path)
+                stat = clip.stat()
+                row = known.get(path)
+                if not row or row["size"] != stat.st_size or row["mtime_ns"] != stat.st_mtime_ns:
+                    try:
+                        info = self._analyze(clip)
+                    except (ffmpeg_runner.FFmpegError, ValueError, KeyError, OSError, StopIteration) as e:
+                        print(f"⚠️ Could not index {path}: {e}")
+                        continue
+                    db.execute(
+                        "INSERT OR REPLACE INTO clips (path, size, mtime_ns, duration, width, height, fps, codec,"
+                        " keyframe_interval, luminance, tags, user_tags, scanned_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            path, stat.st_size, stat.st_mtime_ns, info["duration"], info["width"], info["height"],
+                            info["fps"], info["codec"], info["keyframe_interval"], info["luminance"],
+                            _tag_string(_derived_tags(clip, self.assets_dir)),
+                            row["user_tags"] if row else ",",
+                            time.time()
+                        )
+                    )
+                    probed += 1
+
+                mezzanine_file = mezzanine.mezzanine_path(clip, self.cache)
+                normalized = mezzanine.is_normalized(mezzanine_file)
+                looped = {os.path.abspath(clip), os.path.abspath(mezzanine_file)} & derivatives
+                db.execute(
+                    "UPDATE clips SET mezzanine = ?, looped = ? WHERE path = ?",
+                    (mezzanine_file.as_posix() if normalized else None, int(bool(looped)), path)
+                )
+
+            removed = [path for path in known if path not in seen]
+            db.executemany("DELETE FROM clips WHERE path = ?", [(path,) for path in removed])
+
+        print(f"📚 Background library: {len(seen)} clips ({probed} probed, {len(removed)} removed) in {time.time() - started:.2f}s")
+        return len(seen)
+
+    def query(self, min_duration=None, portrait=None, min_height=None, tags=None, normalized=None, looped=None,
+              min_luminance=None, max_luminance=None, limit=None):
+        """Return indexed clips matching every given condition, normalized and longest first.
+
+        portrait=True keeps clips at least as tall as 9:16 (they only need
+        scaling, no letterboxing); tags must all be present, either as a
+        manual tag or at the start or end of a derived one (see _has_tag).
+        """
+        conditions, params = [], []
+        if min_duration is not None:
+            conditions.append("duration >= ?")
+            params.append(min_duration)
+        if portrait:
+            conditions.append("height * ? >= width * ?")
+            params += [Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT]
+        if min_height is not None:
+            conditions.append("height >= ?")
+            params.append(min_height)
+        for tag in tags or []:
+            conditions.append("has_tag(tags, user_tags, ?)")
+            params.append(tag.lower())
+        if normalized is not None:
+            conditions.append("mezzanine IS NOT NULL" if normalized else "mezzanine IS NULL")
+        if looped is not None:
+            conditions.append("looped = ?")
+            params.append(int(bool(looped)))
+        if min_luminance is not None:
+            conditions.append("luminance >= ?")
+            params.append(min_luminance)
+        if max_luminance is not None:
+            conditions.append("luminance <= ?")
+            params.append(max_luminance)
+
+        sql = "SELECT * FROM clips"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY mezzanine IS NULL, duration DESC, path"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._connect() as db:
+            return [_row_dict(row) for row in db.execute(sql, params)]
+
+    def find_background(self, min_duration=None, tags=None, portrait=True):
+        """Best clip for a render (see query), falling back to any clip if none is long enough."""
+        matches = self.query(min_duration=min_duration, portrait=portrait, tags=tags, limit=1)
+        if not matches and min_duration is not None:
+            # Shorter clips still work: renders loop the background
+            matches = self.query(portrait=portrait, tags=tags, limit=1)
+        return matches[0]["path"] if matches else None
+
+    def add_tags(self, path, *tags):
+        """Attach manual tags to a clip; they survive rescans."""
+        with self._connect() as db:
+            row = db.execute("SELECT user_tags FROM clips WHERE path = ?", (Path(path).as_posix(),)).fetchone()
+            if not row:
+                raise ValueError(f"Clip not in the background library: {path}")
+            current = [tag for tag in row["user_tags"].split(',') if tag]
+            db.execute(
+                "UPDATE clips SET user_tags = ? WHERE path = ?",
+                (_tag_string(current + [tag.lower() for tag in tags]), Path(path).as_posix())
+            )
+
+    def _clip_files(self):
+        skip = {Path(d).resolve() for d in (Config.BACKGROUND_CACHE_DIR, Config.MEZZANINE_DIR, Config.MUSIC_DIR)}
+        for root, dirs, files in os.walk(self.assets_dir):
+            dirs[:] = sorted(d for d in dirs if (Path(root) / d).resolve() not in skip)
+            for name in sorted(files):
+                if Path(name).suffix.lower() in VIDEO_EXTENSIONS and ".partial" not in name:
+                    yield Path(root) / name
+
+    def _analyze(self, clip):
+        info = self.probe.probe(clip)
+        video = next(s for s in info["streams"] if s["codec_type"] == "video")
+        return {
+            "duration": info["duration"],
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": video.get("fps"),
+            "codec": video.get("codec"),
+            "keyframe_interval": video.get("keyframe_interval"),
+            "luminance": self._luminance(clip, info["duration"])
+        }
+
+    def _luminance(self, clip, duration):
+        """Average luma (0-255) over a few frames spread across the clip."""
+        rate = LUMINANCE_SAMPLES / max(duration, 0.1)
+        stderr = ffmpeg_runner.run_ffmpeg(
+            [
+                '-v', 'info',
+                '-i', str(clip),
+                '-an',
+                '-vf', f"fps={rate:.6f},scale=64:-2,signalstats,metadata=mode=print:key=lavfi.signalstats.YAVG",
+                '-f', 'null', '-'
+            ],
+            ffmpeg_path=self.ffmpeg_path
+        )
+        values = [float(v) for v in re.findall(r"lavfi\.signalstats\.YAVG=([\d.]+)", stderr)]
+        return round(sum(values) / len(values), 2) if values else None
+
+    def _derivative_sources(self):
+        """Absolute paths of clips that have loop units or looped backgrounds in the cache."""
+        sources = set()
+        for entry in self.cache.entries():
+            if entry.get("kind") in ("loop_unit", "looped") and entry.get("source"):
+                sources.add(os.path.abspath(entry["source"]))
+        return sources
+
+    def _connect(self):
+        return _Transaction(self._db, self._lock)
+
+class _Transaction:
+    """Holds the library lock and commits (or rolls back) on exit."""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.lock.release()
+
+def _derived_tags(clip, assets_dir):
+    """Tags from the folder names under assets_dir and the words of the file name."""
+    relative = clip.relative_to(assets_dir)
+    words = [part for part in relative.parts[:-1]] + re.split(r"[^a-zA-ZͰ-Ͽ]+", clip.stem)
+    return [word.lower() for word in words if len(word) > 1]
+
+def _has_tag(tags, user_tags, tag):
+    """Whether tag is a manual tag, or starts or ends one derived tag (file names often
+    glue words together, so "beach" matches "daphnebeach" but "sea" not "research")."""
+    return tag in user_tags.split(',') or any(
+        derived.startswith(tag) or derived.endswith(tag) for derived in tags.split(',') if derived
+    )
+
+def _tag_string(tags):
+    return "," + ",".join(sorted(set(tags))) + "," if tags else ","
+
+def _row_dict(row):
+    result = dict(row)
+    for column in ("tags", "user_tags"):
+        result[column] = [tag for tag in result[column].split(',') if tag]
+    result["looped"] = bool(result["looped"])
+    return result
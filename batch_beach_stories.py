@@ -1,82 +1,104 @@
+import asyncio
 from main import GreekVideoCreator
+from render_pool import RenderPool
+from background_library import BackgroundLibrary
+from config import Config
+import speech_timing
 import os
 import shutil
 from pathlib import Path
 
-def create_multiple_beach_stories(num_variations=10):
+def create_multiple_beach_stories(num_variations=10, max_jobs=None, music=None):
     creator = GreekVideoCreator()
     
     # Story parameters
     story_prompt = "Μια γυναίκα που πάλευε με την εικόνα του σώματός της στην παραλία, αλλά τελικά βρήκε την αυτοπεποίθησή της"
-    background_video = "assets/daphnebeach.mp4"
     duration = 60
     
+    # Pick a portrait beach clip from the background library (rescanned incrementally).
+    # The shared loop unit is picked before any narration exists, so the query uses the
+    # nominal duration; shorter clips still work, as renders loop the background.
+    library = BackgroundLibrary()
+    library.scan()
+    background_video = library.find_background(min_duration=duration, tags=["beach"]) or "assets/daphnebeach.mp4"
+    print(f"📹 Background: {background_video}")
+    
     # Prepare output directory
     output_dir = Path("output")
     output_dir.mkdir(exist_ok=True)
     
-    # First, create and save the looped background video once
+    # Prepare the seamless loop unit once (reused from the cache on re-runs)
     print("\n🎬 Preparing looped background video...")
-    temp_bg = creator.video_processor.prepare_background_video(
-        background_video,
-        duration,
-        output_dir / "temp_looped_bg.mp4"
-    )
+    background_video = creator.video_processor.ingest_background(background_video) or background_video
+    loop_unit = creator.video_processor.prepare_loop_unit(background_video)
     
-    if not temp_bg:
+    if not loop_unit:
         print("❌ Failed to create looped background video")
         return
     
     print("✅ Background video prepared successfully")
     
+    # Stories, audio and captions are generated here; renders run in the pool
+    pool = RenderPool(max_jobs=max_jobs)
+    
+    # Request all stories up front, several per call (the long prompt is sent once per batch)
+    print(f"\n📝 Generating {num_variations} story variations")
+    async def collect_stories():
+        return sorted([
+            item async for item in creator.story_generator.generate_story_batches(story_prompt, num_variations, duration=duration)
+        ])
+    stories = asyncio.run(collect_stories())
+    
     # Generate multiple variations
-    for i in range(num_variations):
-        print(f"\n📝 Generating story variation {i+1}/{num_variations}")
+    for i, story in stories:
+        print(f"\n🎙️ Narrating story variation {i+1}/{num_variations}")
         
         # Create unique output filename
         output_filename = f"beach_story_variation_{i+1}.mp4"
         
         try:
-            # Generate new story and audio
-            story = creator.story_generator.generate_story(
-                topic=story_prompt,
-                duration=duration
-            )
-            
             if not story:
                 print(f"❌ Failed to generate story for variation {i+1}")
                 continue
-                
-            # Create audio
-            audio_path = creator.audio_generator.generate_audio(story)
+            
+            # Create audio (unique per variation, renders run concurrently)
+            audio_path = creator.audio_generator.generate_audio(story, f"beach_story_audio_{i+1}.mp3")
             if not audio_path:
                 print(f"❌ Failed to generate audio for variation {i+1}")
                 continue
+            if Config.NARRATION_TRIM_SILENCE:
+                audio_path = speech_timing.trim_silence(audio_path)
             
             # Create captions
-            captions_path = creator.caption_generator.generate_captions(story)
+            captions_path = creator.caption_generator.create_captions(
+                story,
+                duration,
+                str(output_dir / f"beach_story_captions_{i+1}.ass"),
+                audio_file=audio_path
+            )
             if not captions_path:
                 print(f"❌ Failed to generate captions for variation {i+1}")
                 continue
             
-            # Create final video using the pre-looped background
-            final_video = creator.video_processor.create_final_video(
-                temp_bg,  # Use the pre-looped background
+            pool.submit(
+                render_variation,
+                creator,
+                i + 1,
+                story,
+                loop_unit,
                 audio_path,
                 captions_path,
-                output_dir / output_filename
+                output_dir / output_filename,
+                music=music
             )
-            
-            if final_video:
-                print(f"✅ Video {i+1} created successfully: {output_filename}")
-                print(f"\n📝 Story {i+1}:\n{story}\n")
-            else:
-                print(f"❌ Failed to create final video for variation {i+1}")
-            
+        
         except Exception as e:
             print(f"❌ Error processing variation {i+1}: {e}")
             continue
     
+    print("\n⏳ Waiting for renders to finish...")
+    pool.wait()
+    
     # Clean up temporary files
     print("\n🧹 Cleaning up temporary files...")
     for temp_file in output_dir.glob("temp_*"):
@@ -85,5 +107,23 @@ def create_multiple_beach_stories(num_variations=10):
         except Exception as e:
             print(f"Warning: Could not delete {temp_file}: {e}")
 
+def render_variation(creator, number, story, loop_unit, audio_path, captions_path, output_path, music=None, threads=None):
+    """Render one variation in a single ffmpeg pass (runs inside the render pool)."""
+    final_video = creator.video_processor.create_video_single_pass(
+        loop_unit,
+        audio_path,
+        captions_path,
+        output_path,
+        threads=threads,
+        music=music
+    )
+    
+    if final_video:
+        print(f"✅ Video {number} created successfully: {Path(output_path).name}")
+        print(f"\n📝 Story {number}:\n{story}\n")
+    else:
+        print(f"❌ Failed to create final video for variation {number}")
+    return final_video
+
 if __name__ == "__main__":
-    create_multiple_beach_stories() 
\ No newline at end of file
+    create_multiple_beach_stories()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the subtitles module against pysrt on a batch re-timing job.
+
+Each file is parsed, shifted, stretched and serialized again, the way a
+batch resync treats tens of thousands of caption files. The files are
+generated in memory so only the subtitle code is timed. pysrt is optional
+(pip install pysrt); without it only the subtitles module is measured.
+
+    python benchmark_subtitles.py --files 20000 --cues 25
+"""
+
+import argparse
+import io
+import random
+import time
+import subtitles
+
+def sample_files(count, cues_per_file, seed=1):
+    """SRT documents with Greek two-line cues."""
+    rng = random.Random(seed)
+    words = "η θάλασσα ήταν ήρεμη και ο ήλιος έλαμπε πάνω από την παραλία".split()
+    documents = []
+    for _ in range(count):
+        cues = []
+        time_ms = 0
+        for _ in range(cues_per_file):
+            duration = rng.randint(800, 4000)
+            text = " ".join(rng.choices(words, k=5)) + "\n" + " ".join(rng.choices(words, k=4))
+            cues.append(subtitles.Cue(time_ms, time_ms + duration, text))
+            time_ms += duration + rng.randint(0, 400)
+        documents.append(subtitles.format_srt(cues))
+    return documents
+
+def run_subtitles(documents):
+    output = []
+    for document in documents:
+        cues = subtitles.parse_srt(document)
+        subtitles.shift(cues, 250)
+        subtitles.scale(cues, 1.05)
+        output.append(subtitles.format_srt(cues))
+    return output
+
+def run_pysrt(documents, pysrt):
+    output = []
+    for document in documents:
+        subs = pysrt.from_string(document)
+        subs.shift(milliseconds=250)
+        subs.shift(ratio=1.05)
+        buffer = io.StringIO()
+        subs.write_into(buffer)
+        output.append(buffer.getvalue())
+    return output
+
+def timed(label, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    print(f"⏱️ {label:<10} {elapsed:7.3f}s")
+    return result, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark subtitle parsing and re-timing")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--cues", type=int, default=25)
+    args = parser.parse_args()
+
+    documents = sample_files(args.files, args.cues)
+    print(f"📄 {args.files} files x {args.cues} cues ({sum(map(len, documents)) / 1e6:.1f} MB)")
+
+    ours, ours_time = timed("subtitles", run_subtitles, documents)
+    try:
+        import pysrt
+    except ImportError:
+        print("ℹ️ pysrt is not installed; skipping the comparison")
+        return
+    theirs, theirs_time = timed("pysrt", run_pysrt, documents, pysrt)
+
+    # Both must agree on every cue time and text
+    mismatches = sum(
+        1 for a, b in zip(ours, theirs)
+        if [(c.start, c.end, c.text) for c in subtitles.parse_srt(a)]
+        != [(c.start, c.end, c.text) for c in subtitles.parse_srt(b)]
+    )
+    print(f"🚀 {theirs_time / ours_time:.1f}x faster than pysrt ({mismatches} files differ)")
+
+if __name__ == "__main__":
+    main()
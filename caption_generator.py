@@ -1,53 +1,59 @@
 import re
-import pysrt
 from pathlib import Path
 from config import Config
+import speech_timing
+import ass_subtitles
+import caption_layout
+import subtitles
+import karaoke
 
 class GreekCaptionGenerator:
     def __init__(self):
         # Ensure output directory exists
         Path(Config.OUTPUT_DIR).mkdir(exist_ok=True)
     
-    def create_captions(self, text, duration, output_filename="captions.srt"):
-        """Create SRT captions from text with proper timing."""
+    def create_captions(self, text, duration, output_filename="captions.srt", audio_file=None):
+        """Create SRT or styled ASS captions (by output_filename's extension) with proper timing.
+        
+        With audio_file, .ass output uses its TTS character timestamps for
+        word-highlighted karaoke captions when they exist; otherwise (and with
+        Config.CAPTION_TIMING = "audio") cue boundaries are snapped to the
+        pauses in the narration, or sentences are spread evenly over duration.
+        """
         
         # Use the provided output filename directly
         output_path = Path(output_filename)
         
+        # Word-highlighted captions straight from the TTS timestamps, when the audio has them
+        alignment = karaoke.load_alignment(audio_file) if audio_file else None
+        if alignment and Config.CAPTION_KARAOKE and ass_subtitles.is_ass(output_path):
+            karaoke.write_karaoke(alignment, output_path)
+            print(f"Υπότιτλοι καραόκε αποθηκεύτηκαν στο: {output_path}")
+            self.preview_captions(str(output_path))
+            return str(output_path)
+        
         # Split text into sentences using more sophisticated splitting
         sentences = self._split_into_sentences(text)
         
-        # Calculate time per sentence, ensuring even distribution
-        total_sentences = len(sentences)
-        time_per_sentence = duration / total_sentences if total_sentences > 0 else duration
-        
-        # Add a small gap between sentences
-        gap = 0.5  # half second gap
-        effective_time = time_per_sentence - gap
-        
-        # Create subtitle file
-        subs = pysrt.SubRipFile()
-        
-        for i, sentence in enumerate(sentences):
-            if sentence:
-                # Calculate timing with gap
-                start_time = i * time_per_sentence
-                end_time = start_time + effective_time
-                
-                # Create subtitle
-                sub = pysrt.SubRipItem(
-                    index=i+1,
-                    start=self._seconds_to_srt_time(start_time),
-                    end=self._seconds_to_srt_time(end_time),
-                    text=sentence.strip()
-                )
-                subs.append(sub)
+        timings = None
+        if audio_file and Config.CAPTION_TIMING == "audio":
+            timings = speech_timing.time_sentences(sentences, audio_file)
+        if timings is None:
+            timings = self._even_timings(len(sentences), duration)
         
         # Create parent directory if it doesn't exist
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Save to file
-        subs.save(str(output_path), encoding='utf-8')
+        cues = [
+            subtitles.Cue.from_seconds(start_time, end_time, sentence.strip())
+            for sentence, (start_time, end_time) in zip(sentences, timings) if sentence
+        ]
+        
+        # Styled .ass: renders burn it as is, without force_style
+        if ass_subtitles.is_ass(output_path):
+            ass_subtitles.write_ass(cues, output_path)
+        else:
+            subtitles.write(cues, output_path)
         print(f"Υπότιτλοι αποθηκεύτηκαν στο: {output_path}")
         
         # Preview the captions
@@ -55,8 +61,17 @@ class GreekCaptionGenerator:
         
         return str(output_path)
     
+    def _even_timings(self, count, duration):
+        """Spread count sentences evenly over duration, with a short gap after each."""
+        # Calculate time per sentence, ensuring even distribution
+        time_per_sentence = duration / count if count > 0 else duration
+        
+        # Add a small gap between sentences
+        gap = 0.5  # half second gap
+        return [(i * time_per_sentence, i * time_per_sentence + time_per_sentence - gap) for i in range(count)]
+    
     def _split_into_sentences(self, text):
-        """Split Greek text into appropriately sized sentences for captions."""
+        """Split Greek text into caption cues that fit the frame, one or more per sentence."""
         
         # First split by natural sentence endings
         sentences = re.split(r'[.!;·]', text)
@@ -64,28 +79,8 @@ class GreekCaptionGenerator:
         # Clean and filter empty sentences
         sentences = [s.strip() for s in sentences if s.strip()]
         
-        # Further split long sentences by commas or conjunctions
-        final_sentences = []
-        for sentence in sentences:
-            if len(sentence) > 80:  # Too long for one caption
-                # Try to split by comma or common Greek conjunctions
-                parts = re.split(r'[,]|(?:\s+(?:και|αλλά|όμως|μα|κι|ή)\s+)', sentence)
-                for part in parts:
-                    if part.strip():
-                        final_sentences.append(part.strip())
-            else:
-                final_sentences.append(sentence)
-        
-        return final_sentences
-    
-    def _seconds_to_srt_time(self, seconds):
-        """Convert seconds to SRT time format."""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        milliseconds = int((seconds % 1) * 1000)
-        
-        return pysrt.SubRipTime(hours, minutes, secs, milliseconds)
+        # Break sentences into balanced lines measured with the caption font; long ones span several cues
+        return [cue for cues in caption_layout.layout_captions(sentences) for cue in cues]
     
     def create_manual_captions(self, caption_data, filename="manual_captions.srt"):
         """Create captions from manual timing data.
@@ -93,24 +88,8 @@ class GreekCaptionGenerator:
         caption_data should be a list of tuples: [(start_time, end_time, text), ...]
         """
         
-        subs = pysrt.SubRipFile()
-        
-        for i, (start_time, end_time, text) in enumerate(caption_data):
-            start_srt = self._seconds_to_srt_time(start_time)
-            end_srt = self._seconds_to_srt_time(end_time)
-            
-            sub_item = pysrt.SubRipItem(
-                index=i + 1,
-                start=start_srt,
-                end=end_srt,
-                text=text.strip()
-            )
-            
-            subs.append(sub_item)
-        
-        output_path = Path(filename)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        subs.save(str(output_path), encoding='utf-8')
+        cues = [subtitles.Cue.from_seconds(start_time, end_time, text.strip()) for start_time, end_time, text in caption_data]
+        output_path = subtitles.write(cues, filename)
         
         print(f"Χειροκίνητοι υπότιτλοι αποθηκεύτηκαν στο: {output_path}")
         return str(output_path)
@@ -120,7 +99,6 @@ class GreekCaptionGenerator:
         print("\n📝 Προεπισκόπηση Υποτίτλων:")
         print("-" * 50)
         
-        subs = pysrt.open(srt_file)
-        for sub in subs:
-            print(f"{sub.index}: {sub.start} --> {sub.end}")
-            print(f"   {sub.text}\n") 
\ No newline at end of file
+        for index, cue in enumerate(subtitles.read(srt_file), 1):
+            print(f"{index}: {subtitles.srt_time(cue.start)} --> {subtitles.srt_time(cue.end)}")
+            print(f"   {cue.text}\n")
@@ -0,0 +1,315 @@
+"""
+Caption line breaking measured with the caption font's own glyph widths.
+
+The advance width of every character is read from the bundled TrueType
+font (cmap and hmtx tables, no font library needed) and scaled the way
+libass sizes fonts: the font size is the height from the Windows ascent
+to the descent. A TextMeasure per (font file, pixel size) caches those
+widths and the width of every word it has measured, so a batch of stories
+shares one cache.
+
+Lines are broken to fill the caption safe area (frame width minus the
+side margins and outline) evenly: the fewest lines that fit are chosen,
+then the breaks minimizing the squared slack of every line, with a bonus
+for breaking after punctuation or before a conjunction and a penalty for
+ending a line on a short word. Text needing more than Config.CAPTION_MAX_LINES lines is split into
+several cues. Without a bundled font, widths fall back to an average
+character width.
+"""
+
+import math
+import re
+import struct
+from functools import lru_cache
+from config import Config
+import ass_subtitles
+from ass_subtitles import CaptionStyle
+from output_targets import SRT_PLAY_RES_Y
+
+AVERAGE_CHAR_WIDTH = 0.55  # Of the font size, for DejaVu Sans with Greek text
+PUNCTUATION_BREAK = re.compile(r"[,;:·.!?…»)]$")
+PUNCTUATION_BONUS = 0.15  # Of the squared line width
+CONJUNCTIONS = {"και", "κι", "αλλά", "όμως", "μα", "ή", "ενώ", "γιατί", "που"}  # Good places to start a line
+SHORT_WORD = 2  # Words this short (articles, "σε", "με") shouldn't end a line ...
+SHORT_WORD_PENALTY = 0.1  # ... unless the alternative is this much worse
+
+class FontFileError(ValueError):
+    pass
+
+class FontMetrics:
+    """Character advances and vertical metrics of one TrueType/OpenType font file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        tables = self._tables(data)
+        for tag in (b"cmap", b"head", b"hhea", b"hmtx"):
+            if tag not in tables:
+                raise FontFileError(f"{path}: no {tag.decode()} table")
+
+        self.units_per_em = struct.unpack_from(">H", data, tables[b"head"] + 18)[0]
+        ascent, descent = struct.unpack_from(">hh", data, tables[b"hhea"] + 4)
+        metric_count = struct.unpack_from(">H", data, tables[b"hhea"] + 34)[0]
+        if b"OS/2" in tables:
+            win_ascent, win_descent = struct.unpack_from(">HH", data, tables[b"OS/2"] + 74)
+            if win_ascent + win_descent:
+                ascent, descent = win_ascent, -win_descent
+        self.height_units = (ascent - descent) or self.units_per_em
+
+        advances = struct.unpack_from(f">{metric_count * 2}H", data, tables[b"hmtx"])[::2]
+        last = advances[-1] if advances else 0
+        glyphs = self._character_glyphs(data, tables[b"cmap"])
+        self.advances = {
+            code: advances[glyph] if glyph < len(advances) else last
+            for code, glyph in glyphs.items()
+        }
+        # Missing characters render as the .notdef glyph
+        self.default_advance = advances[0] if advances else self.units_per_em // 2
+        self.family, self.subfamily = self._names(data, tables.get(b"name"))
+
+    @staticmethod
+    def _tables(data):
+        if data[:4] == b"ttcf":
+            data_offset = struct.unpack_from(">I", data, 12)[0]  # First font of a collection
+        else:
+            data_offset = 0
+        count = struct.unpack_from(">H", data, data_offset + 4)[0]
+        tables = {}
+        for i in range(count):
+            tag, _, offset, _ = struct.unpack_from(">4sIII", data, data_offset + 12 + 16 * i)
+            tables[tag] = offset
+        return tables
+
+    @staticmethod
+    def _character_glyphs(data, cmap):
+        """Code point -> glyph index from the best Unicode cmap subtable."""
+        count = struct.unpack_from(">H", data, cmap + 2)[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+            subtables[(platform, encoding)] = cmap + offset
+        for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+            if key not in subtables:
+                continue
+            start = subtables[key]
+            table_format = struct.unpack_from(">H", data, start)[0]
+            if table_format == 4:
+                return FontMetrics._format4(data, start)
+            if table_format == 12:
+                return FontMetrics._format12(data, start)
+        raise FontFileError("no supported Unicode cmap subtable")
+
+    @staticmethod
+    def _format4(data, start):
+        segments = struct.unpack_from(">H", data, start + 6)[0] // 2
+        ends = struct.unpack_from(f">{segments}H", data, start + 14)
+        starts = struct.unpack_from(f">{segments}H", data, start + 16 + 2 * segments)
+        deltas = struct.unpack_from(f">{segments}h", data, start + 16 + 4 * segments)
+        range_offsets_at = start + 16 + 6 * segments
+        range_offsets = struct.unpack_from(f">{segments}H", data, range_offsets_at)
+        glyphs = {}
+        for i in range(segments):
+            first, last, delta, range_offset = starts[i], ends[i], deltas[i], range_offsets[i]
+            if first == 0xFFFF:
+                continue
+            if range_offset == 0:
+                for code in range(first, last + 1):
+                    glyphs[code] = (code + delta) & 0xFFFF
+            else:
+                # Offset is relative to this segment's own idRangeOffset entry
+                base = range_offsets_at + 2 * i + range_offset
+                indices = struct.unpack_from(f">{last - first + 1}H", data, base)
+                for code, glyph in zip(range(first, last + 1), indices):
+                    if glyph:
+                        glyphs[code] = (glyph + delta) & 0xFFFF
+        return glyphs
+
+    @staticmethod
+    def _format12(data, start):
+        groups = struct.unpack_from(">I", data, start + 12)[0]
+        glyphs = {}
+        for i in range(groups):
+            first, last, glyph = struct.unpack_from(">III", data, start + 16 + 12 * i)
+            for offset, code in enumerate(range(first, last + 1)):
+                glyphs[code] = glyph + offset
+        return glyphs
+
+    @staticmethod
+    def _names(data, name_table):
+        """Family and subfamily names (name IDs 1 and 2), or empty strings."""
+        names = {}
+        if name_table is None:
+            return "", ""
+        count, strings = struct.unpack_from(">HH", data, name_table + 2)
+        for i in range(count):
+            platform, _, _, name_id, length, offset = struct.unpack_from(">6H", data, name_table + 6 + 12 * i)
+            if name_id not in (1, 2) or name_id in names:
+                continue
+            raw = data[name_table + strings + offset:name_table + strings + offset + length]
+            if platform in (0, 3):
+                names[name_id] = raw.decode('utf-16-be', errors='replace')
+            elif platform == 1:
+                names[name_id] = raw.decode('latin-1')
+        return names.get(1, ""), names.get(2, "")
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    return FontMetrics(path)
+
+@lru_cache(maxsize=None)
+def font_file(font_name, bold=False, fonts_dir=None):
+    """Bundled font file for a family name and weight (the regular face if there's no bold one)."""
+    matches = {}
+    for path in ass_subtitles.font_files(fonts_dir):
+        try:
+            font = load_font(str(path))
+        except (FontFileError, OSError, struct.error):
+            continue
+        if font.family.lower() == font_name.lower():
+            subfamily = font.subfamily.lower()
+            if "italic" in subfamily or "oblique" in subfamily:
+                continue
+            matches.setdefault("bold" in subfamily, str(path))
+    return matches.get(bold) or matches.get(False) or matches.get(True)
+
+class TextMeasure:
+    """Pixel widths of text in one font at one size, with a per-word cache."""
+
+    def __init__(self, font_path, size_px):
+        self.size_px = size_px
+        if font_path:
+            font = load_font(font_path)
+            scale = size_px / font.height_units
+            self._advances = {code: advance * scale for code, advance in font.advances.items()}
+            self._default = font.default_advance * scale
+        else:
+            self._advances = {}
+            self._default = size_px * AVERAGE_CHAR_WIDTH
+        self._words = {}
+        self.space = self.width(" ")
+
+    def width(self, text):
+        width = self._words.get(text)
+        if width is None:
+            advances, default = self._advances, self._default
+            width = sum([advances.get(code, default) for code in map(ord, text)])
+            self._words[text] = width
+        return width
+
+@lru_cache(maxsize=64)
+def text_measure(font_path, size_px):
+    """Shared TextMeasure for a (font, size) pair."""
+    return TextMeasure(font_path, size_px)
+
+def measure_for(style=None, target=None):
+    """(TextMeasure, usable line width in pixels) for a caption style on a target (default: the reel)."""
+    style = (style or CaptionStyle()).for_target(target)
+    width, height = (target.width, target.height) if target else (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT)
+    units = height / SRT_PLAY_RES_Y
+    measure = text_measure(font_file(style.font_name, style.bold), round(style.font_size * units, 2))
+    usable = width - 2 * style.side_margin * height - 2 * style.outline * units
+    return measure, usable
+
+def break_lines(words, measure, max_width, line_count=None):
+    """Split words into balanced lines no wider than max_width (a longer word gets its own line).
+
+    Uses the fewest lines that fit unless line_count is given.
+    """
+    count = len(words)
+    if count == 0:
+        return []
+    widths = [measure.width(word) for word in words]
+    space = measure.space
+    # Width of words i..j-1 on one line is position[j] - position[i] - space
+    position = [0.0]
+    for width in widths:
+        position.append(position[-1] + width + space)
+
+    forward = _greedy_lines(widths, space, max_width)
+    if line_count is None:
+        line_count = len(forward)
+    line_count = min(line_count, count)
+    # Greedy filling from either end bounds where the l-th line can end
+    backward = _greedy_lines(widths[::-1], space, max_width)
+    highest = [forward[l - 1][1] if l <= len(forward) else count for l in range(line_count + 1)]
+    lowest = [count - (backward[r - 1][1] if r <= len(backward) else count) for r in range(line_count + 1)]
+
+    # Bonus or penalty for a line break after word j-1 (none after the last word)
+    breaks = [0.0] * (count + 1)
+    for j in range(1, count):
+        if PUNCTUATION_BREAK.search(words[j - 1]) or words[j].lower() in CONJUNCTIONS:
+            breaks[j] = -PUNCTUATION_BONUS
+        elif len(words[j - 1]) <= SHORT_WORD:
+            breaks[j] = SHORT_WORD_PENALTY
+    norm = max_width * max_width
+
+    # best[l][j]: cost of the first j words on l lines; previous[l][j]: where the last line starts
+    best = [[math.inf] * (count + 1) for _ in range(line_count + 1)]
+    previous = [[0] * (count + 1) for _ in range(line_count + 1)]
+    best[0][0] = 0.0
+    for lines in range(1, line_count + 1):
+        before, row, sources = best[lines - 1], best[lines], previous[lines]
+        for j in range(max(lines, lowest[line_count - lines]), min(highest[lines], count - (line_count - lines)) + 1):
+            for i in range(j - 1, lines - 2, -1):
+                width = position[j] - position[i] - space
+                if width > max_width and j - i > 1:
+                    break  # Starting even earlier only makes the line longer
+                if before[i] == math.inf:
+                    continue
+                slack = max_width - width if width < max_width else 0.0
+                value = before[i] + slack * slack / norm + breaks[j]
+                if value < row[j]:
+                    row[j] = value
+                    sources[j] = i
+    if best[line_count][count] == math.inf:
+        return [words[i:j] for i, j in _greedy_lines(widths, space, max_width)]
+
+    lines = []
+    j = count
+    for line in range(line_count, 0, -1):
+        i = previous[line][j]
+        lines.append(words[i:j])
+        j = i
+    return lines[::-1]
+
+def _greedy_lines(widths, space, max_width):
+    """(start, end) word ranges filling each line as far as it goes."""
+    ranges = []
+    start = 0
+    width = None
+    for index, word_width in enumerate(widths):
+        if width is not None and width + space + word_width <= max_width:
+            width += space + word_width
+            continue
+        if width is not None:
+            ranges.append((start, index))
+        start, width = index, word_width
+    if width is not None:
+        ranges.append((start, len(widths)))
+    return ranges
+
+def layout_caption(text, measure, max_width, max_lines=None):
+    """Caption cue texts (lines joined with \\n) for text, each of at most max_lines lines."""
+    max_lines = max_lines or Config.CAPTION_MAX_LINES
+    lines = break_lines(text.split(), measure, max_width)
+    return ["\n".join(" ".join(line) for line in cue) for cue in spread_lines(lines, max_lines)]
+
+def spread_lines(lines, max_lines=None):
+    """Lines spread evenly over as few cues as hold them (lists of lines)."""
+    max_lines = max_lines or Config.CAPTION_MAX_LINES
+    if not lines:
+        return []
+    cue_count = math.ceil(len(lines) / max_lines)
+    size, extra = divmod(len(lines), cue_count)
+    cues = []
+    start = 0
+    for index in range(cue_count):
+        end = start + size + (1 if index < extra else 0)
+        cues.append(lines[start:end])
+        start = end
+    return cues
+
+def layout_captions(texts, style=None, target=None, max_lines=None):
+    """Cue texts for each of a batch of texts, all measured with one shared cache."""
+    measure, max_width = measure_for(style, target)
+    return [layout_caption(text, measure, max_width, max_lines) for text in texts]
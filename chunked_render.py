@@ -0,0 +1,149 @@
+"""
+Parallel chunked encoding of a single reel.
+
+The render timeline is split into GOP-aligned chunks that are encoded by
+separate ffmpeg processes at the same time, each burning the captions at
+its own timeline offset. The chunks are joined with the concat demuxer,
+the narration is muxed once, and the result is checked for the expected
+frame count and duration.
+"""
+
+import math
+import os
+import shutil
+import ffmpeg_runner
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import Config
+import media_probe
+from encoding_profiles import get_profile
+
+MIN_CHUNK_SECONDS = 2.0
+
+def plan_chunks(duration, chunks=None, gop_seconds=None):
+    """Split [0, duration) into (start, length) chunks on GOP boundaries."""
+    gop_seconds = gop_seconds or 1.0  # Profiles encode one-second closed GOPs
+    if chunks is None:
+        chunks = os.cpu_count() or 1
+    # Very short chunks spend more time on process start-up than on encoding
+    chunks = max(1, min(chunks, int(duration // MIN_CHUNK_SECONDS) or 1))
+
+    gops = math.ceil(duration / gop_seconds)
+    gops_per_chunk = math.ceil(gops / chunks)
+
+    plan = []
+    start = 0.0
+    while start < duration - 1e-6:
+        length = min(gops_per_chunk * gop_seconds, duration - start)
+        plan.append((round(start, 6), round(length, 6)))
+        start += length
+    return plan
+
+def render_chunk(background_video, start, length, video_filter, output_path, threads, ffmpeg_path=None, profile=None):
+    """Encode one video-only chunk of the timeline."""
+    profile = get_profile(profile)
+    # Shift timestamps to the reel timeline so subtitles line up, then back to zero
+    chunk_filter = f"setpts=PTS+{start}/TB,{video_filter},setpts=PTS-STARTPTS"
+    args = [
+        '-ss', f"{start:.3f}",
+        '-t', f"{length:.3f}",
+        '-i', str(background_video),
+        '-vf', chunk_filter,
+        '-an',
+        '-r', str(profile.fps),
+        *profile.video_args(),
+        *profile.closed_gop_args(),
+        '-threads', str(threads),
+        '-y',
+        str(output_path)
+    ]
+    ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=ffmpeg_path)
+    return str(output_path)
+
+def verify_render(output_file, duration, ffprobe_path=None, tolerance_frames=1, fps=None):
+    """Check that a joined render has the expected frame count and duration."""
+    fps = fps or Config.VIDEO_FPS
+    info = media_probe.get_probe(ffprobe_path).probe(output_file)
+    video = next(s for s in info['streams'] if s['codec_type'] == 'video')
+    frames = video.get('frames') or 0
+    actual_duration = info['duration']
+
+    expected_frames = round(duration * fps)
+    tolerance = tolerance_frames / fps
+    if abs(frames - expected_frames) > tolerance_frames or abs(actual_duration - duration) > tolerance + 0.05:
+        raise RuntimeError(
+            f"Chunked render mismatch: {frames} frames / {actual_duration:.3f}s, "
+            f"expected {expected_frames} frames / {duration:.3f}s"
+        )
+    return frames, actual_duration
+
+def render_chunked(background_video, audio_file, video_filter, output_file, duration,
+                   chunks=None, workers=None, profile=None, audio_filter=None, audio_args=None,
+                   ffmpeg_path=None, ffprobe_path=None):
+    """Render a reel as parallel GOP-aligned chunks and join them.
+
+    background_video must already cover `duration` (e.g. a looped background);
+    video_filter is the per-frame chain (scale, subtitles, ...) applied to
+    every chunk on the reel timeline and must produce the profile's size;
+    audio_filter (e.g. loudness normalization) is applied when the narration is
+    muxed, with audio_args (default: the profile's AAC settings) as the codec.
+    """
+    profile = get_profile(profile)
+    cores = os.cpu_count() or 1
+    plan = plan_chunks(duration, chunks or cores)
+    workers = workers or len(plan)
+    threads = max(1, cores // workers)
+
+    chunk_dir = Path(f"{output_file}.chunks")
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+
+    try:
+        print(f"⚡ Encoding {len(plan)} chunks on {workers} workers ({threads} threads each)...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    render_chunk,
+                    background_video,
+                    start,
+                    length,
+                    video_filter,
+                    chunk_dir / f"chunk_{i:03d}.mp4",
+                    threads,
+                    ffmpeg_path,
+                    profile
+                )
+                for i, (start, length) in enumerate(plan)
+            ]
+            chunk_files = [future.result() for future in futures]
+
+        list_path = chunk_dir / "chunks.txt"
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write("ffconcat version 1.0\n")
+            for chunk_file in chunk_files:
+                f.write(f"file '{Path(chunk_file).name}'\n")
+
+        # Join by stream copy and mux the narration once, so audio has no chunk seams
+        args = [
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', str(list_path),
+            '-i', str(audio_file),
+            '-map', '0:v',
+            '-map', '1:a',
+            *(['-af', audio_filter] if audio_filter else []),
+            '-c:v', 'copy',
+            *(audio_args or profile.audio_args()),
+            '-t', f"{duration:.3f}",
+            '-movflags', '+faststart',
+            '-y',
+            str(output_file)
+        ]
+        ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=ffmpeg_path)
+
+        frames, actual_duration = verify_render(output_file, duration, ffprobe_path, fps=profile.fps)
+        print(f"✅ Joined {frames} frames ({actual_duration:.2f}s) in {time.time() - started:.1f}s")
+        return str(output_file)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
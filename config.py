@@ -7,19 +7,119 @@ class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
     ELEVENLABS_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID')
+    ELEVENLABS_BASE_URL = os.getenv('ELEVENLABS_BASE_URL', "https://api.elevenlabs.io/v1")
+    # Request character timestamps with the audio (saved next to it for karaoke captions)
+    ELEVENLABS_TIMESTAMPS = os.getenv('ELEVENLABS_TIMESTAMPS', '1') != '0'
+    ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"
+    # Default voice settings optimized for Greek
+    ELEVENLABS_VOICE_SETTINGS = {
+        "stability": 0.4,
+        "similarity_boost": 0.75,
+        "style": 0.0,
+        "use_speaker_boost": True
+    }
+    
+    # FFmpeg binaries (looked up on PATH and in FFMPEG_SEARCH_DIRS when not set)
+    FFMPEG_PATH = os.getenv('FFMPEG_PATH')
+    FFPROBE_PATH = os.getenv('FFPROBE_PATH')
+    FFMPEG_SEARCH_DIRS = ["C:/Program Files/ffmpeg-7.1.1-full_build/bin"]
+    
+    # FFmpeg runs: wall-clock limit, no-progress limit (seconds) and stderr kept
+    FFMPEG_TIMEOUT = int(os.getenv('FFMPEG_TIMEOUT', 3600))
+    FFMPEG_STALL_TIMEOUT = int(os.getenv('FFMPEG_STALL_TIMEOUT', 120))
+    FFMPEG_STALL_RETRIES = 1
+    FFMPEG_STDERR_LINES = 100
     
     # Default video settings
     DEFAULT_VIDEO_DURATION = 60  # Changed to 60 seconds (1 minute)
     AUDIO_FORMAT = "mp3"
+    AUDIO_SAMPLE_RATE = 48000
     VIDEO_FORMAT = "mp4"
+    VIDEO_WIDTH = 1080  # Portrait mode for social media
+    VIDEO_HEIGHT = 1920
+    VIDEO_FPS = 30
+    DEFAULT_ENCODING_PROFILE = os.getenv('ENCODING_PROFILE', "final")  # draft, final or archive
     
     # Paths
     OUTPUT_DIR = "output"
     ASSETS_DIR = "assets"
     FONTS_DIR = "fonts"
     
+    # FFmpeg build capabilities (filters, encoders), keyed by binary size + mtime
+    TOOLCHAIN_CACHE_PATH = os.path.join(OUTPUT_DIR, ".toolchain_cache.json")
+    
+    # Probed media metadata, keyed by path + size + mtime
+    PROBE_CACHE_PATH = os.path.join(OUTPUT_DIR, ".probe_cache.json")
+    
+    # Narration loudness (EBU R128); first-pass measurements cached by content hash
+    LOUDNESS_NORMALIZE = os.getenv('LOUDNESS_NORMALIZE', '1') != '0'
+    LOUDNESS_TARGET_I = -14.0  # Integrated LUFS, as used by Reels/TikTok
+    LOUDNESS_TARGET_TP = -1.5  # True peak, dBTP
+    LOUDNESS_TARGET_LRA = 11.0  # Loudness range, LU
+    LOUDNESS_CACHE_PATH = os.path.join(OUTPUT_DIR, ".loudness_cache.json")
+    
+    # Narration pauses: caption timing and optional silence trimming
+    CAPTION_TIMING = os.getenv('CAPTION_TIMING', 'audio')  # "audio" (snap to pauses) or "even"
+    NARRATION_TRIM_SILENCE = os.getenv('NARRATION_TRIM_SILENCE', '0') != '0'
+    NARRATION_MAX_PAUSE = 0.6  # Longer pauses are shortened to this (seconds)
+    NARRATION_EDGE_SILENCE = 0.2  # Silence kept before the first and after the last word
+    
+    # Narration length predicted from past TTS runs, checked before a story is narrated
+    NARRATION_MODEL_PATH = os.path.join(OUTPUT_DIR, ".narration_model.json")
+    NARRATION_LENGTH_TOLERANCE = 0.25  # Stories predicted outside duration ± 25% are rejected ...
+    NARRATION_MIN_SAMPLES = 5  # ... once this many narrations have been recorded
+    # Story candidates requested per call (n choices); the first that passes the checks is used
+    STORY_CANDIDATES = int(os.getenv('STORY_CANDIDATES', 3))
+    STORY_RETRIES = 2  # Further calls when no candidate passes ...
+    STORY_RETRY_BACKOFF = 1.0  # ... after this many seconds, doubled per retry
+    STORY_ATTEMPTS_LOG = os.path.join(OUTPUT_DIR, "story_attempts.jsonl")  # Outcome of every call, one JSON line each
+    STORY_BATCH_SIZE = int(os.getenv('STORY_BATCH_SIZE', 5))  # Stories per batch request (their max_tokens must fit gpt-4's context)
+    # Stories this similar (estimated Jaccard of word 3-grams) to an earlier story are rejected
+    DUPLICATE_CHECK = os.getenv('DUPLICATE_CHECK', '1') != '0'
+    DUPLICATE_THRESHOLD = 0.5
+    STORY_INDEX_PATH = os.path.join(OUTPUT_DIR, ".story_index.jsonl")
+    # Stories requested at once by the async story API (rate-limit headers can slow it further)
+    STORY_CONCURRENCY = int(os.getenv('STORY_CONCURRENCY', 16))
+    STORY_REQUEST_RETRIES = 4  # Retries of a request refused with 429/5xx or a dropped connection
+    # Story LLM: "openai" or "stub" (deterministic, offline); responses cached on disk
+    LLM_BACKEND = os.getenv('LLM_BACKEND', "openai")
+    # "on" (reuse responses to identical requests while developing), "off" or "replay" (cached only, no API calls)
+    LLM_CACHE = os.getenv('LLM_CACHE', "off")
+    LLM_CACHE_DIR = os.path.join(OUTPUT_DIR, ".llm_cache")
+    LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', 64))
+    
+    # Music bed under the narration
+    MUSIC_DIR = os.path.join(ASSETS_DIR, "music")
+    MUSIC_GAIN_DB = -12  # Music level before ducking
+    MUSIC_DUCK_THRESHOLD = 0.03  # Voice level (linear) where ducking starts
+    MUSIC_DUCK_RATIO = 8
+    MUSIC_DUCK_ATTACK_MS = 20
+    MUSIC_DUCK_RELEASE_MS = 400
+    MUSIC_FADE_IN = 1.5  # Seconds
+    MUSIC_FADE_OUT = 2.5
+    
+    # Prepared background cache (content-addressed, LRU-evicted)
+    BACKGROUND_CACHE_DIR = os.path.join(ASSETS_DIR, "cache")
+    BACKGROUND_CACHE_MAX_MB = int(os.getenv('BACKGROUND_CACHE_MAX_MB', 2048))
+    
+    # SQLite index of background clips (metadata, luminance, tags, derivatives)
+    BACKGROUND_LIBRARY_PATH = os.path.join(ASSETS_DIR, "library.sqlite3")
+    
+    # Normalized (render-ready) background clips
+    MEZZANINE_DIR = os.path.join(ASSETS_DIR, "mezzanine")
+    MEZZANINE_GOP = 30  # One keyframe per second at VIDEO_FPS
+    LOOP_CROSSFADE = 0.5  # Seconds of tail-to-head crossfade in loop units
+    
+    # Batch rendering
+    RENDER_CORES_PER_JOB = 8  # Initial guess of cores one libx264 reel can keep busy
+    
     # Caption settings
     CAPTION_FONT_SIZE = 20  # Changed from 24 to 20
     CAPTION_FONT_COLOR = "white"
     CAPTION_OUTLINE_COLOR = "black"
-    CAPTION_OUTLINE_WIDTH = 2 
\ No newline at end of file
+    CAPTION_OUTLINE_WIDTH = 2 
+    # Move captions away from bright/busy parts of the background, per cue
+    CAPTION_AUTO_PLACEMENT = os.getenv('CAPTION_AUTO_PLACEMENT', '1') != '0'
+    # Word-highlighted (karaoke) ASS captions when the narration has TTS timestamps
+    CAPTION_KARAOKE = os.getenv('CAPTION_KARAOKE', '1') != '0'
+    CAPTION_MAX_LINES = 2  # Lines per karaoke cue
\ No newline at end of file
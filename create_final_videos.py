@@ -2,6 +2,23 @@ import os
 import subprocess
 import sys
 from pathlib import Path
+from mezzanine import is_normalized
+from render_pool import RenderPool
+from media_probe import get_duration
+from ffmpeg_runner import run_ffmpeg, progress_printer
+from loudness import normalization_filter
+from background_library import BackgroundLibrary
+from frame_analysis import place_captions
+from ass_subtitles import CaptionStyle, write_ass, subtitles_filter, warm_font_cache
+from speech_timing import time_sentences, trim_silence
+from karaoke import alignment_path, load_alignment, write_karaoke
+import subtitles
+from caption_layout import layout_captions
+from output_targets import SRT_PLAY_RES_Y
+from config import Config
+
+# Bold captions in the lower third of the reel
+CAPTION_STYLE = CaptionStyle(font_size=16, bold=True, margin=50 / SRT_PLAY_RES_Y)
 
 def get_next_number():
     """Get the next available number for the output video."""
@@ -10,8 +27,36 @@ def get_next_number():
         i += 1
     return i
 
-def create_final_video(srt_file, background_video, output_file):
-    """Create a final video with background, audio, and captions."""
+def sync_captions(srt_file, cues, audio_file, output_file):
+    """Re-time the cues of an SRT file to narration recorded without TTS timestamps."""
+    # Get the actual audio duration and regenerate the captions with correct timing
+    try:
+        audio_duration = get_duration(audio_file)
+        print(f"📏 Audio duration: {audio_duration:.2f} seconds")
+        
+        # Regenerate the captions as styled ASS with correct timing
+        # Re-break the text into balanced lines for the reel's caption font and frame
+        text_segments = [text for texts in layout_captions([cue.text for cue in cues], CAPTION_STYLE) for text in texts]
+        
+        # Snap cue boundaries to the pauses in the narration; spread evenly if none are found
+        timings = time_sentences(text_segments, audio_file) if Config.CAPTION_TIMING == "audio" else None
+        if timings is None:
+            segment_duration = audio_duration / len(text_segments)
+            timings = [(i * segment_duration, (i + 1) * segment_duration) for i in range(len(text_segments))]
+        
+        write_ass([(start, end, text) for text, (start, end) in zip(text_segments, timings)], output_file, CAPTION_STYLE)
+        print(f"✅ Generated synced captions: {output_file}")
+        return output_file
+        
+    except Exception as e:
+        print(f"⚠️ Could not sync timing, using original SRT: {e}")
+        return str(srt_file)
+
+def create_final_video(srt_file, background_video, output_file, threads=None):
+    """Create a final video with background, audio, and captions.
+
+    threads caps ffmpeg's encoder and filter threads when renders share a box.
+    """
     # Get the corresponding story file
     story_num = srt_file.stem.split('_')[1]
     
@@ -26,28 +71,15 @@ def create_final_video(srt_file, background_video, output_file):
     os.makedirs("output/temp", exist_ok=True)
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
+    # Parse the captions once; the narration text and the resync both use them
+    cues = subtitles.read(srt_file)
+    
     # Generate audio from the SRT caption file using ElevenLabs
     audio_file = f"output/audio/audio_{story_num}.mp3"
     if not os.path.exists(audio_file):
         try:
-            # Extract text from SRT file
-            with open(srt_file, 'r', encoding='utf-8') as f:
-                srt_content = f.read().strip()
-            
-            # Extract just the text from SRT (remove timestamps and line numbers)
-            import re
-            # Remove SRT formatting and extract just the Greek text
-            text_lines = []
-            for line in srt_content.split('\n'):
-                line = line.strip()
-                # Skip empty lines, numbers, and timestamp lines
-                if (line and 
-                    not line.isdigit() and 
-                    not re.match(r'\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}', line)):
-                    text_lines.append(line)
-            
-            # Join all the text
-            caption_text = ' '.join(text_lines)
+            # The narration is the caption text without timestamps and line numbers
+            caption_text = subtitles.plain_text(cues)
             print(f"🔊 Generating audio from captions: {caption_text[:100]}...")
             
             # Use ElevenLabs for audio generation - save to correct path
@@ -67,6 +99,8 @@ def create_final_video(srt_file, background_video, output_file):
                 if os.path.exists(temp_path):
                     import shutil
                     shutil.move(temp_path, audio_file)
+                    if os.path.exists(alignment_path(temp_path)):
+                        shutil.move(alignment_path(temp_path), alignment_path(audio_file))
                     print(f"✅ Generated and moved ElevenLabs audio: {audio_file}")
                 else:
                     print(f"✅ Generated ElevenLabs audio: {audio_file}")
@@ -77,108 +111,68 @@ def create_final_video(srt_file, background_video, output_file):
             print(f"❌ Error generating audio: {e}")
             return False
 
-    # Get the actual audio duration and regenerate SRT with correct timing
-    try:
-        ffprobe_path = "C:/Program Files/ffmpeg-7.1.1-full_build/bin/ffprobe.exe"
-        probe_command = [
-            ffprobe_path,
-            "-i", audio_file,
-            "-show_entries", "format=duration",
-            "-v", "quiet",
-            "-of", "default=noprint_wrappers=1:nokey=1"
-        ]
-        result = subprocess.run(probe_command, check=True, capture_output=True, text=True)
-        audio_duration = float(result.stdout.strip())
-        print(f"📏 Audio duration: {audio_duration:.2f} seconds")
-        
-        # Regenerate SRT file with correct timing
-        synced_srt_file = f"output/temp/synced_{srt_file.name}"
-        
-        # Extract text from original SRT file
-        with open(srt_file, 'r', encoding='utf-8') as f:
-            srt_content = f.read().strip()
-        
-        import re
-        # Parse SRT and extract text segments
-        text_segments = []
-        lines = srt_content.split('\n')
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if (line and 
-                not line.isdigit() and 
-                not re.match(r'\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}', line) and
-                line != ''):
-                text_segments.append(line)
-        
-        # Generate new SRT with proper timing
-        segment_duration = audio_duration / len(text_segments)
-        
-        with open(synced_srt_file, 'w', encoding='utf-8', newline='') as f:
-            for i, text in enumerate(text_segments):
-                start_time = i * segment_duration
-                end_time = (i + 1) * segment_duration
-                
-                # Convert to SRT time format
-                start_h = int(start_time // 3600)
-                start_m = int((start_time % 3600) // 60)
-                start_s = int(start_time % 60)
-                start_ms = int((start_time % 1) * 1000)
-                
-                end_h = int(end_time // 3600)
-                end_m = int((end_time % 3600) // 60)
-                end_s = int(end_time % 60)
-                end_ms = int((end_time % 1) * 1000)
-                
-                f.write(f"{i + 1}\n")
-                f.write(f"{start_h:02d}:{start_m:02d}:{start_s:02d},{start_ms:03d} --> {end_h:02d}:{end_m:02d}:{end_s:02d},{end_ms:03d}\n")
-                f.write(f"{text}\n\n")
-        
-        print(f"✅ Generated synced SRT file: {synced_srt_file}")
-        # Use the synced SRT file instead - simple relative path
-        srt_file_path = synced_srt_file.replace('\\', '/')
-        
-    except Exception as e:
-        print(f"⚠️ Could not sync timing, using original SRT: {e}")
-        srt_file_path = str(srt_file).replace('\\', '/')
+    if Config.NARRATION_TRIM_SILENCE:
+        audio_file = trim_silence(audio_file)
     
-    # Use the synced SRT file with correct timing
-    srt_file_path = synced_srt_file.replace('\\', '/')
-    print(f"🎯 Using synced SRT file: {srt_file_path}")
-
-    # Build the filter complex with subtitles - move to lower third
-    print(f"🎯 Using SRT file: {srt_file_path}")
-    filter_complex = [
-        "[0:v]scale=1080:1920[scaled]",
-        f"[scaled]subtitles='{srt_file_path}':force_style='FontName=Segoe UI,FontSize=16,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,BackColour=&H80000000,Bold=1,Outline=2,Shadow=1,Alignment=2,MarginV=400,MarginL=80,MarginR=80'[v]"
-    ]
+    synced_captions_file = f"output/temp/synced_{srt_file.stem}.ass"
+    alignment = load_alignment(audio_file) if Config.CAPTION_KARAOKE else None
+    if alignment:
+        # Timing came back with the audio: word-highlighted captions, no probe or resync
+        captions_path = write_karaoke(alignment, synced_captions_file, CAPTION_STYLE)
+        print(f"✅ Generated karaoke captions: {captions_path}")
+    else:
+        captions_path = sync_captions(srt_file, cues, audio_file, synced_captions_file)
+    
+    # Move each cue away from bright or busy parts of the background
+    if Config.CAPTION_AUTO_PLACEMENT:
+        captions_path = place_captions(
+            captions_path,
+            background_video,
+            margin=CAPTION_STYLE.margin,
+            style=CAPTION_STYLE
+        ) or captions_path
+    print(f"🎯 Using captions: {captions_path}")
+    # Bundled fonts via fontsdir; the style only applies to the SRT fallback
+    caption_filter = subtitles_filter(
+        captions_path.replace('\\', '/'),
+        "FontName=DejaVu Sans,FontSize=16,PrimaryColour=&Hffffff,OutlineColour=&H000000,Bold=1,Outline=2,Alignment=2,MarginV=50"
+    )
 
-    # FFmpeg command to combine everything
-    ffmpeg_path = "C:/Program Files/ffmpeg-7.1.1-full_build/bin/ffmpeg.exe"
+    # Mezzanine backgrounds are already 1080x1920 and don't need rescaling
+    scale_filter = "" if is_normalized(background_video) else "scale=1080:1920,"
+    
+    # Second loudnorm pass runs in the final render (the measurement is cached per audio)
+    audio_filter = normalization_filter(audio_file)
     
     # Convert paths to proper format for FFmpeg
     background_video = background_video.replace('\\', '/')
     audio_file = audio_file.replace('\\', '/')
     output_file = output_file.replace('\\', '/')
     
-    command = [
-        ffmpeg_path,
+    # FFmpeg arguments to combine everything (the binary comes from the shared runner)
+    command = []
+    if threads:
+        command += ["-filter_threads", str(threads)]
+    command += [
         "-i", background_video,
         "-i", audio_file,
-        "-vf", f"scale=1080:1920,subtitles='{srt_file_path}':force_style='FontName=Arial,FontSize=16,PrimaryColour=&Hffffff,OutlineColour=&H000000,Bold=1,Outline=2,Alignment=2,MarginV=50'",
+        "-vf", f"{scale_filter}{caption_filter}",
+        *(["-af", audio_filter] if audio_filter else []),
         "-c:v", "libx264",
         "-preset", "medium",
         "-crf", "23",
         "-c:a", "aac",
         "-b:a", "192k",
+        *(["-threads", str(threads)] if threads else []),
         "-shortest",
         "-y",
         output_file
     ]
 
     try:
-        print("Running FFmpeg command:")
+        print("Running FFmpeg with arguments:")
         print(" ".join(command))
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        run_ffmpeg(command, progress=progress_printer(Path(output_file).name))
         print(f"✅ Created final video: {output_file}")
         return True
     except subprocess.CalledProcessError as e:
@@ -191,10 +185,18 @@ def create_final_video(srt_file, background_video, output_file):
             print(e.stderr)
         return False
 
-def main():
-    """Create final videos for caption files that have corresponding audio."""
-    # Input background video
-    background_video = "assets/looped_background_11.mp4"
+DEFAULT_BACKGROUND = "assets/looped_background_11.mp4"
+
+def main(caption_numbers=None, max_jobs=None, background_video=None):
+    """Create final videos for the given caption files (default: story 41), rendering them in parallel.
+
+    Without background_video, each story gets a portrait clip from the background
+    library that is at least as long as its narration (renders here don't loop).
+    """
+    library = None
+    if not background_video:
+        library = BackgroundLibrary()
+        library.scan()
     
     # Get all caption files
     caption_files = sorted(Path("output/captions").glob("captions_*.srt"))
@@ -202,12 +204,18 @@ def main():
         print("❌ No caption files found")
         return
     
-    # Process story 41
-    srt_file = Path("output/captions/captions_41.srt")
-    if not srt_file.exists():
-        print("❌ captions_41.srt not found")
+    srt_files = []
+    for number in caption_numbers or ["41"]:
+        srt_file = Path(f"output/captions/captions_{number}.srt")
+        if not srt_file.exists():
+            print(f"❌ {srt_file.name} not found")
+            continue
+        srt_files.append(srt_file)
+    if not srt_files:
         return
+    
     # Get all existing final video numbers
+    os.makedirs("output/final", exist_ok=True)
     existing_nums = []
     for f in os.listdir("output/final"):
         if f.startswith("final_") and f.endswith(".mp4"):
@@ -217,10 +225,25 @@ def main():
             except:
                 pass
     next_num = max(existing_nums) + 1 if existing_nums else 1
-    story_num = srt_file.stem.split('_')[1]
-    output_file = f"output/final/final_{next_num}_story_{story_num}.mp4"
-    print(f"\n🎬 Processing {srt_file.name}...")
-    create_final_video(srt_file, background_video, output_file)
+    
+    # Limit fontconfig to the bundled fonts and build its cache once, before the renders start
+    warm_font_cache()
+    
+    # Number outputs up front so concurrent renders never collide
+    pool = RenderPool(max_jobs=max_jobs)
+    for offset, srt_file in enumerate(srt_files):
+        story_num = srt_file.stem.split('_')[1]
+        output_file = f"output/final/final_{next_num + offset}_story_{story_num}.mp4"
+        print(f"\n🎬 Processing {srt_file.name}...")
+        background = background_video
+        if library:
+            audio_file = f"output/audio/audio_{story_num}.mp3"
+            needed = get_duration(audio_file) if os.path.exists(audio_file) else Config.DEFAULT_VIDEO_DURATION
+            matches = library.query(min_duration=needed, portrait=True, limit=1)
+            background = matches[0]["path"] if matches else DEFAULT_BACKGROUND
+        pool.submit(create_final_video, srt_file, background, output_file)
+    pool.wait()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    # Optional caption numbers, e.g. `python create_final_videos.py 41 42 43`
+    main(sys.argv[1:] or None)
\ No newline at end of file
@@ -3,31 +3,23 @@
 Generate Greek beach stories and create SRT files with proper timing.
 """
 
+import asyncio
 import os
 import re
 from story_generator import GreekStoryGenerator
+import subtitles
+import caption_layout
+import narration_length
 
 def estimate_narration_time(text):
-    """Estimate narration time based on Greek text length and complexity."""
-    # Average Greek speaking rate: ~3-4 characters per second for natural narration
-    # Adjust for punctuation and pauses
-    chars = len(text)
-    words = len(text.split())
-    
-    # Base time: 3.5 chars per second
-    base_time = chars / 3.5
-    
-    # Add pause time for punctuation
-    commas = text.count(',')
-    periods = text.count('.')
-    pause_time = (commas * 0.3) + (periods * 0.5)
-    
-    return base_time + pause_time
+    """Estimate narration time of Greek text, calibrated on past narrations (see narration_length)."""
+    return narration_length.predict_duration(text)
 
 def create_srt_from_story(story_text, target_duration=55):
     """Create SRT content from story text with proper timing."""
-    # Split story into sentences
+    # Split story into sentences, laid out as captions that fit the frame
     sentences = [s.strip() for s in story_text.split('.') if s.strip()]
+    sentences = [cue for cues in caption_layout.layout_captions(sentences) for cue in cues]
     
     if not sentences:
         return None
@@ -38,33 +30,15 @@ def create_srt_from_story(story_text, target_duration=55):
     # Scale to target duration if needed
     time_scale = target_duration / total_estimated_time if total_estimated_time > 0 else 1
     
-    srt_content = []
+    cues = []
     current_time = 0.0
     
-    for i, sentence in enumerate(sentences):
+    for sentence in sentences:
         sentence_duration = estimate_narration_time(sentence) * time_scale
-        start_time = current_time
-        end_time = current_time + sentence_duration
-        
-        # Convert to SRT time format
-        start_h = int(start_time // 3600)
-        start_m = int((start_time % 3600) // 60)
-        start_s = int(start_time % 60)
-        start_ms = int((start_time % 1) * 1000)
-        
-        end_h = int(end_time // 3600)
-        end_m = int((end_time % 3600) // 60)
-        end_s = int(end_time % 60)
-        end_ms = int((end_time % 1) * 1000)
-        
-        srt_content.append(f"{i + 1}")
-        srt_content.append(f"{start_h:02d}:{start_m:02d}:{start_s:02d},{start_ms:03d} --> {end_h:02d}:{end_m:02d}:{end_s:02d},{end_ms:03d}")
-        srt_content.append(sentence)
-        srt_content.append("")
-        
-        current_time = end_time
+        cues.append(subtitles.Cue.from_seconds(current_time, current_time + sentence_duration, sentence))
+        current_time += sentence_duration
     
-    return "\n".join(srt_content)
+    return subtitles.format_srt(cues)
 
 def get_next_story_number():
     """Get the next available story number."""
@@ -73,7 +47,7 @@ def get_next_story_number():
         i += 1
     return i
 
-def main():
+async def main():
     """Generate 10 beach stories with SRT files."""
     generator = GreekStoryGenerator()
     
@@ -86,10 +60,9 @@ def main():
     
     # Find next available number and generate 10 stories
     start_num = get_next_story_number()
-    for i in range(start_num, start_num + 10):
-        print(f"\n🎬 Generating story {i}: Beach confidence story")
-        
-        story = generator.generate_story(theme, duration=60)
+    print(f"\n🎬 Generating stories {start_num}-{start_num + 9}: Beach confidence story")
+    async for index, story in generator.generate_story_batches(theme, 10, duration=60):
+        i = start_num + index
         if story:
             # Save story
             story_file = f"output/stories/story_{i}.txt"
@@ -111,4 +84,4 @@ def main():
             print(f"❌ Failed to generate story {i}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
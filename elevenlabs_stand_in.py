@@ -0,0 +1,133 @@
+"""
+Local stand-in for the ElevenLabs text-to-speech API.
+
+Serves the two synthesis endpoints the audio generator uses, returning a
+tone per word (silence between words and after punctuation) encoded as MP3,
+and for /with-timestamps a synthetic character alignment matching it. Point
+the generator at it to exercise audio, karaoke captions and renders offline:
+
+    python elevenlabs_stand_in.py --port 8765
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8765/v1 python main.py ...
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import tempfile
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import ffmpeg_runner
+
+SAMPLE_RATE = 24000
+CHAR_SECONDS = 0.065  # Per spoken character
+SPACE_SECONDS = 0.06
+PUNCTUATION_SECONDS = 0.35  # Extra pause after . , ; ! ·
+PUNCTUATION = set(".,;!?·…")
+
+def synthetic_alignment(text):
+    """ElevenLabs-style character alignment for text at a fixed speaking rate."""
+    starts, ends = [], []
+    time = 0.0
+    for char in text:
+        duration = SPACE_SECONDS if char.isspace() else CHAR_SECONDS
+        if char in PUNCTUATION:
+            duration += PUNCTUATION_SECONDS
+        starts.append(round(time, 3))
+        time += duration
+        ends.append(round(time, 3))
+    return {
+        "characters": list(text),
+        "character_start_times_seconds": starts,
+        "character_end_times_seconds": ends
+    }
+
+def synthetic_speech(alignment):
+    """MP3 bytes with a tone under every spoken character of the alignment."""
+    total = alignment["character_end_times_seconds"][-1] if alignment["characters"] else 0.5
+    samples = np.zeros(int((total + 0.3) * SAMPLE_RATE), dtype=np.float32)
+    for char, start, end in zip(
+        alignment["characters"],
+        alignment["character_start_times_seconds"],
+        alignment["character_end_times_seconds"]
+    ):
+        if char.isspace() or char in PUNCTUATION:
+            continue
+        first, last = int(start * SAMPLE_RATE), int(min(end, start + CHAR_SECONDS) * SAMPLE_RATE)
+        t = np.arange(last - first) / SAMPLE_RATE
+        samples[first:last] = 0.3 * np.sin(2 * np.pi * (180 + 40 * (ord(char) % 5)) * t)
+
+    handle, wav_path = tempfile.mkstemp(suffix=".wav")
+    os.close(handle)
+    mp3_path = wav_path[:-4] + ".mp3"
+    try:
+        with wave.open(wav_path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes((samples * 32767).astype('<i2').tobytes())
+        ffmpeg_runner.run_ffmpeg(['-i', wav_path, '-c:a', 'libmp3lame', '-b:a', '64k', '-y', mp3_path])
+        with open(mp3_path, 'rb') as f:
+            return f.read()
+    finally:
+        for path in (wav_path, mp3_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    SYNTHESIS = re.compile(r"^/v1/text-to-speech/[^/]+(/with-timestamps)?/?$")
+
+    def do_POST(self):
+        match = self.SYNTHESIS.match(self.path.split('?')[0])
+        if not match:
+            return self._send(404, "application/json", json.dumps({"detail": "not found"}).encode('utf-8'))
+        try:
+            text = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))["text"]
+        except (ValueError, KeyError):
+            return self._send(422, "application/json", json.dumps({"detail": "text is required"}).encode('utf-8'))
+
+        alignment = synthetic_alignment(text)
+        audio = synthetic_speech(alignment)
+        if match.group(1):
+            body = json.dumps({
+                "audio_base64": base64.b64encode(audio).decode('ascii'),
+                "alignment": alignment,
+                "normalized_alignment": alignment
+            }).encode('utf-8')
+            self._send(200, "application/json", body)
+        else:
+            self._send(200, "audio/mpeg", audio)
+
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') == "/v1/voices":
+            return self._send(200, "application/json", json.dumps({"voices": []}).encode('utf-8'))
+        self._send(404, "application/json", json.dumps({"detail": "not found"}).encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"🧪 {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+def serve(host="127.0.0.1", port=8765):
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    print(f"🧪 ElevenLabs stand-in on http://{host}:{port}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the ElevenLabs TTS API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,66 @@
+"""
+Named encoding profiles for draft, final and archive renders.
+
+A profile fixes the output size, frame rate and encoder settings. Caption
+styles are given in libass script units, which libass scales with the output
+frame height, so a 540x960 draft shows captions at the same relative size,
+position and outline weight as the final 1080x1920 render.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+from config import Config
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    name: str
+    width: int
+    height: int
+    fps: int
+    preset: str
+    crf: int
+    video_bitrate: Optional[str]
+    audio_bitrate: str
+
+    @property
+    def caption_scale(self):
+        """Size of this profile's frame relative to the 1080x1920 reference."""
+        return self.height / Config.VIDEO_HEIGHT
+
+    def matches_mezzanine(self):
+        """True if mezzanine backgrounds can be used without fps/scale filters."""
+        return (self.width, self.height, self.fps) == (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT, Config.VIDEO_FPS)
+
+    def scale_filters(self):
+        return [f"fps={self.fps}", f"scale={self.width}:{self.height}"]
+
+    def video_args(self):
+        args = ['-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf)]
+        if self.video_bitrate:
+            args += ['-b:v', self.video_bitrate]
+        return args + ['-pix_fmt', 'yuv420p']
+
+    def closed_gop_args(self):
+        """One-second closed GOPs, so chunks and loops can be joined by stream copy."""
+        return ['-g', str(self.fps), '-keyint_min', str(self.fps), '-sc_threshold', '0', '-flags', '+cgop']
+
+    def audio_args(self):
+        return ['-c:a', 'aac', '-b:a', self.audio_bitrate]
+
+PROFILES = {
+    # Quick look at caption timing and framing
+    "draft": EncodingProfile("draft", 540, 960, 15, "ultrafast", 28, None, "96k"),
+    # What we publish
+    "final": EncodingProfile("final", Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT, Config.VIDEO_FPS, "medium", 23, "2500k", "192k"),
+    # High-quality master for re-edits
+    "archive": EncodingProfile("archive", Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT, Config.VIDEO_FPS, "slow", 16, None, "256k"),
+}
+
+def get_profile(profile=None):
+    """Resolve a profile name (or profile) to an EncodingProfile."""
+    if isinstance(profile, EncodingProfile):
+        return profile
+    name = profile or Config.DEFAULT_ENCODING_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}' (choose from {', '.join(PROFILES)})")
+    return PROFILES[name]
@@ -0,0 +1,278 @@
+"""
+Shared ffmpeg runner with live progress, timeouts and a stall watchdog.
+
+The ffmpeg/ffprobe binaries are discovered once (FFMPEG_PATH/FFPROBE_PATH,
+then PATH, then the usual install folders) and the build's filters and
+encoders are cached on disk keyed by binary size + mtime. run_ffmpeg()
+streams `-progress pipe:1` updates to an optional callback, kills a run that
+exceeds its wall-clock limit or stops making progress (stalls are retried),
+and keeps only the last lines of stderr.
+"""
+
+import collections
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from config import Config
+from atomic_files import save_json
+
+class FFmpegError(subprocess.CalledProcessError):
+    """ffmpeg failed; stderr holds the tail of its log."""
+
+    def __init__(self, returncode, cmd, stderr=None, reason=None):
+        super().__init__(returncode, cmd, stderr=stderr)
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason:
+            return f"ffmpeg {self.reason}"
+        return f"ffmpeg exited with status {self.returncode}"
+
+class FFmpegTimeout(FFmpegError):
+    """ffmpeg ran past its wall-clock limit and was killed."""
+
+class FFmpegStalled(FFmpegTimeout):
+    """ffmpeg stopped making progress and was killed."""
+
+@dataclass(frozen=True)
+class Toolchain:
+    ffmpeg: str
+    ffprobe: Optional[str]
+    version: str
+    filters: frozenset
+    encoders: frozenset
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    @property
+    def has_libass(self):
+        """True if captions can be burned in (subtitles/ass filters)."""
+        return self.has_filter("subtitles") and self.has_filter("ass")
+
+_toolchain = None
+_toolchain_lock = threading.Lock()
+_FLAGS = re.compile(r"[A-Z.|]{3,6}")
+
+def find_binary(name, configured=None):
+    """Resolve an ffmpeg-suite binary: configured path, PATH, then Config.FFMPEG_SEARCH_DIRS."""
+    candidates = [configured, name]
+    for directory in Config.FFMPEG_SEARCH_DIRS:
+        candidates += [os.path.join(directory, name), os.path.join(directory, f"{name}.exe")]
+    for candidate in candidates:
+        if candidate:
+            resolved = shutil.which(candidate)
+            if resolved:
+                return resolved
+    return None
+
+def toolchain():
+    """Return the process-wide Toolchain, discovering it on first use."""
+    global _toolchain
+    with _toolchain_lock:
+        if _toolchain is None:
+            _toolchain = _discover()
+        return _toolchain
+
+def _discover():
+    ffmpeg_path = find_binary("ffmpeg", Config.FFMPEG_PATH)
+    if not ffmpeg_path:
+        raise RuntimeError("FFmpeg not found. Set FFMPEG_PATH or add ffmpeg to PATH.")
+    ffprobe_path = find_binary("ffprobe", Config.FFPROBE_PATH)
+
+    stat = os.stat(ffmpeg_path)
+    key = f"{os.path.abspath(ffmpeg_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    cache = _load_capabilities()
+    entry = cache.get(key)
+    if not entry:
+        entry = {
+            "version": _ffmpeg_output(ffmpeg_path, "-version").splitlines()[0].split(" Copyright")[0].strip(),
+            "filters": _listed_names(_ffmpeg_output(ffmpeg_path, "-filters")),
+            "encoders": _listed_names(_ffmpeg_output(ffmpeg_path, "-encoders"))
+        }
+        cache[key] = entry
+        _save_capabilities(cache)
+
+    return Toolchain(
+        ffmpeg=ffmpeg_path,
+        ffprobe=ffprobe_path,
+        version=entry["version"],
+        filters=frozenset(entry["filters"]),
+        encoders=frozenset(entry["encoders"])
+    )
+
+def _ffmpeg_output(ffmpeg_path, option):
+    result = subprocess.run([ffmpeg_path, '-hide_banner', option], capture_output=True, text=True, timeout=60)
+    return result.stdout
+
+def _listed_names(listing):
+    """Names from `ffmpeg -filters` / `-encoders` rows such as ' TSC scale ...'."""
+    names = []
+    for line in listing.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and _FLAGS.fullmatch(parts[0]) and parts[1] != "=":
+            names.append(parts[1])
+    return sorted(names)
+
+def _load_capabilities():
+    try:
+        with open(Config.TOOLCHAIN_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_capabilities(cache):
+    save_json(Config.TOOLCHAIN_CACHE_PATH, cache)
+
+def run_ffmpeg(args, progress=None, duration=None, timeout=None, stall_timeout=None, retries=None, ffmpeg_path=None):
+    """Run ffmpeg with `args` (everything after the binary) and return its stderr tail.
+
+    progress(update) receives dicts with frame, fps, speed, out_time (seconds),
+    percent (when duration is given) and done. Raises FFmpegError on failure,
+    FFmpegTimeout past `timeout` seconds and FFmpegStalled when no progress is
+    reported for `stall_timeout` seconds after `retries` extra attempts.
+    """
+    stderr, _ = _run(['-progress', 'pipe:1', *args], progress, duration, timeout, stall_timeout, retries, ffmpeg_path, False)
+    return stderr
+
+def read_ffmpeg_output(args, timeout=None, stall_timeout=None, retries=None, ffmpeg_path=None):
+    """Run ffmpeg with an output on pipe:1 (e.g. raw frames) and return the bytes written.
+
+    Timeouts and retries work as in run_ffmpeg, with incoming output counting
+    as progress.
+    """
+    _, output = _run(args, None, None, timeout, stall_timeout, retries, ffmpeg_path, True)
+    return output
+
+def _run(args, progress, duration, timeout, stall_timeout, retries, ffmpeg_path, capture):
+    cmd = [
+        ffmpeg_path or toolchain().ffmpeg,
+        '-hide_banner',
+        '-nostdin',
+        '-nostats',
+        *[str(arg) for arg in args]
+    ]
+    timeout = Config.FFMPEG_TIMEOUT if timeout is None else timeout
+    stall_timeout = Config.FFMPEG_STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    retries = Config.FFMPEG_STALL_RETRIES if retries is None else retries
+
+    for attempt in range(retries + 1):
+        try:
+            return _run_once(cmd, progress, duration, timeout, stall_timeout, capture)
+        except FFmpegStalled as e:
+            if attempt >= retries:
+                raise
+            print(f"⚠️ {e}, retrying ({attempt + 1}/{retries})...")
+
+def _run_once(cmd, progress, duration, timeout, stall_timeout, capture):
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    tail = collections.deque(maxlen=Config.FFMPEG_STDERR_LINES)
+    chunks = []
+    state = {"marker": None, "last_progress": time.monotonic(), "out_time": 0.0}
+
+    def read_stderr():
+        for line in process.stderr:
+            tail.append(line.decode('utf-8', 'replace').rstrip())
+
+    def read_progress():
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+            block[key] = value
+            if key != 'progress':
+                continue
+            update = _parse_progress(block, duration, state["out_time"])
+            state["out_time"] = update["out_time"]
+            marker = (update["frame"], update["out_time"], block.get("total_size"))
+            if marker != state["marker"]:
+                state["marker"] = marker
+                state["last_progress"] = time.monotonic()
+            if progress:
+                progress(update)
+            block = {}
+
+    def read_output():
+        for chunk in iter(lambda: process.stdout.read(65536), b''):
+            chunks.append(chunk)
+            state["last_progress"] = time.monotonic()
+
+    readers = [
+        threading.Thread(target=read_stderr, daemon=True),
+        threading.Thread(target=read_output if capture else read_progress, daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    started = time.monotonic()
+    error = None
+    while True:
+        try:
+            returncode = process.wait(timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        now = time.monotonic()
+        if timeout and now - started > timeout:
+            error = FFmpegTimeout
+            reason = f"exceeded the {timeout}s time limit"
+        elif stall_timeout and now - state["last_progress"] > stall_timeout:
+            error = FFmpegStalled
+            reason = f"made no progress for {stall_timeout}s"
+        if error:
+            process.kill()
+            returncode = process.wait()
+            break
+
+    for reader in readers:
+        reader.join(timeout=5)
+    stderr = "\n".join(tail)
+    if error:
+        raise error(returncode, cmd, stderr=stderr, reason=reason)
+    if returncode:
+        raise FFmpegError(returncode, cmd, stderr=stderr)
+    return stderr, b"".join(chunks)
+
+def _parse_progress(block, duration, previous_out_time=0.0):
+    # out_time_us is N/A while the muxer flushes; keep the last known position
+    out_time_us = block.get("out_time_us", "")
+    out_time = int(out_time_us) / 1_000_000 if out_time_us.lstrip('-').isdigit() else previous_out_time
+    update = {
+        "frame": int(block["frame"]) if block.get("frame", "").isdigit() else None,
+        "fps": _to_float(block.get("fps")),
+        "speed": _to_float(block.get("speed", "").rstrip('x')),
+        "out_time": max(out_time, 0.0),
+        "percent": None,
+        "done": block.get("progress") == "end"
+    }
+    if duration:
+        update["percent"] = min(100.0, update["out_time"] / duration * 100)
+    return update
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def progress_printer(label, interval=5.0):
+    """Progress callback that prints one status line every `interval` seconds."""
+    last_print = [time.monotonic()]
+
+    def report(update):
+        now = time.monotonic()
+        if update["done"] or now - last_print[0] < interval:
+            return
+        last_print[0] = now
+        percent = f" {update['percent']:.0f}%" if update["percent"] is not None else ""
+        speed = f", {update['speed']:.2f}x" if update["speed"] else ""
+        print(f"⏳ {label}:{percent} {update['out_time']:.1f}s encoded @ {update['fps'] or 0:.0f} fps{speed}")
+    return report
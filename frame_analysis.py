@@ -0,0 +1,268 @@
+"""
+Frame analysis for caption placement and contrast.
+
+Each background is decoded once at a low rate and size into grayscale
+frames piped from ffmpeg into NumPy. Per horizontal band of the frame we
+keep mean luminance, edge density and motion; these statistics are cached
+per background. For every cue the bands under each candidate caption
+position are averaged over the cue's time window (all cues at once), and
+the calmest, darkest position wins. Busy or bright spots get a heavier
+outline or a dark halo behind the text.
+
+Placement is written as ASS override tags at the start of each cue (e.g.
+{\\an8} for the top), in SRT or ASS caption files.
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+from config import Config
+from background_cache import BackgroundCache
+import ffmpeg_runner
+import ass_subtitles
+import subtitles
+from output_targets import SRT_PLAY_RES_Y
+
+ANALYSIS_FPS = 4
+ANALYSIS_WIDTH = 36
+ANALYSIS_HEIGHT = 64
+BANDS = 32
+# Captions are centred; only the middle of the frame width matters
+COLUMN_RANGE = (0.1, 0.9)
+# libass's default bottom/top margin for SRT (MarginV=10 on the 288-unit script)
+DEFAULT_MARGIN = 10 / SRT_PLAY_RES_Y
+
+# (alignment, preference penalty): bottom is the default, top is least preferred
+POSITIONS = ((2, 0.0), (5, 0.12), (8, 0.2))
+LUMINANCE_WEIGHT = 1.0
+BUSYNESS_WEIGHT = 1.5
+BUSY_STRONG = 0.10  # Busyness (0-1) from which the outline is thickened
+BUSY_BOX = 0.22  # ... and from which a dark halo is drawn behind the text
+BRIGHT_STRONG = 120  # Mean luma (0-255) thresholds for the same steps
+BRIGHT_BOX = 170
+
+# Leading override block written by an earlier placement run (other tags, e.g. karaoke, are kept)
+PLACEMENT_TAGS = re.compile(r"^\{(?:\\rBox|\\an\d|\\bord[\d.]+|\\shad[\d.]+|\\blur[\d.]+|\\3a&H[0-9A-Fa-f]+&)+\}")
+
+# Border, shadow and blur per emphasis, in SRT script units (of 288); box also darkens the border alpha
+EMPHASIS = {
+    "normal": {},
+    "strong": {"bord": 3, "shad": 1.5},
+    "box": {"bord": 6, "shad": 0, "blur": 4}
+}
+BOX_ALPHA = "\\3a&H30&"
+
+@dataclass(frozen=True)
+class CaptionPlacement:
+    alignment: int  # ASS numpad alignment: 2 bottom, 5 middle, 8 top
+    emphasis: str  # normal, strong or box
+    luminance: float
+    busyness: float
+
+    def override_tags(self, ass=False, play_res_y=SRT_PLAY_RES_Y):
+        """ASS override block applying this placement to a cue ('' for the default).
+
+        In .ass files (play_res_y units high) the box emphasis switches to the
+        Box style, an opaque background; SRT has no per-cue border style, so
+        it gets a dark halo.
+        """
+        alignment = "" if self.alignment == 2 else f"\\an{self.alignment}"
+        if ass and self.emphasis == "box":
+            return "{\\rBox" + alignment + "}"
+        units = play_res_y / SRT_PLAY_RES_Y
+        tags = alignment + "".join(f"\\{tag}{value * units:.3g}" for tag, value in EMPHASIS[self.emphasis].items())
+        if self.emphasis == "box":
+            tags += BOX_ALPHA
+        return "{" + tags + "}" if tags else ""
+
+def frame_statistics(background_video, ffmpeg_path=None, cache=None):
+    """Per-frame, per-band luminance, edge and motion arrays for a clip (cached).
+
+    Returns a dict of arrays shaped (frames, BANDS) plus 'fps'.
+    """
+    cache = cache or BackgroundCache()
+
+    def build(path):
+        frames = _decode_frames(background_video, ffmpeg_path)
+        np.savez(path, **_band_statistics(frames))
+        return True
+
+    stats_file = cache.get_or_create(
+        background_video,
+        build,
+        suffix=".npz",
+        kind="frame_stats",
+        fps=ANALYSIS_FPS,
+        frame_size=f"{ANALYSIS_WIDTH}x{ANALYSIS_HEIGHT}",
+        bands=BANDS,
+        columns=COLUMN_RANGE
+    )
+    if not stats_file:
+        return None
+    with np.load(stats_file) as data:
+        stats = {key: data[key] for key in data.files}
+    stats["fps"] = ANALYSIS_FPS
+    return stats
+
+def _decode_frames(background_video, ffmpeg_path=None):
+    """Grayscale frames (n, ANALYSIS_HEIGHT, ANALYSIS_WIDTH) as uint8 from an ffmpeg pipe."""
+    print(f"🔬 Analysing background frames: {os.path.basename(str(background_video))}")
+    raw = ffmpeg_runner.read_ffmpeg_output(
+        [
+            '-i', str(background_video),
+            '-an',
+            '-vf', f"fps={ANALYSIS_FPS},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT}:flags=area,format=gray",
+            '-f', 'rawvideo',
+            'pipe:1'
+        ],
+        ffmpeg_path=ffmpeg_path
+    )
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT
+    count = len(raw) // frame_size
+    if count == 0:
+        raise ValueError(f"No frames decoded from {background_video}")
+    return np.frombuffer(raw[:count * frame_size], dtype=np.uint8).reshape(count, ANALYSIS_HEIGHT, ANALYSIS_WIDTH)
+
+def _band_statistics(frames):
+    """Reduce frames to per-band luminance (0-255), edge density and motion (0-1)."""
+    left, right = (int(round(f * ANALYSIS_WIDTH)) for f in COLUMN_RANGE)
+    luma = frames[:, :, left:right].astype(np.float32)
+
+    edges = np.zeros_like(luma)
+    edges[:, :, 1:] += np.abs(np.diff(luma, axis=2))
+    edges[:, 1:, :] += np.abs(np.diff(luma, axis=1))
+    motion = np.zeros_like(luma)
+    motion[1:] = np.abs(np.diff(luma, axis=0))
+
+    def per_band(values):
+        # (n, H, W) -> (n, BANDS): mean over the rows of each band and all columns
+        rows = values.mean(axis=2)
+        bounds = np.linspace(0, ANALYSIS_HEIGHT, BANDS + 1).astype(int)
+        return np.add.reduceat(rows, bounds[:-1], axis=1) / np.diff(bounds)
+
+    return {
+        "luminance": per_band(luma),
+        "edges": per_band(edges) / 255.0,
+        "motion": per_band(motion) / 255.0
+    }
+
+def place_cues(stats, cues, caption_height=None, margin=None, view=(0.0, 1.0)):
+    """Choose a CaptionPlacement for each (start, end) cue window in seconds.
+
+    The background loops, so times wrap around the analysed clip length.
+    caption_height and margin are fractions of the output height; view is
+    the (top, height) of the output's crop as fractions of the 9:16 frame.
+    """
+    if not cues:
+        return []
+    caption_height = caption_height or _caption_height()
+    margin = DEFAULT_MARGIN if margin is None else margin
+    frame_count = len(stats["luminance"])
+    fps = stats["fps"]
+
+    # Frame indices of every cue window, concatenated, so one reduceat averages them all
+    windows = []
+    for start, end in cues:
+        first = int(math.floor(start * fps))
+        last = max(first + 1, int(math.ceil(end * fps)))
+        windows.append(np.arange(first, last) % frame_count)
+    offsets = np.cumsum([0] + [len(w) for w in windows[:-1]])
+    indices = np.concatenate(windows)
+    lengths = np.array([len(w) for w in windows])[:, None]
+
+    luminance = np.add.reduceat(stats["luminance"][indices], offsets, axis=0) / lengths
+    busyness = np.add.reduceat(stats["edges"][indices] + stats["motion"][indices], offsets, axis=0) / lengths
+
+    # Band ranges covered by a caption at each candidate position
+    regions = {
+        2: (1.0 - margin - caption_height, 1.0 - margin),
+        5: (0.5 - caption_height / 2, 0.5 + caption_height / 2),
+        8: (margin, margin + caption_height)
+    }
+    scores, region_luma, region_busy = [], [], []
+    view_top, view_height = view
+    for alignment, penalty in POSITIONS:
+        top, bottom = (view_top + y * view_height for y in regions[alignment])
+        first = max(0, int(math.floor(top * BANDS)))
+        last = min(BANDS, max(first + 1, int(math.ceil(bottom * BANDS))))
+        luma = luminance[:, first:last].mean(axis=1)
+        busy = busyness[:, first:last].mean(axis=1)
+        region_luma.append(luma)
+        region_busy.append(busy)
+        scores.append(LUMINANCE_WEIGHT * luma / 255.0 + BUSYNESS_WEIGHT * busy + penalty)
+
+    best = np.argmin(np.stack(scores), axis=0)
+    chosen_luma = np.stack(region_luma)[best, np.arange(len(cues))]
+    chosen_busy = np.stack(region_busy)[best, np.arange(len(cues))]
+
+    placements = []
+    for i, choice in enumerate(best):
+        luma, busy = float(chosen_luma[i]), float(chosen_busy[i])
+        if luma >= BRIGHT_BOX or busy >= BUSY_BOX:
+            emphasis = "box"
+        elif luma >= BRIGHT_STRONG or busy >= BUSY_STRONG:
+            emphasis = "strong"
+        else:
+            emphasis = "normal"
+        placements.append(CaptionPlacement(POSITIONS[choice][0], emphasis, round(luma, 1), round(busy, 3)))
+    return placements
+
+def _caption_height(scale=1.0):
+    """Approximate height of a two-line caption as a fraction of the frame height."""
+    # libass lays SRT out on a 288-unit-high script; lines are ~1.25 x the font size
+    return 2 * 1.25 * Config.CAPTION_FONT_SIZE * scale / SRT_PLAY_RES_Y
+
+def _target_view(target):
+    """(top, height) of a target's centre crop as fractions of the 9:16 frame height."""
+    height = min(1.0, (Config.VIDEO_WIDTH * target.height / target.width) / Config.VIDEO_HEIGHT)
+    return ((1.0 - height) / 2, height)
+
+def place_captions(captions_file, background_video, output_file=None, target=None, margin=None, style=None,
+                   ffmpeg_path=None, cache=None):
+    """Write a copy of an SRT or ASS caption file with per-cue placement tags for the given background.
+
+    With an output target, placement accounts for its crop, caption size and
+    margin (and ASS output is laid out for it); margin alone overrides the
+    default bottom margin (a fraction of the height). style is the
+    CaptionStyle of ASS output. Returns the new file's path
+    (<name>[.<target>].placed.<ext>), or None if the background couldn't be
+    analysed.
+    """
+    try:
+        stats = frame_statistics(background_video, ffmpeg_path, cache)
+    except (ffmpeg_runner.FFmpegError, ValueError, OSError) as e:
+        print(f"⚠️ Could not analyse background, keeping default caption placement: {e}")
+        return None
+    if stats is None:
+        return None
+    ass = ass_subtitles.is_ass(captions_file)
+    cues = subtitles.read(captions_file)
+    if ass and margin is None and style is not None and style.margin is not None:
+        margin = style.margin
+    windows = [(cue.start / 1000, cue.end / 1000) for cue in cues]
+    if target:
+        placements = place_cues(stats, windows, _caption_height(target.caption_scale), target.caption_margin, _target_view(target))
+    else:
+        placements = place_cues(stats, windows, margin=margin)
+
+    # Drop tags from an earlier placement run before adding new ones
+    play_res_y = (target.height if target else Config.VIDEO_HEIGHT) if ass else SRT_PLAY_RES_Y
+    for cue, placement in zip(cues, placements):
+        cue.text = placement.override_tags(ass, play_res_y) + PLACEMENT_TAGS.sub("", cue.text)
+
+    if output_file is None:
+        path = Path(captions_file)
+        name = f"{path.stem}.{target.name}" if target else path.stem
+        output_file = path.with_name(f"{name}.placed{path.suffix}")
+    if ass:
+        ass_subtitles.write_ass(cues, output_file, style, target)
+    else:
+        subtitles.write(cues, output_file)
+
+    moved = sum(1 for p in placements if p.alignment != 2)
+    emphasized = sum(1 for p in placements if p.emphasis != "normal")
+    print(f"🎯 Placed {len(placements)} captions ({moved} moved, {emphasized} with stronger contrast)")
+    return str(output_file)
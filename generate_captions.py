@@ -3,6 +3,7 @@
 Generate multiple SRT caption files for beach stories.
 """
 
+import asyncio
 import os
 from pathlib import Path
 from story_generator import GreekStoryGenerator
@@ -20,8 +21,8 @@ def get_next_number(directory, prefix, suffix):
                 continue
     return max(existing_files, default=0) + 1
 
-def generate_story_captions(num_variations=10, duration=60):
-    """Generate multiple story variations and their caption files."""
+async def generate_story_captions(num_variations=10, duration=60):
+    """Generate multiple story variations and their caption files (stories requested in batches)."""
     
     # Initialize generators
     story_gen = GreekStoryGenerator()
@@ -38,21 +39,14 @@ def generate_story_captions(num_variations=10, duration=60):
     # Story prompt
     story_prompt = "Μια γυναίκα που πάλευε με την εικόνα του σώματός της στην παραλία, αλλά τελικά βρήκε την αυτοπεποίθησή της"
     
-    # Generate variations
-    for _ in range(num_variations):
+    # Generate variations, captioning each story as it arrives
+    print(f"\n📝 Generating {num_variations} story and caption variations")
+    async for _, story in story_gen.generate_story_batches(story_prompt, num_variations, duration=duration):
         # Get next available numbers
         story_num = get_next_number(stories_dir, "story_variation_", ".txt")
         caption_num = get_next_number(captions_dir, "captions_", ".srt")
         
-        print(f"\n📝 Generating story and captions variation {story_num}")
-        
         try:
-            # Generate story
-            story = story_gen.generate_story(
-                topic=story_prompt,
-                duration=duration
-            )
-            
             if not story:
                 print(f"❌ Failed to generate story for variation {story_num}")
                 continue
@@ -84,4 +78,4 @@ def generate_story_captions(num_variations=10, duration=60):
             continue
 
 if __name__ == "__main__":
-    generate_story_captions() 
\ No newline at end of file
+    asyncio.run(generate_story_captions()) 
\ No newline at end of file
@@ -3,10 +3,11 @@
 Generate 10 new longer Greek stories for 50-60 seconds of narration.
 """
 
+import asyncio
 import os
 from story_generator import GreekStoryGenerator
 
-def main():
+async def main():
     """Generate 10 new longer stories."""
     generator = GreekStoryGenerator()
     
@@ -16,11 +17,10 @@ def main():
     # Beach/body confidence theme - the one we've been working on
     theme = "γυναίκα που δεν ένιωθε καλά να πάει στην θάλασσα σκεφτόταν για το σώμα της αλλά τελικά το ξεπέρασε"
     
-    # Generate 10 new longer beach stories
-    for i in range(1, 11):
-        print(f"\n🎬 Generating story {i}: {theme}")
-        
-        story = generator.generate_story(theme, duration=60)
+    # Generate 10 new longer beach stories in batches, saving each as it arrives
+    print(f"\n🎬 Generating stories 1-10: {theme}")
+    async for index, story in generator.generate_story_batches(theme, 10, duration=60):
+        i = index + 1
         if story:
             # Save to file
             story_file = f"output/stories/story_{30+i}.txt"
@@ -32,4 +32,4 @@ def main():
             print(f"❌ Failed to generate story {i}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
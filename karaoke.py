@@ -0,0 +1,123 @@
+"""
+Word-level karaoke captions from TTS character timestamps.
+
+ElevenLabs' with-timestamps synthesis returns, next to the audio, the start
+and end time of every character. The alignment is saved as a sidecar of the
+audio file (<name>.alignment.json); words are the runs of non-space
+characters. Words are grouped into cues of up to Config.CAPTION_MAX_LINES
+lines that fit the frame width (measured with the caption font and
+balanced, see caption_layout), breaking after sentence ends and long
+pauses, and each word gets an ASS \\k tag lasting until the next word
+starts, so it lights up as it is spoken.
+"""
+
+import json
+import math
+import re
+from pathlib import Path
+from config import Config
+import ass_subtitles
+import caption_layout
+
+SENTENCE_END = re.compile(r"[.!;·?…]['\"»)]*$")  # ';' is the Greek question mark
+MAX_WORD_GAP = 0.6  # A longer silence between words starts a new cue
+CAPTION_HOLD = 0.3  # Keep a cue up this long after its last word
+
+def alignment_path(audio_file):
+    """Sidecar file holding the character alignment of audio_file."""
+    return str(Path(audio_file).with_suffix(".alignment.json"))
+
+def save_alignment(alignment, audio_file):
+    with open(alignment_path(audio_file), 'w', encoding='utf-8') as f:
+        json.dump(alignment, f, ensure_ascii=False)
+
+def load_alignment(audio_file):
+    """Character alignment saved with audio_file, or None."""
+    try:
+        with open(alignment_path(audio_file), 'r', encoding='utf-8') as f:
+            alignment = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return alignment
+
+def word_timings(alignment):
+    """(word, start, end) for each run of non-space characters in an alignment."""
+    words = []
+    current = []
+    for char, start, end in zip(
+        alignment["characters"],
+        alignment["character_start_times_seconds"],
+        alignment["character_end_times_seconds"]
+    ):
+        if char.isspace():
+            if current:
+                words.append(("".join(c for c, _, _ in current), current[0][1], current[-1][2]))
+                current = []
+        else:
+            current.append((char, start, end))
+    if current:
+        words.append(("".join(c for c, _, _ in current), current[0][1], current[-1][2]))
+    return words
+
+def group_words(words, measure, max_width, max_lines=None):
+    """Split (word, start, end) tuples into cues, each a list of lines of words.
+
+    Each sentence (or run of words between long pauses) takes as few cues
+    as hold its lines of at most max_width pixels (measured by a
+    caption_layout.TextMeasure), and is broken into balanced lines filling
+    every cue alike, so no cue is left with a stray last word.
+    """
+    max_lines = max_lines or Config.CAPTION_MAX_LINES
+    cues = []
+    for segment in _segments(words):
+        texts = [word[0] for word in segment]
+        broken = caption_layout.break_lines(texts, measure, max_width)
+        cue_count = math.ceil(len(broken) / max_lines)
+        if len(broken) % cue_count:
+            broken = caption_layout.break_lines(texts, measure, max_width, cue_count * math.ceil(len(broken) / cue_count))
+        lines = []
+        for line in broken:
+            lines.append(segment[:len(line)])
+            segment = segment[len(line):]
+        cues.extend(caption_layout.spread_lines(lines, max_lines))
+    return cues
+
+def _segments(words):
+    """Runs of words ending at a sentence end or before a pause longer than MAX_WORD_GAP."""
+    segments = []
+    for i, word in enumerate(words):
+        previous = words[i - 1] if i else None
+        if previous is None or SENTENCE_END.search(previous[0]) or word[1] - previous[2] > MAX_WORD_GAP:
+            segments.append([])
+        segments[-1].append(word)
+    return segments
+
+def karaoke_cues(alignment, style=None, target=None):
+    """(start, end, text) ASS cues with a \\k tag per word."""
+    cues = group_words(word_timings(alignment), *caption_layout.measure_for(style, target))
+    result = []
+    for index, lines in enumerate(cues):
+        words = [word for line in lines for word in line]
+        start = words[0][1]
+        end = words[-1][2] + CAPTION_HOLD
+        if index + 1 < len(cues):
+            end = min(end, cues[index + 1][0][0][1])
+
+        parts = []
+        position = 0
+        for line_number, line in enumerate(lines):
+            if line_number:
+                parts.append("\\N")
+            for word_number, (text, word_start, word_end) in enumerate(line):
+                position += 1
+                # Highlight lasts until the next word starts (centiseconds, rounded on absolute times)
+                until = words[position][1] if position < len(words) else word_end
+                duration = max(1, round(until * 100) - round(word_start * 100))
+                space = " " if word_number + 1 < len(line) else ""
+                parts.append(f"{{\\k{duration}}}{text}{space}")
+        result.append((start, end, "".join(parts)))
+    return result
+
+def write_karaoke(alignment, output_file, style=None, target=None):
+    """Write word-highlighted ASS captions for an alignment."""
+    return ass_subtitles.write_ass(karaoke_cues(alignment, style, target), output_file, style, target)
@@ -0,0 +1,163 @@
+"""
+Chat completion backends for story generation.
+
+A backend turns a chat completion request (the keyword arguments of
+client.chat.completions.create: model, messages, temperature, max_tokens,
+seed, n) into the reply texts, one per choice, through complete(request)
+or, concurrently, await acomplete(request). aclose() releases per-event-loop resources.
+
+- OpenAIBackend calls the OpenAI API; async calls share a RateLimiter.
+- StubBackend returns deterministic Greek stories derived from the request
+  hash, so the pipeline runs offline (CI, benchmarks) with no network.
+- CachedBackend wraps another backend with a ResponseCache; in replay mode
+  it never calls the backend and raises CacheMiss for unknown requests.
+
+get_backend() builds the one Config.LLM_BACKEND and Config.LLM_CACHE select.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+from config import Config
+from llm_cache import CacheMiss, ResponseCache
+from rate_limiter import RateLimiter
+
+STORY_TOKENS = 4000  # Prompt plus max_tokens x n of a story request, kept in reserve of the token budget
+
+class OpenAIBackend:
+    name = "openai"
+
+    def __init__(self, concurrency=None):
+        # Imported here so the offline backends work without the openai package
+        import openai
+        self.openai = openai
+        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.concurrency = concurrency or Config.STORY_CONCURRENCY
+        self._loop = None
+        self._async_client = None
+        self._limiter = None
+
+    def complete(self, request):
+        response = self.client.chat.completions.create(**request)
+        return [choice.message.content for choice in response.choices]
+
+    async def acomplete(self, request):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The async client and limiter are bound to the event loop they run on;
+            # retries are left to the shared limiter
+            self._loop = loop
+            self._async_client = self.openai.AsyncOpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+            self._limiter = RateLimiter(
+                self.concurrency,
+                retries=Config.STORY_REQUEST_RETRIES,
+                transient=(self.openai.APIConnectionError,),
+                token_reserve=STORY_TOKENS
+            )
+        client = self._async_client
+        response = await self._limiter.call(lambda: client.chat.completions.with_raw_response.create(**request))
+        return [choice.message.content for choice in response.choices]
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+        self._loop = self._async_client = self._limiter = None
+
+class StubBackend:
+    """Deterministic offline replies: first-person Greek stories of STORY_SENTENCES sentences.
+
+    A request for a batch of stories (story_generator's JSON instruction)
+    gets them as {"stories": [...]}.
+    """
+    name = "stub"
+    BATCH_REQUEST = re.compile(r'(\d+) ιστορίες στη μορφή \{"stories"')
+
+    STORY_SENTENCES = 12
+    # Each sentence takes one two-word phrase per slot, so stories with
+    # different seeds share few word 3-grams and pass the duplicate check
+    SLOTS = [
+        ["Κάθε πρωί", "Ένα καλοκαίρι", "Εκείνη τη μέρα", "Για χρόνια", "Ένα βράδυ",
+         "Μετά καιρό", "Το απόγευμα", "Από μικρή", "Κάθε Κυριακή", "Ένα Σάββατο"],
+        ["περπατούσα αργά", "σκεφτόμουν συχνά", "ονειρευόμουν κρυφά", "χαμογελούσα δειλά", "κολυμπούσα ήρεμα",
+         "μιλούσα ειλικρινά", "καθόμουν σιωπηλή", "γελούσα δυνατά", "κοίταζα γύρω", "ανέπνεα βαθιά"],
+        ["με θάρρος", "χωρίς φόβο", "με χαρά", "με ελπίδα", "χωρίς ντροπή",
+         "με αγάπη", "με υπομονή", "με ηρεμία", "χωρίς βιασύνη", "με περιέργεια"],
+        ["στην παραλία", "στο κύμα", "στην αμμουδιά", "στο νησί", "στο λιμάνι",
+         "στη γειτονιά", "στο σπίτι", "στον καθρέφτη", "στο μπαλκόνι", "στη βάρκα"]
+    ]
+
+    def complete(self, request):
+        encoded = json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        rng = random.Random(hashlib.sha256(encoded).digest())
+        batch = self.BATCH_REQUEST.search(request["messages"][-1]["content"])
+        replies = []
+        for _ in range(request.get("n") or 1):
+            stories = [self._story(rng) for _ in range(int(batch.group(1)) if batch else 1)]
+            replies.append(json.dumps({"stories": stories}, ensure_ascii=False) if batch else stories[0])
+        return replies
+
+    def _story(self, rng):
+        return " ".join(
+            " ".join(rng.choice(phrases) for phrases in self.SLOTS) + "."
+            for _ in range(self.STORY_SENTENCES)
+        )
+
+    async def acomplete(self, request):
+        return self.complete(request)
+
+    async def aclose(self):
+        pass
+
+class CachedBackend:
+    """A backend whose responses are read from and written to a ResponseCache."""
+
+    def __init__(self, backend, cache=None, replay=False):
+        """backend may be None in replay mode, which never calls it."""
+        self.backend = backend
+        self.cache = cache or ResponseCache()
+        self.replay = replay
+        self.name = "replay" if replay else f"cached {backend.name}"
+
+    def complete(self, request):
+        cached = self._cached(request)
+        if cached is not None:
+            return cached
+        return self.cache.put(request, self.backend.complete(request))
+
+    async def acomplete(self, request):
+        cached = self._cached(request)
+        if cached is not None:
+            return cached
+        return self.cache.put(request, await self.backend.acomplete(request))
+
+    async def aclose(self):
+        if self.backend is not None:
+            await self.backend.aclose()
+
+    def _cached(self, request):
+        cached = self.cache.get(request)
+        if cached is None and self.replay:
+            raise CacheMiss(f"No cached response for this request in {self.cache.cache_dir} (replay mode)")
+        return cached
+
+def get_backend(name=None, cache_mode=None):
+    """The backend called name ("openai" or "stub"), cached per cache_mode ("on", "off" or "replay").
+
+    Defaults come from Config.LLM_BACKEND and Config.LLM_CACHE. The stub is
+    never cached, as its replies are already deterministic.
+    """
+    name = name or Config.LLM_BACKEND
+    cache_mode = cache_mode or Config.LLM_CACHE
+    if name == "stub":
+        return StubBackend()
+    if name != "openai":
+        raise ValueError(f"Unknown LLM backend: {name}")
+    if cache_mode == "replay":
+        # Replay never calls the API, so the openai package and key are not needed
+        return CachedBackend(None, replay=True)
+    backend = OpenAIBackend()
+    if cache_mode == "off":
+        return backend
+    return CachedBackend(backend)
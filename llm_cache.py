@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from config import Config
+from atomic_files import save_json
+
+KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "seed", "n")
+
+class CacheMiss(LookupError):
+    """A replay-only cache had no response for a request."""
+
+class ResponseCache:
+    """On-disk store of LLM responses, one JSON file per request.
+
+    Entries are keyed by a hash of the request's model, messages,
+    temperature, max_tokens, seed and n (number of choices), so re-running
+    a script with the same prompt costs no API call. The directory is
+    capped at max_bytes; the least recently used entries (by file mtime,
+    refreshed on every hit) are evicted first.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or Config.LLM_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = Config.LLM_CACHE_MAX_MB * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, request):
+        """Build the cache key for a chat completion request (see KEY_FIELDS)."""
+        payload = {field: request.get(field) for field in KEY_FIELDS}
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:32]
+
+    def get(self, request):
+        """Return the cached reply texts (one per choice) for request, or None on a miss."""
+        path = self.cache_dir / f"{self.make_key(request)}.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry.get("choices")
+
+    def put(self, request, choices):
+        """Store the reply texts for request and evict to the size cap."""
+        key = self.make_key(request)
+        path = self.cache_dir / f"{key}.json"
+        # Write-then-rename so concurrent requests never read a half-written entry
+        save_json(path, {
+            "request": {field: request.get(field) for field in KEY_FIELDS},
+            "choices": choices,
+            "created": time.time()
+        }, ensure_ascii=False)
+        self.evict(keep=path.name)
+        return choices
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path.name == keep:
+                continue
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
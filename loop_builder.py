@@ -0,0 +1,147 @@
+"""
+Seamless background loops of any length.
+
+A loop unit is encoded once per source clip: the tail of the clip is
+crossfaded into its head, so the unit's last frame flows into its first.
+Backgrounds of any duration are then assembled by repeating the unit with
+the concat demuxer and stream copy, which costs file I/O instead of an encode.
+"""
+
+import math
+import os
+import ffmpeg_runner
+from pathlib import Path
+from config import Config
+from background_cache import BackgroundCache
+import mezzanine
+import media_probe
+
+def probe_duration(path, ffprobe_path=None):
+    """Return the container duration of a media file in seconds."""
+    return media_probe.get_probe(ffprobe_path).get_duration(path)
+
+def crossfade_offset(source_duration, crossfade):
+    """xfade offset that blends the clip's tail into its head.
+
+    The unit starts at `crossfade` seconds into the clip and ends with the
+    fade back to that same point, so it is (source_duration - crossfade) long.
+    """
+    if source_duration <= 2 * crossfade:
+        raise ValueError(
+            f"Clip of {source_duration:.2f}s is too short for a {crossfade}s crossfade loop"
+        )
+    return source_duration - 2 * crossfade
+
+def loop_unit_filter(source_duration, crossfade, video_filters=None):
+    """Build the filtergraph that turns a clip into a seamless loop unit."""
+    prefix = ",".join(video_filters) + "," if video_filters else ""
+    if crossfade <= 0:
+        return f"[0:v]{prefix}format=yuv420p[v]"
+
+    offset = crossfade_offset(source_duration, crossfade)
+    return ";".join([
+        f"[0:v]{prefix}split[body][head]",
+        # xfade needs constant-frame-rate inputs, which trim+setpts doesn't preserve
+        f"[body]trim=start={crossfade},setpts=PTS-STARTPTS,fps={Config.VIDEO_FPS}[tail]",
+        f"[head]trim=end={crossfade},setpts=PTS-STARTPTS,fps={Config.VIDEO_FPS}[intro]",
+        f"[tail][intro]xfade=transition=fade:duration={crossfade}:offset={offset:.3f},format=yuv420p[v]"
+    ])
+
+def build_loop_unit(source, crossfade=None, ffmpeg_path=None, ffprobe_path=None, cache=None):
+    """Encode the seamless loop unit for a clip once and return its path."""
+    cache = cache or BackgroundCache()
+    crossfade = Config.LOOP_CROSSFADE if crossfade is None else crossfade
+
+    def build(path):
+        source_duration = probe_duration(source, ffprobe_path)
+        video_filters = [] if mezzanine.is_normalized(source) else [
+            f"fps={Config.VIDEO_FPS}",
+            f"scale={Config.VIDEO_WIDTH}:{Config.VIDEO_HEIGHT}"
+        ]
+        args = [
+            '-i', str(source),
+            '-filter_complex', loop_unit_filter(source_duration, crossfade, video_filters),
+            '-map', '[v]',
+            '-an',
+            *mezzanine.encoder_args(),
+            '-movflags', '+faststart',
+            '-y',
+            str(path)
+        ]
+        print(f"🔁 Encoding seamless loop unit ({source_duration:.2f}s source, {crossfade}s crossfade)...")
+        ffmpeg_runner.run_ffmpeg(args, progress=ffmpeg_runner.progress_printer("loop unit"), ffmpeg_path=ffmpeg_path)
+        return True
+
+    unit = cache.get_or_create(
+        source,
+        build,
+        kind="loop_unit",
+        fps=Config.VIDEO_FPS,
+        resolution=f"{Config.VIDEO_WIDTH}x{Config.VIDEO_HEIGHT}",
+        crossfade=crossfade
+    )
+    if unit and not mezzanine.is_normalized(unit):
+        mezzanine.mark_normalized(unit, source=str(source), kind="loop_unit", crossfade=crossfade)
+    return unit
+
+def extend_loop(unit, target_duration, output_path, ffmpeg_path=None, ffprobe_path=None):
+    """Repeat a loop unit up to target_duration with the concat demuxer (no re-encode)."""
+    unit_duration = probe_duration(unit, ffprobe_path)
+    repeats = max(1, math.ceil(target_duration / unit_duration))
+
+    list_path = Path(f"{output_path}.concat.txt")
+    unit_path = os.path.abspath(unit).replace('\\', '/').replace("'", "'\\''")
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        f.write(f"file '{unit_path}'\n" * repeats)
+
+    args = [
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', str(list_path),
+        '-c', 'copy',
+        '-t', f"{target_duration:.3f}",
+        '-movflags', '+faststart',
+        '-y',
+        str(output_path)
+    ]
+    try:
+        ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=ffmpeg_path)
+    finally:
+        list_path.unlink()
+    return str(output_path)
+
+def build_looped_background(source, target_duration, crossfade=None, ffmpeg_path=None, ffprobe_path=None, cache=None):
+    """Return a seamless looped background of target_duration seconds.
+
+    The loop unit is encoded at most once per (clip, crossfade); each new
+    duration is assembled from it by stream copy and cached as well.
+    """
+    cache = cache or BackgroundCache()
+    crossfade = Config.LOOP_CROSSFADE if crossfade is None else crossfade
+
+    unit = build_loop_unit(source, crossfade, ffmpeg_path, ffprobe_path, cache)
+    if not unit:
+        return None
+    return extend_loop_unit(unit, target_duration, ffmpeg_path, ffprobe_path, cache)
+
+def is_loop_unit(path):
+    """True if path is a loop unit made by build_loop_unit (its marker says so)."""
+    marker = mezzanine.read_marker(path)
+    return bool(marker) and marker.get("kind") == "loop_unit" and mezzanine.is_normalized(path)
+
+def extend_loop_unit(unit, target_duration, ffmpeg_path=None, ffprobe_path=None, cache=None):
+    """Return the loop unit repeated to target_duration seconds, cached per duration (stream copy only)."""
+    cache = cache or BackgroundCache()
+    marker = mezzanine.read_marker(unit) or {}
+    source, crossfade = marker.get("source", str(unit)), marker.get("crossfade")
+
+    looped = cache.get_or_create(
+        unit,
+        lambda path: extend_loop(unit, target_duration, path, ffmpeg_path, ffprobe_path),
+        kind="looped",
+        duration=float(target_duration)
+    )
+    if looped and not mezzanine.is_normalized(looped):
+        mezzanine.mark_normalized(looped, source=str(source), kind="looped", crossfade=crossfade)
+    return looped
@@ -0,0 +1,102 @@
+"""
+Two-pass EBU R128 loudness normalization for narration.
+
+The first `loudnorm` pass only measures the audio. Its result is cached per
+audio content hash, so each narration is measured once no matter how often it
+is rendered. The second pass is a filter string that the renders apply in
+the same ffmpeg run that muxes the audio.
+"""
+
+import json
+import os
+import threading
+from config import Config
+from atomic_files import save_json
+from background_cache import BackgroundCache
+import ffmpeg_runner
+
+_lock = threading.Lock()
+
+def loudness_target():
+    """Integrated loudness, true peak and loudness range the narration is normalized to."""
+    return {
+        "I": Config.LOUDNESS_TARGET_I,
+        "TP": Config.LOUDNESS_TARGET_TP,
+        "LRA": Config.LOUDNESS_TARGET_LRA
+    }
+
+def measure_loudness(audio_file, ffmpeg_path=None, cache=None):
+    """Return the first-pass loudnorm measurement for audio_file (cached by content)."""
+    cache = cache or BackgroundCache()
+    target = loudness_target()
+    key = f"{cache.source_hash(audio_file)}|{target['I']}|{target['TP']}|{target['LRA']}"
+
+    with _lock:
+        measurements = _load_measurements()
+    if key in measurements:
+        return measurements[key]
+
+    print(f"🔊 Measuring loudness: {os.path.basename(str(audio_file))}")
+    stderr = ffmpeg_runner.run_ffmpeg(
+        [
+            '-v', 'info',
+            '-i', str(audio_file),
+            '-vn',
+            '-af', f"loudnorm=I={target['I']}:TP={target['TP']}:LRA={target['LRA']}:print_format=json",
+            '-f', 'null', '-'
+        ],
+        ffmpeg_path=ffmpeg_path
+    )
+    start, end = stderr.rfind('{'), stderr.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError(f"No loudnorm measurement in ffmpeg output for {audio_file}")
+    raw = json.loads(stderr[start:end + 1])
+    measurement = {
+        "input_i": float(raw["input_i"]),
+        "input_tp": float(raw["input_tp"]),
+        "input_lra": float(raw["input_lra"]),
+        "input_thresh": float(raw["input_thresh"]),
+        "target_offset": float(raw["target_offset"])
+    }
+
+    with _lock:
+        measurements = _load_measurements()
+        measurements[key] = measurement
+        _save_measurements(measurements)
+    return measurement
+
+def loudnorm_filter(measurement):
+    """Second-pass loudnorm filter applying a cached measurement."""
+    target = loudness_target()
+    return (
+        f"loudnorm=I={target['I']}:TP={target['TP']}:LRA={target['LRA']}"
+        f":measured_I={measurement['input_i']}:measured_TP={measurement['input_tp']}"
+        f":measured_LRA={measurement['input_lra']}:measured_thresh={measurement['input_thresh']}"
+        f":offset={measurement['target_offset']}:linear=true:print_format=none,"
+        # loudnorm resamples to 192 kHz internally
+        f"aresample={Config.AUDIO_SAMPLE_RATE}"
+    )
+
+def normalization_filter(audio_file, ffmpeg_path=None, cache=None):
+    """Audio filter normalizing audio_file, or None if disabled or unmeasurable."""
+    if not Config.LOUDNESS_NORMALIZE:
+        return None
+    try:
+        measurement = measure_loudness(audio_file, ffmpeg_path, cache)
+    except (ffmpeg_runner.FFmpegError, ValueError, KeyError, OSError) as e:
+        print(f"⚠️ Could not measure loudness, keeping original levels: {e}")
+        return None
+    # Silence measures as -inf and can't be normalized
+    if measurement["input_i"] == float("-inf"):
+        return None
+    return loudnorm_filter(measurement)
+
+def _load_measurements():
+    try:
+        with open(Config.LOUDNESS_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_measurements(measurements):
+    save_json(Config.LOUDNESS_CACHE_PATH, measurements)
@@ -20,14 +20,18 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from story_generator import GreekStoryGenerator
+import llm_backends
 from audio_generator import GreekAudioGenerator
 from caption_generator import GreekCaptionGenerator
+import speech_timing
 from video_processor import VideoProcessor
+from encoding_profiles import PROFILES
+from output_targets import TARGETS
 from config import Config
 
 class GreekVideoCreator:
-    def __init__(self):
-        self.story_generator = GreekStoryGenerator()
+    def __init__(self, story_backend=None):
+        self.story_generator = GreekStoryGenerator(story_backend)
         self.audio_generator = GreekAudioGenerator()
         self.caption_generator = GreekCaptionGenerator()
         self.video_processor = VideoProcessor()
@@ -35,8 +39,17 @@ class GreekVideoCreator:
         # Create output directory if it doesn't exist
         os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
     
-    def create_complete_video(self, topic, background_video, duration=60, output_file=None):
-        """Create a complete video with story, audio, and captions"""
+    def create_complete_video(self, topic, background_video, duration=60, output_file=None, single_pass=True, parallel_chunks=None, profile=None, targets=None, music=None):
+        """Create a complete video with story, audio, and captions.
+
+        With single_pass (the default) the background is looped, captioned and
+        muxed in one ffmpeg run; otherwise a looped background is encoded first.
+        parallel_chunks (0 = one per core) encodes GOP-aligned chunks in parallel
+        for the lowest wall-clock time on a single reel. profile picks the
+        encoding profile (draft, final or archive). targets (e.g. ["9x16", "1x1",
+        "cover"]) renders several aspect ratios, a cover and a preview in one run.
+        music (a track, or True to pick from the music library) adds a ducked music bed.
+        """
         print("\n🇬🇷 Starting Greek Video Creation")
         print("=" * 50 + "\n")
         
@@ -56,10 +69,17 @@ class GreekVideoCreator:
             if not audio_path:
                 print("❌ Failed to generate audio")
                 return None
+            if Config.NARRATION_TRIM_SILENCE:
+                audio_path = speech_timing.trim_silence(audio_path)
             
             # 3. Generate captions
             print("\n3️⃣ Generating captions")
-            captions_path = self.caption_generator.generate_captions(story)
+            captions_path = self.caption_generator.create_captions(
+                story,
+                duration,
+                os.path.join(Config.OUTPUT_DIR, "captions.ass"),
+                audio_file=audio_path
+            )
             if not captions_path:
                 print("❌ Failed to generate captions")
                 return None
@@ -70,6 +90,11 @@ class GreekVideoCreator:
                 print(f"❌ Background video not found: {background_video}")
                 return None
             print(f"📹 Using existing video: {background_video}")
+            # Normalize once so renders can skip per-frame fps/scale work
+            background_video = self.video_processor.ingest_background(background_video) or background_video
+            if single_pass or targets:
+                # A seamless loop unit lets -stream_loop repeat the clip without visible cuts
+                background_video = self.video_processor.prepare_loop_unit(background_video) or background_video
             
             # Create output filename if not provided
             if not output_file:
@@ -78,34 +103,73 @@ class GreekVideoCreator:
             
             # 5. Create final video
             print("\n5️⃣ Creating final video")
-            # First create the looped background
-            temp_bg = self.video_processor.prepare_background_video(
-                background_video,
-                duration,
-                os.path.join(Config.OUTPUT_DIR, "temp_looped_bg.mp4")
-            )
-            if not temp_bg:
-                print("❌ Failed to prepare background video")
-                return None
-            
-            # Then create the final video with the looped background
-            final_video = self.video_processor.create_final_video(
-                temp_bg,
-                audio_path,
-                captions_path,
-                output_file
-            )
+            outputs = None
+            if targets:
+                outputs = self.video_processor.create_video_multi_output(
+                    background_video,
+                    audio_path,
+                    captions_path,
+                    output_file,
+                    targets=targets,
+                    profile=profile,
+                    music=music
+                )
+                final_video = outputs and next(iter(outputs.values()))
+            elif parallel_chunks is not None:
+                final_video = self.video_processor.create_video_chunked(
+                    background_video,
+                    audio_path,
+                    captions_path,
+                    output_file,
+                    chunks=parallel_chunks or None,
+                    profile=profile,
+                    music=music
+                )
+            elif single_pass:
+                final_video = self.video_processor.create_video_single_pass(
+                    background_video,
+                    audio_path,
+                    captions_path,
+                    output_file,
+                    profile=profile,
+                    music=music
+                )
+            else:
+                # First create the looped background
+                temp_bg = self.video_processor.prepare_background_video(
+                    background_video,
+                    duration
+                )
+                if not temp_bg:
+                    print("❌ Failed to prepare background video")
+                    return None
+                
+                # Then create the final video with the looped background
+                final_video = self.video_processor.create_final_video(
+                    temp_bg,
+                    audio_path,
+                    captions_path,
+                    output_file,
+                    profile=profile,
+                    music=music
+                )
             
             if not final_video:
                 print("❌ Failed to create final video")
                 return None
             
             print(f"\n🎉 SUCCESS! Video created:")
-            print(f"📁 Location: {output_file}")
+            if outputs:
+                output_file = final_video
+                for name, path in outputs.items():
+                    print(f"📁 {name}: {path}")
+            else:
+                print(f"📁 Location: {output_file}")
             print(f"📝 Story: {story}")
             
             return {
                 "video_path": output_file,
+                "outputs": outputs,
                 "story": story,
                 "audio_path": audio_path,
                 "captions_path": captions_path
@@ -122,30 +186,44 @@ def main():
     parser.add_argument('--duration', type=int, default=180, help='Video duration in seconds (default: 180)')
     parser.add_argument('--background', type=str, help='Path to background video file')
     parser.add_argument('--output', type=str, help='Output video filename')
+    parser.add_argument('--two-pass', action='store_true', help='Encode a looped background before the final render')
+    parser.add_argument('--parallel-chunks', type=int, nargs='?', const=0, help='Encode the reel as N parallel chunks (default: one per core)')
+    parser.add_argument('--targets', type=lambda value: value.split(','), help=f"Comma-separated outputs rendered in one pass ({', '.join(TARGETS)})")
+    parser.add_argument('--music', nargs='?', const=True, help='Add a ducked music bed: a track file, or a track picked from assets/music')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=Config.DEFAULT_ENCODING_PROFILE, help='Encoding profile: draft for quick previews, final for publishing, archive for masters')
+    parser.add_argument('--offline', action='store_true', help='Write the story with the deterministic stub instead of OpenAI (no network, for CI and benchmarks)')
+    parser.add_argument('--llm-cache', choices=['on', 'off', 'replay'], default=Config.LLM_CACHE, help='Reuse cached story responses (on), or only replay cached ones without API calls (replay)')
     
     args = parser.parse_args()
     
-    # Check if .env file exists
-    if not os.path.exists('.env'):
+    offline = args.offline or args.llm_cache == 'replay'
+    
+    # Check if .env file exists (offline runs may take their settings from the environment)
+    if not offline and not os.path.exists('.env'):
         print("⚠️  Αρχείο .env δεν βρέθηκε!")
         print("📝 Παρακαλώ δημιουργήστε αρχείο .env με βάση το .env.example")
         print("🔑 Χρειάζεστε API keys από OpenAI και ElevenLabs")
         return
     
     # Check API keys
-    if not Config.OPENAI_API_KEY or not Config.ELEVENLABS_API_KEY:
+    if (not offline and not Config.OPENAI_API_KEY) or not Config.ELEVENLABS_API_KEY:
         print("⚠️  Λείπουν API keys!")
         print("🔑 Ελέγξτε το αρχείο .env σας")
         return
     
-    creator = GreekVideoCreator()
+    creator = GreekVideoCreator(llm_backends.get_backend("stub" if args.offline else None, args.llm_cache))
     
     # Create video with command line arguments
     result = creator.create_complete_video(
         topic=args.prompt,
         background_video=args.background,
         duration=args.duration,
-        output_file=args.output
+        output_file=args.output,
+        single_pass=not args.two_pass,
+        parallel_chunks=args.parallel_chunks,
+        profile=args.profile,
+        targets=args.targets,
+        music=args.music
     )
     
     if result:
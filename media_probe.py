@@ -0,0 +1,413 @@
+"""
+In-process media probing with a persistent metadata cache.
+
+MP3 durations are read from the frame headers (Xing/Info/VBRI tables or the
+CBR bitrate) and MP4/MOV metadata from the moov atoms (mvhd, tkhd, mdhd,
+stsd, stts, stss), so batch planning doesn't fork a process per file. Other
+formats fall back to ffprobe (keyframe intervals from its packet flags);
+codecs carry ffprobe's names on both paths. Results are cached on disk
+keyed by path + size + mtime, in a JSON lines file: each new probe is one
+appended line, and the file is compacted on load, dropping entries for
+files that were deleted or changed since.
+"""
+
+import json
+import os
+import struct
+import subprocess
+import threading
+from fractions import Fraction
+from config import Config
+from atomic_files import atomic_write
+from ffmpeg_runner import find_binary
+
+# Bitrates in kbps, indexed by [version_group][layer][bitrate_index]
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = [44100, 48000, 32000]
+# MP4 sample entry fourccs -> ffprobe codec names, so both probe paths spell codecs alike
+MP4_CODECS = {
+    "avc1": "h264", "avc3": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1", "vp09": "vp9",
+    "mp4v": "mpeg4", "apch": "prores", "apcn": "prores", "apcs": "prores", "apco": "prores", "ap4h": "prores",
+    "mp4a": "aac", ".mp3": "mp3", "Opus": "opus", "fLaC": "flac", "ac-3": "ac3", "ec-3": "eac3"
+}
+CACHE_VERSION = 2  # Bumped when the probe output changes, so older cache entries are dropped
+
+class MediaProbe:
+    def __init__(self, cache_path=None, ffprobe_path=None):
+        self.cache_path = cache_path or Config.PROBE_CACHE_PATH
+        self.ffprobe_path = ffprobe_path or find_binary("ffprobe", Config.FFPROBE_PATH)
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def probe(self, path):
+        """Return {'duration', 'format', 'streams': [...]} for a media file."""
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        info = None
+        try:
+            info = self._probe_native(path)
+        except (OSError, ValueError, struct.error):
+            info = None
+        if info is None:
+            info = self._probe_ffprobe(path)
+
+        with self._lock:
+            self._cache[key] = info
+            self._append_cache(key, info)
+        return info
+
+    def get_duration(self, path):
+        """Duration of a media file in seconds."""
+        return self.probe(path)["duration"]
+
+    def video_stream(self, path):
+        """The first video stream's info, or None."""
+        return next((s for s in self.probe(path)["streams"] if s["codec_type"] == "video"), None)
+
+    def _probe_native(self, path):
+        with open(path, 'rb') as f:
+            head = f.read(12)
+        if head[4:8] == b'ftyp' or head[4:8] in (b'moov', b'mdat', b'free', b'wide'):
+            return self._probe_mp4(path)
+        if str(path).lower().endswith('.mp3') or head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+            return self._probe_mp3(path)
+        return None
+
+    def _probe_mp3(self, path):
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            data = f.read(min(file_size, 256 * 1024))
+            f.seek(max(0, file_size - 128))
+            has_id3v1 = f.read(3) == b'TAG'
+
+        offset = 0
+        if data[:3] == b'ID3':
+            size = 0
+            for byte in data[6:10]:
+                size = (size << 7) | (byte & 0x7F)
+            offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+        # Find the first frame header that is followed by another valid header
+        while offset + 4 <= len(data):
+            frame = self._mp3_frame(data, offset)
+            if frame and self._mp3_frame(data, offset + frame["length"]):
+                break
+            offset += 1
+        else:
+            return None
+
+        sample_rate = frame["sample_rate"]
+        frame_count = None
+
+        side_info = (32 if frame["channels"] == 2 else 17) if frame["mpeg1"] else (17 if frame["channels"] == 2 else 9)
+        xing = offset + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info'):
+            flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frame_count = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+        elif data[offset + 36:offset + 40] == b'VBRI':
+            frame_count = struct.unpack('>I', data[offset + 50:offset + 54])[0]
+
+        if frame_count:
+            duration = frame_count * frame["samples"] / sample_rate
+        else:
+            audio_bytes = file_size - offset - (128 if has_id3v1 else 0)
+            duration = audio_bytes * 8 / (frame["bitrate"] * 1000)
+
+        return {
+            "duration": duration,
+            "format": "mp3",
+            "streams": [{
+                "codec_type": "audio",
+                "codec": "mp3",
+                "sample_rate": sample_rate,
+                "channels": frame["channels"],
+                "bitrate": frame["bitrate"] * 1000
+            }]
+        }
+
+    @staticmethod
+    def _mp3_frame(data, offset):
+        """Decode the MPEG audio frame header at offset, or return None."""
+        if offset + 4 > len(data):
+            return None
+        header = struct.unpack('>I', data[offset:offset + 4])[0]
+        if header >> 21 != 0x7FF:
+            return None
+        version_bits = (header >> 19) & 3
+        layer_bits = (header >> 17) & 3
+        bitrate_index = (header >> 12) & 0xF
+        rate_index = (header >> 10) & 3
+        if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+            return None
+
+        mpeg1 = version_bits == 3
+        layer = 4 - layer_bits
+        bitrate = _MP3_BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index]
+        sample_rate = _MP3_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version_bits]
+        padding = (header >> 9) & 1
+        channels = 1 if (header >> 6) & 3 == 3 else 2
+
+        if layer == 1:
+            samples = 384
+            length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            samples = 1152 if (layer == 2 or mpeg1) else 576
+            length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+        return {
+            "mpeg1": mpeg1,
+            "bitrate": bitrate,
+            "sample_rate": sample_rate,
+            "samples": samples,
+            "channels": channels,
+            "length": length
+        }
+
+    def _probe_mp4(self, path):
+        moov = None
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            position = 0
+            while position + 8 <= file_size:
+                f.seek(position)
+                size, box_type = struct.unpack('>I4s', f.read(8))
+                header = 8
+                if size == 1:
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    header = 16
+                elif size == 0:
+                    size = file_size - position
+                if size < header:
+                    return None
+                if box_type == b'moov':
+                    moov = f.read(size - header)
+                    break
+                position += size
+        if moov is None:
+            return None
+
+        boxes = self._mp4_boxes(moov)
+        mvhd = boxes.get(b'mvhd')
+        if not mvhd:
+            return None
+        timescale, duration = self._mp4_time(mvhd[0], 12, 20)
+
+        streams = [s for s in (self._mp4_track(trak) for trak in boxes.get(b'trak', [])) if s]
+        return {
+            "duration": duration / timescale,
+            "format": "mp4",
+            "streams": streams
+        }
+
+    def _mp4_boxes(self, data):
+        """Index the child boxes of a container payload by type (lists)."""
+        boxes = {}
+        position = 0
+        while position + 8 <= len(data):
+            size, box_type = struct.unpack('>I4s', data[position:position + 8])
+            header = 8
+            if size == 1:
+                size = struct.unpack('>Q', data[position + 8:position + 16])[0]
+                header = 16
+            elif size == 0:
+                size = len(data) - position
+            if size < header:
+                break
+            boxes.setdefault(box_type, []).append(data[position + header:position + size])
+            position += size
+        return boxes
+
+    @staticmethod
+    def _mp4_time(payload, v0_offset, v1_offset):
+        """Read (timescale, duration) from an mvhd/mdhd payload."""
+        if payload[0] == 1:
+            return struct.unpack('>IQ', payload[v1_offset:v1_offset + 12])
+        return struct.unpack('>II', payload[v0_offset:v0_offset + 8])
+
+    def _mp4_track(self, trak):
+        track = self._mp4_boxes(trak)
+        mdia = self._mp4_boxes(track.get(b'mdia', [b''])[0])
+        hdlr = mdia.get(b'hdlr', [b''])[0]
+        handler = hdlr[8:12]
+        codec_type = {b'vide': 'video', b'soun': 'audio'}.get(handler)
+        if not codec_type or b'mdhd' not in mdia:
+            return None
+
+        timescale, media_duration = self._mp4_time(mdia[b'mdhd'][0], 12, 20)
+        stbl = self._mp4_boxes(self._mp4_boxes(mdia.get(b'minf', [b''])[0]).get(b'stbl', [b''])[0])
+
+        stsd = stbl.get(b'stsd', [b''])[0]
+        codec = stsd[12:16].decode('latin-1') if len(stsd) >= 16 else None
+        codec = MP4_CODECS.get(codec, codec)
+
+        samples = 0
+        stts = stbl.get(b'stts', [b''])[0]
+        if len(stts) >= 8:
+            entries = struct.unpack('>I', stts[4:8])[0]
+            for i in range(entries):
+                count, _ = struct.unpack('>II', stts[8 + i * 8:16 + i * 8])
+                samples += count
+
+        stream = {
+            "codec_type": codec_type,
+            "codec": codec,
+            "duration": media_duration / timescale if timescale else None
+        }
+
+        if codec_type == 'audio':
+            stream["sample_rate"] = timescale
+            return stream
+
+        tkhd = track.get(b'tkhd', [b''])[0]
+        if len(tkhd) >= 84:
+            width_offset = 88 if tkhd[0] == 1 else 76
+            width, height = struct.unpack('>II', tkhd[width_offset:width_offset + 8])
+            stream["width"] = width >> 16
+            stream["height"] = height >> 16
+
+        stream["frames"] = samples
+        if media_duration:
+            stream["fps"] = round(samples * timescale / media_duration, 3)
+
+        stss = stbl.get(b'stss', [b''])[0]
+        if len(stss) >= 8:
+            keyframes = struct.unpack('>I', stss[4:8])[0]
+            if keyframes > 1:
+                first, last = struct.unpack('>I', stss[8:12])[0], struct.unpack('>I', stss[4 + keyframes * 4:8 + keyframes * 4])[0]
+                stream["keyframe_interval"] = (last - first) / (keyframes - 1)
+            elif keyframes == 1:
+                stream["keyframe_interval"] = samples
+        else:
+            # No stss box: every sample is a sync sample
+            stream["keyframe_interval"] = 1
+        return stream
+
+    def _probe_ffprobe(self, path):
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'error',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            str(path)
+        ]
+        if not self.ffprobe_path:
+            raise ValueError(f"Can't probe {path}: unsupported format and ffprobe not found")
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        raw = json.loads(result.stdout)
+
+        streams = []
+        for s in raw.get("streams", []):
+            stream = {
+                "codec_type": s.get("codec_type"),
+                "codec": s.get("codec_name"),
+                "duration": float(s["duration"]) if s.get("duration") else None
+            }
+            if s.get("codec_type") == "video":
+                stream["width"] = s.get("width")
+                stream["height"] = s.get("height")
+                if s.get("r_frame_rate") and s["r_frame_rate"] != "0/0":
+                    stream["fps"] = round(float(Fraction(s["r_frame_rate"])), 3)
+                if s.get("nb_frames"):
+                    stream["frames"] = int(s["nb_frames"])
+                stream["keyframe_interval"] = self._keyframe_interval(path, s.get("index"))
+            elif s.get("codec_type") == "audio":
+                stream["sample_rate"] = int(s.get("sample_rate", 0)) or None
+            streams.append(stream)
+
+        return {
+            "duration": float(raw["format"]["duration"]),
+            "format": raw["format"].get("format_name"),
+            "streams": streams
+        }
+
+    def _keyframe_interval(self, path, stream_index):
+        """Average frames between keyframes of a stream, from its packet flags (no decoding)."""
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'error',
+            '-select_streams', str(stream_index or 0),
+            '-show_entries', 'packet=flags',
+            '-of', 'csv=p=0',
+            str(path)
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        flags = result.stdout.split()
+        keyframes = [i for i, flag in enumerate(flags) if flag.startswith('K')]
+        if len(keyframes) > 1:
+            return (keyframes[-1] - keyframes[0]) / (len(keyframes) - 1)
+        return len(flags) if keyframes else None
+
+    def _load_cache(self):
+        cache, lines = {}, 0
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    # Entries of older versions (or the earlier whole-file format) are dropped
+                    if record.get("version") == CACHE_VERSION:
+                        cache[record["key"]] = record["info"]
+        except OSError:
+            return {}
+
+        live = {key: info for key, info in cache.items() if _is_current(key)}
+        if lines != len(live):
+            self._compact(live)
+        return live
+
+    def _append_cache(self, key, info):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.cache_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"key": key, "info": info, "version": CACHE_VERSION}, ensure_ascii=False) + "\n")
+
+    def _compact(self, cache):
+        """Rewrite the cache file with one line per live entry."""
+        try:
+            with atomic_write(self.cache_path) as f:
+                for key, info in cache.items():
+                    f.write(json.dumps({"key": key, "info": info, "version": CACHE_VERSION}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not compact the probe cache: {e}")
+
+def _is_current(key):
+    """Whether a path|size|mtime cache key still describes the file on disk."""
+    try:
+        path, size, mtime_ns = key.rsplit("|", 2)
+        stat = os.stat(path)
+        return stat.st_size == int(size) and stat.st_mtime_ns == int(mtime_ns)
+    except (OSError, ValueError):
+        return False
+
+_probes = {}
+
+def get_probe(ffprobe_path=None):
+    """Shared MediaProbe instance for the process (one per ffprobe binary)."""
+    ffprobe_path = ffprobe_path or find_binary("ffprobe", Config.FFPROBE_PATH)
+    if ffprobe_path not in _probes:
+        _probes[ffprobe_path] = MediaProbe(ffprobe_path=ffprobe_path)
+    return _probes[ffprobe_path]
+
+def probe_media(path):
+    return get_probe().probe(path)
+
+def get_duration(path):
+    return get_probe().get_duration(path)
@@ -0,0 +1,109 @@
+"""
+Render-ready mezzanine normalization for background clips.
+
+Each source clip is converted once into a canonical 1080x1920, 30 fps,
+closed-GOP yuv420p file. A sidecar marker records that the file is
+normalized, so render paths can skip the per-frame fps/scale filters.
+"""
+
+import json
+import os
+import subprocess
+import ffmpeg_runner
+from pathlib import Path
+from config import Config
+from background_cache import BackgroundCache
+
+MARKER_SUFFIX = ".mezzanine.json"
+
+def mezzanine_spec():
+    """Return the canonical format every mezzanine is encoded to."""
+    return {
+        "width": Config.VIDEO_WIDTH,
+        "height": Config.VIDEO_HEIGHT,
+        "fps": Config.VIDEO_FPS,
+        "gop": Config.MEZZANINE_GOP,
+        "pix_fmt": "yuv420p",
+        "closed_gop": True
+    }
+
+def encoder_args(crf=18):
+    """libx264 arguments giving a fixed keyframe interval and closed GOPs."""
+    gop = str(Config.MEZZANINE_GOP)
+    return [
+        '-c:v', 'libx264',
+        '-preset', 'medium',
+        '-crf', str(crf),
+        '-g', gop,
+        '-keyint_min', gop,
+        '-sc_threshold', '0',
+        '-flags', '+cgop',
+        '-pix_fmt', 'yuv420p'
+    ]
+
+def read_marker(path):
+    """Return the normalization marker stored next to a clip, or None."""
+    try:
+        with open(f"{path}{MARKER_SUFFIX}", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def mark_normalized(path, **info):
+    """Record that a clip is encoded in the mezzanine format."""
+    marker = {**mezzanine_spec(), **info}
+    with open(f"{path}{MARKER_SUFFIX}", 'w', encoding='utf-8') as f:
+        json.dump(marker, f, ensure_ascii=False, indent=2)
+    return marker
+
+def is_normalized(path):
+    """True if the clip carries a marker matching the current output format."""
+    marker = read_marker(path)
+    if not marker or not os.path.exists(path):
+        return False
+    spec = mezzanine_spec()
+    return all(marker.get(k) == spec[k] for k in ("width", "height", "fps", "pix_fmt"))
+
+def mezzanine_path(source, cache=None):
+    """Where the mezzanine of a source clip is (or will be) stored."""
+    cache = cache or BackgroundCache()
+    return Path(Config.MEZZANINE_DIR) / f"{Path(source).stem}_{cache.source_hash(source)[:12]}.mp4"
+
+def normalize_clip(source, ffmpeg_path=None, cache=None):
+    """Convert a source clip to its mezzanine once and return the mezzanine path."""
+    if is_normalized(source):
+        return str(source)
+
+    cache = cache or BackgroundCache()
+    source_hash = cache.source_hash(source)
+    output_path = mezzanine_path(source, cache)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if is_normalized(output_path):
+        return str(output_path)
+
+    partial = output_path.with_name(f"{output_path.stem}.{os.getpid()}.partial.mp4")
+    args = [
+        '-i', str(source),
+        '-vf', f"fps={Config.VIDEO_FPS},scale={Config.VIDEO_WIDTH}:{Config.VIDEO_HEIGHT}",
+        '-an',
+        *encoder_args(),
+        '-movflags', '+faststart',
+        '-y',
+        str(partial)
+    ]
+
+    try:
+        print(f"📥 Normalizing background clip: {source}")
+        ffmpeg_runner.run_ffmpeg(args, progress=ffmpeg_runner.progress_printer(output_path.name), ffmpeg_path=ffmpeg_path)
+        os.replace(partial, output_path)
+        mark_normalized(output_path, source=str(source), source_hash=source_hash)
+        print(f"✅ Mezzanine ready: {output_path}")
+        return str(output_path)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error normalizing background clip: {e}")
+        print(f"Stderr: {e.stderr}")
+        return None
+    finally:
+        if partial.exists():
+            partial.unlink()
@@ -0,0 +1,95 @@
+"""
+Background music under the narration.
+
+Tracks come from the music library (assets/music). The music is looped to
+the narration length, faded in and out, and ducked under the voice with
+sidechain compression. Each (voice, track, settings) mix is encoded once as
+an AAC stem in the background cache, so renders stream-copy it instead of
+running the filter chain again.
+"""
+
+import os
+from pathlib import Path
+from config import Config
+from background_cache import BackgroundCache
+import ffmpeg_runner
+import media_probe
+
+MUSIC_EXTENSIONS = {".mp3", ".m4a", ".aac", ".wav", ".ogg", ".flac"}
+
+def list_tracks(music_dir=None):
+    """Music tracks in the library, sorted by name."""
+    directory = Path(music_dir or Config.MUSIC_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(str(p) for p in directory.iterdir() if p.suffix.lower() in MUSIC_EXTENSIONS)
+
+def pick_track(voice_file, music_dir=None, cache=None):
+    """Choose a library track for a narration, the same one every time for the same audio."""
+    tracks = list_tracks(music_dir)
+    if not tracks:
+        return None
+    cache = cache or BackgroundCache()
+    return tracks[int(cache.source_hash(voice_file)[:8], 16) % len(tracks)]
+
+def mix_settings():
+    """Music gain, ducking and fade settings (part of the stem cache key)."""
+    return {
+        "music_gain_db": Config.MUSIC_GAIN_DB,
+        "duck_threshold": Config.MUSIC_DUCK_THRESHOLD,
+        "duck_ratio": Config.MUSIC_DUCK_RATIO,
+        "duck_attack_ms": Config.MUSIC_DUCK_ATTACK_MS,
+        "duck_release_ms": Config.MUSIC_DUCK_RELEASE_MS,
+        "fade_in": Config.MUSIC_FADE_IN,
+        "fade_out": Config.MUSIC_FADE_OUT
+    }
+
+def mix_filter(duration, voice_filter=None, settings=None):
+    """Filtergraph mixing input 0 (voice) with looped input 1 (music) into [mix]."""
+    s = settings or mix_settings()
+    fade_out_start = max(0.0, duration - s["fade_out"])
+    true_peak = 10 ** (Config.LOUDNESS_TARGET_TP / 20)
+    voice_chain = f"{voice_filter}," if voice_filter else ""
+    return ";".join([
+        f"[0:a]{voice_chain}aresample={Config.AUDIO_SAMPLE_RATE},asplit=2[voice][key]",
+        f"[1:a]aresample={Config.AUDIO_SAMPLE_RATE},atrim=duration={duration:.3f},volume={s['music_gain_db']}dB,"
+        f"afade=t=in:d={s['fade_in']},afade=t=out:st={fade_out_start:.3f}:d={s['fade_out']}[music]",
+        f"[music][key]sidechaincompress=threshold={s['duck_threshold']}:ratio={s['duck_ratio']}"
+        f":attack={s['duck_attack_ms']}:release={s['duck_release_ms']}[ducked]",
+        # normalize=0 keeps the voice at its (normalized) level; the limiter holds the true peak
+        f"[voice][ducked]amix=inputs=2:duration=first:normalize=0,alimiter=limit={true_peak:.3f}:level=0[mix]"
+    ])
+
+def mixed_stem(voice_file, music_file, audio_args, voice_filter=None, ffmpeg_path=None, ffprobe_path=None, cache=None):
+    """Return the cached AAC stem of voice_file with music_file ducked underneath."""
+    cache = cache or BackgroundCache()
+    settings = mix_settings()
+    duration = media_probe.get_probe(ffprobe_path).get_duration(voice_file)
+
+    def build(path):
+        print(f"🎵 Mixing music bed: {os.path.basename(str(music_file))}")
+        ffmpeg_runner.run_ffmpeg(
+            [
+                '-i', str(voice_file),
+                '-stream_loop', '-1',
+                '-i', str(music_file),
+                '-filter_complex', mix_filter(duration, voice_filter, settings),
+                '-map', '[mix]',
+                *audio_args,
+                '-t', f"{duration:.3f}",
+                '-y', path
+            ],
+            ffmpeg_path=ffmpeg_path
+        )
+        return True
+
+    return cache.get_or_create(
+        voice_file,
+        build,
+        suffix=".m4a",
+        kind="music_mix",
+        music=cache.source_hash(music_file),
+        audio_args=" ".join(audio_args),
+        voice_filter=voice_filter,
+        **settings
+    )
@@ -0,0 +1,129 @@
+"""
+Narration length predicted from the text, calibrated on past TTS output.
+
+Every narration ElevenLabs returns is recorded as (text features, seconds)
+under its voice, model and voice settings. The duration is modelled as a
+linear function of the character, comma and sentence counts. It is
+fitted by regularized least squares from running sums (XᵀX, Xᵀy), so each
+new narration updates the model in constant time and the history itself
+is never stored.
+
+The fit is pulled towards a prior: the old flat estimate of 3.5 characters
+per second plus pauses for commas and full stops. Each voice's fit is also
+pulled towards the fit over all voices, so a new voice starts from what the
+others have learnt. Stories can therefore be checked, and regenerated if
+needed, before any TTS characters or renders are paid for.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import numpy as np
+from config import Config
+from atomic_files import save_json
+
+_lock = threading.Lock()
+
+FEATURES = ("constant", "characters", "commas", "sentences")
+PRIOR = np.array([0.0, 1 / 3.5, 0.3, 0.5])  # Seconds per feature
+TYPICAL = np.array([1.0, 800.0, 10.0, 12.0])  # Feature values of a one-minute story
+PRIOR_STRENGTH = 1.0  # Pull towards the prior's shape, as strong as this many typical stories
+ALL_VOICES = "*"
+SENTENCE_END = re.compile(r"[.!;·?…]+")
+
+def narration_features(text):
+    """Feature vector of a narration text (see FEATURES)."""
+    return np.array([
+        1.0,
+        len(text),
+        text.count(','),
+        len(SENTENCE_END.findall(text))
+    ])
+
+def voice_key(voice_id=None, settings=None, model_id=None):
+    """Model key for a voice, TTS model and voice settings."""
+    voice_id = voice_id or Config.ELEVENLABS_VOICE_ID or "default"
+    model_id = model_id or Config.ELEVENLABS_MODEL_ID
+    settings = Config.ELEVENLABS_VOICE_SETTINGS if settings is None else settings
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{voice_id}|{model_id}|{digest}"
+
+def predict_duration(text, voice_id=None, settings=None, model_id=None):
+    """Predicted narration length of text in seconds."""
+    with _lock:
+        model = _load_model()
+    weights = _weights(model, voice_key(voice_id, settings, model_id))
+    return max(0.0, float(narration_features(text) @ weights))
+
+def samples(voice_id=None, settings=None, model_id=None):
+    """Number of recorded narrations behind the prediction (this voice, or all voices if more)."""
+    with _lock:
+        model = _load_model()
+    counts = [model.get(key, {}).get("count", 0) for key in (voice_key(voice_id, settings, model_id), ALL_VOICES)]
+    return max(counts)
+
+def check_length(text, duration, voice_id=None, settings=None, model_id=None):
+    """(ok, predicted seconds) for a story meant to be narrated in about duration seconds.
+
+    Always ok until Config.NARRATION_MIN_SAMPLES narrations have been
+    recorded, as the uncalibrated estimate is too rough to reject stories on.
+    """
+    predicted = predict_duration(text, voice_id, settings, model_id)
+    if samples(voice_id, settings, model_id) < Config.NARRATION_MIN_SAMPLES:
+        return True, predicted
+    tolerance = Config.NARRATION_LENGTH_TOLERANCE
+    return duration * (1 - tolerance) <= predicted <= duration * (1 + tolerance), predicted
+
+def record_duration(text, duration, voice_id=None, settings=None, model_id=None):
+    """Add a measured narration length to the model of its voice and of all voices."""
+    features = narration_features(text)
+    key = voice_key(voice_id, settings, model_id)
+    with _lock:
+        model = _load_model()
+        # Error of the prediction made before this sample, for reporting accuracy
+        error = duration - float(features @ _weights(model, key))
+        for name in (key, ALL_VOICES):
+            entry = model.get(name) or {
+                "xtx": np.zeros((len(FEATURES), len(FEATURES))).tolist(),
+                "xty": [0.0] * len(FEATURES),
+                "count": 0,
+                "squared_error": 0.0
+            }
+            entry["xtx"] = (np.array(entry["xtx"]) + np.outer(features, features)).tolist()
+            entry["xty"] = (np.array(entry["xty"]) + features * duration).tolist()
+            entry["count"] += 1
+            entry["squared_error"] += error * error
+            model[name] = entry
+        _save_model(model)
+    return error
+
+def _weights(model, key):
+    """Posterior weights for key: all voices fitted around the prior, then the voice around that.
+
+    The prior is first rescaled to the recorded total duration, so a
+    single narration already fixes the overall speaking rate and the
+    prior only shapes how it splits between characters and pauses.
+    """
+    precision = PRIOR_STRENGTH * np.diag(TYPICAL ** 2)
+    weights = PRIOR
+    for name in (ALL_VOICES, key):
+        entry = model.get(name)
+        if entry:
+            xtx, xty = np.array(entry["xtx"]), np.array(entry["xty"])
+            # Row 0 of XᵀX is the sum of the feature vectors, xty[0] the sum of durations
+            predicted = xtx[0] @ weights
+            if predicted > 0:
+                weights = weights * (xty[0] / predicted)
+            weights = np.linalg.solve(precision + xtx, precision @ weights + xty)
+    return weights
+
+def _load_model():
+    try:
+        with open(Config.NARRATION_MODEL_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_model(model):
+    save_json(Config.NARRATION_MODEL_PATH, model)
@@ -0,0 +1,89 @@
+"""
+Output targets rendered together from one decode of the background.
+
+Each target is a branch of a `split` filtergraph: a centre crop of the 9:16
+reel frame to the target's aspect ratio, a scale to its size and its own
+caption style. Sizes are given for the final profile and scaled down with
+draft profiles.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from config import Config
+
+# libass lays out SRT captions on a 288-unit-high script
+SRT_PLAY_RES_Y = 288
+
+@dataclass(frozen=True)
+class OutputTarget:
+    name: str
+    width: int
+    height: int
+    kind: str = "video"  # video, cover (JPEG) or preview (short, muted)
+    captions: bool = True
+    caption_margin: Optional[float] = None  # Bottom caption margin as a fraction of the height
+    start: float = 0.0  # Cover frame time in seconds
+    length: Optional[float] = None  # Preview length in seconds
+
+    @property
+    def extension(self):
+        return ".jpg" if self.kind == "cover" else ".mp4"
+
+    @property
+    def caption_scale(self):
+        """Font scale keeping captions the same pixel size as on the 1080x1920 reel.
+
+        libass scales caption sizes with the frame height, so shorter frames
+        of the same width need proportionally larger script sizes.
+        """
+        return (Config.VIDEO_HEIGHT / self.height) * (self.width / Config.VIDEO_WIDTH)
+
+    def output_path(self, output_file):
+        """Path for this target next to output_file, e.g. story_1x1.mp4."""
+        path = Path(output_file)
+        return str(path.with_name(f"{path.stem}_{self.name}{self.extension}"))
+
+    def size_for(self, profile):
+        """Output size under an encoding profile (draft profiles render smaller)."""
+        scale = profile.width / Config.VIDEO_WIDTH
+        return _even(self.width * scale), _even(self.height * scale)
+
+    def branch_filters(self, frame_width, frame_height, profile):
+        """crop/scale filters taking a frame_width x frame_height branch to this target."""
+        filters = []
+        crop_width = _even(min(frame_width, frame_height * self.width / self.height))
+        crop_height = _even(min(frame_height, frame_width * self.height / self.width))
+        if (crop_width, crop_height) != (frame_width, frame_height):
+            filters.append(f"crop={crop_width}:{crop_height}")
+        width, height = self.size_for(profile)
+        if (width, height) != (crop_width, crop_height):
+            filters.append(f"scale={width}:{height}")
+        return filters
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+TARGETS = {
+    # Reels/TikTok: keep captions above the app's bottom overlay
+    "9x16": OutputTarget("9x16", 1080, 1920, caption_margin=0.18),
+    # Feed posts
+    "1x1": OutputTarget("1x1", 1080, 1080, caption_margin=0.08),
+    "4x5": OutputTarget("4x5", 1080, 1350, caption_margin=0.10),
+    "cover": OutputTarget("cover", 1080, 1920, kind="cover", captions=False, start=1.0),
+    "preview": OutputTarget("preview", 540, 960, kind="preview", caption_margin=0.18, length=6.0),
+}
+
+def get_targets(names=None):
+    """Resolve target names (default: every standard target) to OutputTargets."""
+    if not names:
+        return list(TARGETS.values())
+    targets = []
+    for name in names:
+        if isinstance(name, OutputTarget):
+            targets.append(name)
+        elif name in TARGETS:
+            targets.append(TARGETS[name])
+        else:
+            raise ValueError(f"Unknown output target '{name}' (choose from {', '.join(TARGETS)})")
+    return targets
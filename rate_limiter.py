@@ -0,0 +1,124 @@
+"""
+Bounded, rate-limit-aware concurrency for async API calls.
+
+A RateLimiter runs at most `concurrency` requests at once and shares one
+pause window between them: when a response reports that the request or
+token budget is used up (x-ratelimit-remaining-* / x-ratelimit-reset-*
+headers), or a request is refused with 429 and Retry-After, every task
+waits until the window reopens instead of each hammering the API on its
+own. Transient failures (429, 5xx, connection errors) are retried with
+exponential backoff and jitter.
+"""
+
+import asyncio
+import email.utils
+import random
+import re
+import time
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0  # Seconds before the first retry, doubled per attempt ...
+BACKOFF_MAX = 60.0  # ... up to this
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_reset(value):
+    """Seconds in a reset header such as "1s", "6m0s" or "120ms" (None if unparsable)."""
+    if not value:
+        return None
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def retry_after(headers):
+    """Seconds the server asked to wait (retry-after-ms or Retry-After), or None."""
+    if not headers:
+        return None
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        date = email.utils.parsedate_to_datetime(value) if value else None
+        return max(0.0, date.timestamp() - time.time()) if date else None
+
+def _status(error):
+    return getattr(error, "status_code", None)
+
+def _headers(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+class RateLimiter:
+    def __init__(self, concurrency, retries=4, transient=(), token_reserve=0):
+        """concurrency: requests in flight at once. transient: extra exception
+        types to retry (e.g. connection errors). token_reserve: pause when
+        fewer tokens than this remain in the window."""
+        self.concurrency = concurrency
+        self.retries = retries
+        self.transient = tuple(transient)
+        self.token_reserve = token_reserve
+        self._semaphore = None
+        self._resume_at = 0.0
+
+    async def call(self, request):
+        """Await request() (a coroutine factory) under the limits; returns its result.
+
+        The result's .headers (if any) update the shared window; results
+        with a .parse() method (raw API responses) are parsed.
+        """
+        if self._semaphore is None:
+            # Created lazily so the limiter binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                await self._wait_for_window()
+                try:
+                    response = await request()
+                except Exception as e:
+                    if attempt >= self.retries or not (_status(e) in RETRY_STATUSES or isinstance(e, self.transient)):
+                        raise
+                    error = e
+                else:
+                    self.update(getattr(response, "headers", None))
+                    return response.parse() if hasattr(response, "parse") else response
+            # Back off outside the semaphore so other tasks keep their slots
+            delay = retry_after(_headers(error))
+            if delay is None:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random())
+            if _status(error) == 429:
+                self.pause(delay)
+            print(f"⏳ Request failed ({_status(error) or type(error).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def update(self, headers):
+        """Pause everyone until the reset time when a response says the budget is spent."""
+        if not headers:
+            return
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is not None and remaining_requests.isdigit() and int(remaining_requests) <= 0:
+            self.pause(parse_reset(headers.get("x-ratelimit-reset-requests")) or 1.0)
+        if remaining_tokens is not None and remaining_tokens.isdigit() and int(remaining_tokens) < self.token_reserve:
+            self.pause(parse_reset(headers.get("x-ratelimit-reset-tokens")) or 1.0)
+
+    def pause(self, seconds):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def _wait_for_window(self):
+        while True:
+            delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
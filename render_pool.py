@@ -0,0 +1,100 @@
+"""
+CPU-aware pool for running several ffmpeg renders at once.
+
+One libx264 process rarely keeps a many-core box busy on short 1080x1920
+reels, so batches render K reels concurrently. K and the per-job thread
+count start from a guess of how many cores one job can use and are re-tuned
+from the CPU time actually consumed by finished jobs.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Windows: keep the initial sizing, no CPU measurement
+    resource = None
+
+class RenderPool:
+    def __init__(self, max_jobs=None, cores=None, cores_per_job=None):
+        self.cores = cores or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.cores_per_job = cores_per_job or Config.RENDER_CORES_PER_JOB
+        self.job_slots, self.threads_per_job = self._size_for(self.cores_per_job)
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._completed = 0
+        self._succeeded = 0
+        self._job_seconds = 0.0
+        self._cpu_start = self._children_cpu()
+        self._started = time.time()
+        # Enough threads to hold every slot the pool could ever grow to (see _size_for)
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs or self.cores * 2)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a render job; fn must accept a `threads` keyword argument."""
+        return self._executor.submit(self._run, fn, args, kwargs)
+
+    def wait(self):
+        """Block until every queued job has finished, then report throughput."""
+        self._executor.shutdown(wait=True)
+        self.report()
+
+    def report(self):
+        elapsed = time.time() - self._started
+        per_hour = self._succeeded / elapsed * 3600 if elapsed > 0 else 0.0
+        print(
+            f"📊 Rendered {self._succeeded}/{self._completed} reels in {elapsed:.1f}s "
+            f"({per_hour:.1f} reels/hour, {self.job_slots} jobs x {self.threads_per_job} threads)"
+        )
+        return per_hour
+
+    def _run(self, fn, args, kwargs):
+        with self._cond:
+            while self._running >= self.job_slots:
+                self._cond.wait()
+            self._running += 1
+            threads = self.threads_per_job
+
+        started = time.time()
+        result = None
+        try:
+            result = fn(*args, threads=threads, **kwargs)
+            return result
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._completed += 1
+                if result:
+                    self._succeeded += 1
+                self._job_seconds += time.time() - started
+                self._retune()
+                self._cond.notify_all()
+
+    def _retune(self):
+        """Resize the pool from measured CPU seconds per second of job wall time."""
+        cpu = self._children_cpu()
+        if cpu is None or self._job_seconds <= 0:
+            return
+        measured = (cpu - self._cpu_start) / self._job_seconds
+        if measured <= 0:
+            return
+        self.cores_per_job = measured
+        self.job_slots, self.threads_per_job = self._size_for(measured)
+
+    def _size_for(self, cores_per_job):
+        slots = max(1, round(self.cores / max(cores_per_job, 0.5)))
+        if self.max_jobs:
+            slots = min(slots, self.max_jobs)
+        return slots, max(1, self.cores // slots)
+
+    @staticmethod
+    def _children_cpu():
+        if resource is None:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
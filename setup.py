@@ -86,11 +86,12 @@ def create_directories():
     return True
 
 def download_greek_font():
-    """Optionally download a Greek-compatible font."""
+    """Optionally download the bundled Greek caption fonts (DejaVu Sans regular and bold)."""
     fonts_dir = Path('fonts')
-    dejavu_font = fonts_dir / 'DejaVuSans.ttf'
+    font_names = ['DejaVuSans.ttf', 'DejaVuSans-Bold.ttf']
+    missing = [name for name in font_names if not (fonts_dir / name).exists()]
     
-    if dejavu_font.exists():
+    if not missing:
         print("✅ Greek font already available")
         return True
     
@@ -99,16 +100,18 @@ def download_greek_font():
     if download in ['y', 'yes']:
         try:
             import requests
-            url = "https://github.com/dejavu-fonts/dejavu-fonts/raw/master/ttf/DejaVuSans.ttf"
-            
-            print("📥 Downloading DejaVu Sans font...")
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            with open(dejavu_font, 'wb') as f:
-                f.write(response.content)
-            
-            print(f"✅ Font downloaded: {dejavu_font}")
+            fonts_dir.mkdir(exist_ok=True)
+            for name in missing:
+                url = f"https://github.com/dejavu-fonts/dejavu-fonts/raw/master/ttf/{name}"
+                
+                print(f"📥 Downloading {name}...")
+                response = requests.get(url)
+                response.raise_for_status()
+                
+                with open(fonts_dir / name, 'wb') as f:
+                    f.write(response.content)
+                
+                print(f"✅ Font downloaded: {fonts_dir / name}")
             return True
             
         except Exception as e:
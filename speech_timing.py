@@ -0,0 +1,234 @@
+"""
+Caption timing from the narration audio.
+
+The narration is decoded to mono PCM and split into 10 ms frames. A frame
+counts as speech when its energy is well above the noise floor; silent runs
+of at least MIN_PAUSE seconds are pauses. Sentence boundaries are matched
+to pauses by dynamic programming: each boundary is expected where its share
+of the text (by length) falls on the speech timeline, and the closest,
+longest pause near that point wins. Boundaries with no suitable pause are
+placed at the expected point.
+
+trim_silence() optionally shortens long leading, trailing and
+inter-sentence silences before the captions are timed.
+"""
+
+import wave
+from pathlib import Path
+import numpy as np
+from config import Config
+from atomic_files import atomic_write
+import ffmpeg_runner
+import karaoke
+
+ANALYSIS_RATE = 16000
+FRAME_SECONDS = 0.01
+MIN_PAUSE = 0.15  # Shorter silences are gaps inside words or phrases
+MIN_SPEECH = 0.05  # Shorter bursts above the threshold are clicks or breaths
+FLOOR_MARGIN_DB = 8  # Speech is at least this far above the noise floor ...
+PEAK_RANGE_DB = 35  # ... and no more than this far below loud speech
+
+UNMATCHED_COST = 1.0  # Cost of a boundary without a pause, in sentence lengths squared
+PAUSE_BONUS = 0.5  # Preference for longer pauses (per second, capped at one second)
+CAPTION_LEAD = 0.1  # Show a caption slightly before its sentence starts
+CAPTION_HOLD = 0.4  # Keep it up this long into the following pause
+
+def decode_pcm(audio_file, rate=ANALYSIS_RATE, ffmpeg_path=None):
+    """Mono float32 samples of audio_file at the given sample rate."""
+    raw = ffmpeg_runner.read_ffmpeg_output(
+        ['-i', str(audio_file), '-vn', '-ac', '1', '-ar', str(rate), '-f', 's16le', 'pipe:1'],
+        ffmpeg_path=ffmpeg_path
+    )
+    return np.frombuffer(raw[:len(raw) // 2 * 2], dtype='<i2').astype(np.float32) / 32768.0
+
+def speech_frames(samples, rate):
+    """Boolean speech/silence flag per FRAME_SECONDS frame."""
+    hop = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // hop
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[:count * hop].reshape(count, hop)
+    level = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+    floor, peak = np.percentile(level, [10, 95])
+    threshold = min(max(floor + FLOOR_MARGIN_DB, peak - PEAK_RANGE_DB), peak - 15)
+    speech = level > threshold
+
+    # Fill short silences, then drop short bursts
+    _fill_runs(speech, False, int(MIN_PAUSE / FRAME_SECONDS), True)
+    _fill_runs(speech, True, int(MIN_SPEECH / FRAME_SECONDS), False)
+    return speech
+
+def _runs(mask):
+    """(starts, ends) of the True runs in a boolean array, ends exclusive."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def _fill_runs(mask, value, shorter_than, replacement):
+    """Set interior runs of value shorter than shorter_than frames to replacement (in place)."""
+    starts, ends = _runs(mask == value)
+    interior = (starts > 0) & (ends < len(mask)) & (ends - starts < shorter_than)
+    for start, end in zip(starts[interior], ends[interior]):
+        mask[start:end] = replacement
+
+def analyze_speech(samples, rate):
+    """Speech span and internal pauses of a narration, in seconds.
+
+    Returns a dict with duration, speech_start, speech_end, pauses (an
+    (n, 2) array of start/end times) and the speech-time curve used to
+    map text positions to times; None if no speech was found.
+    """
+    speech = speech_frames(samples, rate)
+    if not speech.any():
+        return None
+    starts, ends = _runs(speech)
+    times = np.arange(len(speech) + 1) * FRAME_SECONDS
+    return {
+        "duration": len(samples) / rate,
+        "speech_start": times[starts[0]],
+        "speech_end": times[ends[-1]],
+        # Silences between speech runs (leading and trailing silence excluded)
+        "pauses": np.column_stack((times[ends[:-1]], times[starts[1:]])),
+        "times": times,
+        "spoken": np.concatenate(([0.0], np.cumsum(speech) * FRAME_SECONDS))
+    }
+
+def time_sentences(sentences, audio_file, ffmpeg_path=None):
+    """(start, end) seconds for each sentence, aligned to the pauses in audio_file.
+
+    Returns None if the audio can't be decoded or contains no speech.
+    """
+    if not sentences:
+        return []
+    try:
+        analysis = analyze_speech(decode_pcm(audio_file, ffmpeg_path=ffmpeg_path), ANALYSIS_RATE)
+    except (ffmpeg_runner.FFmpegError, OSError) as e:
+        print(f"⚠️ Could not analyse narration timing: {e}")
+        return None
+    if analysis is None:
+        print("⚠️ No speech found in the narration")
+        return None
+    return align_sentences(sentences, analysis)
+
+def align_sentences(sentences, analysis):
+    """Assign sentence boundaries to pauses (see module docstring)."""
+    times, spoken, pauses = analysis["times"], analysis["spoken"], analysis["pauses"]
+    total = spoken[-1]
+    weights = np.array([len(s.replace(" ", "")) + 2 for s in sentences], dtype=float)
+    # Expected speech time at each of the n-1 boundaries
+    targets = total * np.cumsum(weights)[:-1] / weights.sum()
+    boundaries = _match_boundaries(targets, pauses, np.interp(pauses[:, 0], times, spoken), total / len(sentences))
+
+    cues = []
+    start = max(0.0, analysis["speech_start"] - CAPTION_LEAD)
+    for k, pause in enumerate(boundaries):
+        if pause is None:
+            # No pause near the expected point: cut where that share of the speech ends
+            split = float(np.interp(targets[k], spoken, times))
+            cues.append((start, split))
+            start = split
+        else:
+            pause_start, pause_end = pauses[pause]
+            next_start = max(pause_start, pause_end - CAPTION_LEAD)
+            cues.append((start, min(pause_start + CAPTION_HOLD, next_start)))
+            start = next_start
+    cues.append((start, min(analysis["duration"], analysis["speech_end"] + CAPTION_HOLD)))
+    return [(round(float(s), 3), round(float(e), 3)) for s, e in cues]
+
+def _match_boundaries(targets, pauses, pause_positions, sentence_length):
+    """Pause index (or None) for each boundary, in order, minimizing the total cost.
+
+    dp[k, j] is the best cost of placing the first k boundaries using only
+    the first j pauses; each row is a running minimum, so rows are vectorized.
+    """
+    n, m = len(targets), len(pauses)
+    if n == 0:
+        return []
+    durations = np.minimum(pauses[:, 1] - pauses[:, 0], 1.0) if m else np.zeros(0)
+    # match[k, j]: cost of boundary k at pause j
+    match = ((pause_positions[None, :] - targets[:, None]) / max(sentence_length, 1e-6)) ** 2 - PAUSE_BONUS * durations[None, :]
+
+    columns = np.arange(m + 1)
+    dp = np.zeros(m + 1)
+    choices = []
+    for k in range(n):
+        with_pause = np.full(m + 1, np.inf)
+        with_pause[1:] = dp[:-1] + match[k]
+        without = dp + UNMATCHED_COST
+        best = np.minimum(with_pause, without)
+        dp_next = np.minimum.accumulate(best)
+        # Last column j' <= j achieving the running minimum, and whether it used pause j'-1
+        source = np.maximum.accumulate(np.where(best <= dp_next, columns, 0))
+        choices.append((source, with_pause < without))
+        dp = dp_next
+
+    boundaries = [None] * n
+    j = m
+    for k in range(n - 1, -1, -1):
+        source, used = choices[k]
+        j = source[j]
+        if used[j]:
+            boundaries[k] = j - 1
+            j -= 1
+    return boundaries
+
+def trim_silence(audio_file, output_file=None, max_pause=None, edge_silence=None, ffmpeg_path=None):
+    """Shorten leading/trailing silence and long pauses; returns the new WAV file.
+
+    Pauses longer than max_pause seconds are cut to max_pause (from their
+    middle), leading and trailing silence to edge_silence. Returns
+    audio_file unchanged if there is nothing to trim or no speech.
+    """
+    max_pause = Config.NARRATION_MAX_PAUSE if max_pause is None else max_pause
+    edge_silence = Config.NARRATION_EDGE_SILENCE if edge_silence is None else edge_silence
+    rate = Config.AUDIO_SAMPLE_RATE
+    try:
+        samples = decode_pcm(audio_file, rate, ffmpeg_path)
+    except (ffmpeg_runner.FFmpegError, OSError) as e:
+        print(f"⚠️ Could not trim narration silence: {e}")
+        return audio_file
+    analysis = analyze_speech(samples, rate)
+    if analysis is None:
+        return audio_file
+
+    cuts = [(0.0, analysis["speech_start"] - edge_silence), (analysis["speech_end"] + edge_silence, analysis["duration"])]
+    for start, end in analysis["pauses"]:
+        if end - start > max_pause:
+            middle = (start + end) / 2
+            cuts.append((middle - (end - start - max_pause) / 2, middle + (end - start - max_pause) / 2))
+    keep = np.ones(len(samples), dtype=bool)
+    removed = 0.0
+    for start, end in cuts:
+        if end > start:
+            keep[int(start * rate):int(end * rate)] = False
+            removed += end - start
+    if removed < 0.05:
+        return audio_file
+
+    if output_file is None:
+        path = Path(audio_file)
+        output_file = path.with_name(f"{path.stem}.trimmed.wav")
+    pcm = (np.clip(samples[keep], -1.0, 1.0) * 32767).astype('<i2')
+    with atomic_write(output_file, 'wb') as out, wave.open(out, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+
+    # Carry TTS character timestamps over to the trimmed timeline
+    alignment = karaoke.load_alignment(audio_file)
+    if alignment:
+        # Old time -> seconds of kept audio before it
+        kept = np.concatenate(([0], np.cumsum(keep))) / rate
+
+        def remap(times):
+            indices = np.minimum((np.asarray(times) * rate).astype(int), len(samples))
+            return np.round(kept[indices], 3).tolist()
+
+        karaoke.save_alignment({
+            "characters": alignment["characters"],
+            "character_start_times_seconds": remap(alignment["character_start_times_seconds"]),
+            "character_end_times_seconds": remap(alignment["character_end_times_seconds"])
+        }, output_file)
+    print(f"✂️ Trimmed {removed:.1f}s of silence from the narration")
+    return str(output_file)
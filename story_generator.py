@@ -1,20 +1,209 @@
-import openai
+import asyncio
+import json
+import os
+import threading
+import time
 from config import Config
+import llm_backends
+import narration_length
+from story_index import StoryIndex
 import re
 
+_lock = threading.Lock()
+
+STORY_SENTENCES = 12  # 12 sentences x 5 seconds = 60 seconds total
+STORY_ENDING = re.compile(r'[.!;…]$')  # Full stop, exclamation mark, Greek question mark
+SYSTEM_PROMPT = "Είσαι ένας ειδικός συγγραφέας ελληνικών ιστοριών για social media. Δημιουργείς πλήρεις, συναισθηματικές ιστορίες 50-60 δευτερολέπτων για βίντεο. Κάθε πρόταση είναι υπολογισμένη να διαβάζεται σε περίπου 5 δευτερόλεπτα. Χρησιμοποιείς πλήρεις, περιεκτικές προτάσεις. Επιστρέφεις μόνο το καθαρό κείμενο της ιστορίας, χωρίς σχόλια. ΠΑΝΤΑ τελειώνεις την ιστορία με την 12η πρόταση και ΠΑΝΤΑ κλείνεις με τελεία. ΑΠΑΓΟΡΕΥΕΤΑΙ να κόψεις την ιστορία στη μέση."
+
+# Batch requests share the instructions but reply with JSON
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT.replace(
+    "Επιστρέφεις μόνο το καθαρό κείμενο της ιστορίας, χωρίς σχόλια.",
+    "Επιστρέφεις μόνο έγκυρο JSON με τις ιστορίες, χωρίς σχόλια."
+)
+
+def parse_story_batch(content):
+    """Stories of a batch reply: the "stories" list of its JSON object (code fences and stray text are ignored).
+    
+    Raises ValueError if the reply holds no such JSON.
+    """
+    content = content or ""
+    start, end = content.find('{'), content.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in the reply")
+    stories = json.loads(content[start:end + 1]).get("stories")
+    if not isinstance(stories, list):
+        raise ValueError('no "stories" list in the reply')
+    return [story for story in stories if isinstance(story, str)]
+
+def next_seed(seed):
+    """Seed of a regeneration: a fresh request (and cache key) that is still reproducible.
+    
+    An unseeded request (None) continues from 0, so its retries differ from it even when cached.
+    """
+    return ((seed or 0) * 1103515245 + 12345) % 2 ** 31
+
 class GreekStoryGenerator:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
+    def __init__(self, backend=None):
+        """backend: an llm_backends backend (default: llm_backends.get_backend())."""
+        self.backend = backend or llm_backends.get_backend()
+        # Every accepted story is indexed, so near-duplicates are rejected before TTS
+        self.story_index = StoryIndex() if Config.DUPLICATE_CHECK else None
+        # A response cache (replayed or not) serves earlier runs' replies again, so the stories
+        # indexed before this run started are expected again; anything accepted during this
+        # run still counts as a duplicate
+        self._cached_ids = set()
+        if self.story_index is not None and getattr(self.backend, "cache", None) is not None:
+            self._cached_ids = set(self.story_index.signatures)
+    
+    def generate_story(self, topic="διατροφή και αυτοπεποίθηση", duration=60, seed=None):
+        """Generate a Greek story based on the given topic and duration.
+        
+        Each call asks for Config.STORY_CANDIDATES stories and keeps the
+        first that passes the sentence-count, ending and narration length
+        checks (see _check_story). If none does, up to Config.STORY_RETRIES
+        more calls are made with backoff; then the story is rejected (None)
+        before any TTS is paid for. Every call's outcome is appended to
+        Config.STORY_ATTEMPTS_LOG. Callers generating several variations
+        pass each its own seed (e.g. its index); with the response cache on,
+        the same topic, duration and seed return the same story without an
+        API call. Without a seed the request is an independent sample.
+        """
+        for attempt in range(Config.STORY_RETRIES + 1):
+            if attempt:
+                time.sleep(Config.STORY_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                candidates = self.backend.complete(self._story_request(topic, duration, seed))
+            except Exception as e:
+                print(f"Σφάλμα στη δημιουργία ιστορίας: {e}")
+                self._record_attempt(topic, duration, attempt, seed, error=e)
+                return None
+            story = self._pick_story(candidates, topic, duration, attempt, seed)
+            if story:
+                return story
+            seed = next_seed(seed)
+        print(f"❌ No valid story after {Config.STORY_RETRIES + 1} calls")
+        return None
+    
+    async def generate_stories(self, topics, duration=60):
+        """Generate a story per topic concurrently, yielding (index, story) as each completes.
+        
+        Each story is requested with its index as seed. With the OpenAI
+        backend at most Config.STORY_CONCURRENCY requests run at once, and
+        rate-limit headers and Retry-After pause all of them (see
+        rate_limiter). story is None where generation failed.
+        """
+        async def numbered(index, topic):
+            return index, await self._generate_story_async(topic, duration, seed=index)
+        
+        tasks = [asyncio.ensure_future(numbered(index, topic)) for index, topic in enumerate(topics)]
+        try:
+            for next_story in asyncio.as_completed(tasks):
+                yield await next_story
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.backend.aclose()
+    
+    async def generate_story_batches(self, topic, count, duration=60, batch_size=None):
+        """Generate count stories on one topic, batch_size (default Config.STORY_BATCH_SIZE)
+        per request, yielding (index, story) as each batch completes.
+        
+        Every request carries the long instructions once for the whole
+        batch. The stories of a reply are checked one by one and only the
+        rejected ones are requested again, within the Config.STORY_RETRIES
+        budget. Batches run concurrently like generate_stories; story is
+        None where no valid story was produced.
+        """
+        batch_size = batch_size or Config.STORY_BATCH_SIZE
+        sizes = [min(batch_size, count - start) for start in range(0, count, batch_size)]
+        
+        async def numbered(number, size):
+            return number, size, await self._generate_batch_async(topic, duration, size, seed=number)
+        
+        tasks = [asyncio.ensure_future(numbered(number, size)) for number, size in enumerate(sizes)]
+        try:
+            for next_batch in asyncio.as_completed(tasks):
+                number, size, stories = await next_batch
+                for offset in range(size):
+                    yield number * batch_size + offset, stories[offset] if offset < len(stories) else None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.backend.aclose()
+    
+    async def _generate_batch_async(self, topic, duration, size, seed=0):
+        """Up to size valid stories on topic, re-requesting only the rejected ones."""
+        stories = []
+        for attempt in range(Config.STORY_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(Config.STORY_RETRY_BACKOFF * 2 ** (attempt - 1))
+            missing = size - len(stories)
+            try:
+                replies = await self.backend.acomplete(self._story_request(topic, duration, seed, count=missing))
+                candidates = parse_story_batch(replies[0])[:missing]
+            except ValueError as e:
+                # Malformed JSON: the whole batch is requested again
+                self._record_attempt(topic, duration, attempt, seed, outcomes=[{"problem": f"unreadable reply ({e})", "predicted": None}], batch=True)
+                seed = next_seed(seed)
+                continue
+            except Exception as e:
+                print(f"Σφάλμα στη δημιουργία ιστορίας: {e}")
+                self._record_attempt(topic, duration, attempt, seed, error=e, batch=True)
+                break
+            
+            outcomes = []
+            for content in candidates:
+                story, problem, predicted = self._check_story(content, duration)
+                outcomes.append({"problem": problem, "predicted": None if predicted is None else round(predicted, 1)})
+                if story:
+                    stories.append(story)
+            self._record_attempt(topic, duration, attempt, seed, outcomes=outcomes, received=len(candidates), batch=True)
+            if len(stories) == size:
+                return stories
+            seed = next_seed(seed)
+        print(f"❌ {len(stories)}/{size} valid stories after {Config.STORY_RETRIES + 1} calls")
+        return stories
+    
+    async def _generate_story_async(self, topic, duration, seed=0):
+        """generate_story on the backend's async API."""
+        for attempt in range(Config.STORY_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(Config.STORY_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                candidates = await self.backend.acomplete(self._story_request(topic, duration, seed))
+            except Exception as e:
+                print(f"Σφάλμα στη δημιουργία ιστορίας: {e}")
+                self._record_attempt(topic, duration, attempt, seed, error=e)
+                return None
+            story = self._pick_story(candidates, topic, duration, attempt, seed)
+            if story:
+                return story
+            seed = next_seed(seed)
+        print(f"❌ No valid story after {Config.STORY_RETRIES + 1} calls")
+        return None
     
-    def generate_story(self, topic="διατροφή και αυτοπεποίθηση", duration=60):
-        """Generate a Greek story based on the given topic and duration."""
+    def _story_request(self, topic, duration, seed=None, count=None):
+        """Chat completion arguments for a story about topic, with Config.STORY_CANDIDATES choices.
+        
+        With count, one reply holds count stories as JSON (see parse_story_batch).
+        seed is only sent when given.
+        """
         
         # Calculate optimal sentence count for 50-60 seconds of narration
         # Each sentence should be 8-10 seconds when spoken in Greek
-        optimal_sentences = 12  # 12 sentences x 5 seconds = 60 seconds total
+        optimal_sentences = STORY_SENTENCES
+        
+        if count is None:
+            intro = f"Γράψε μια συναισθηματική ιστορία ακριβώς {duration} δευτερολέπτων για {topic}."
+            reply = "Επέστρεψε μόνο το κείμενο της ιστορίας, χωρίς επιπλέον εξηγήσεις ή σχόλια χρονισμού."
+        else:
+            intro = (f"Γράψε {count} διαφορετικές συναισθηματικές ιστορίες, την καθεμία ακριβώς {duration} δευτερολέπτων, για {topic}. "
+                     "Οι παρακάτω οδηγίες ισχύουν για ΚΑΘΕ ιστορία ξεχωριστά.")
+            reply = (f'Επέστρεψε ΜΟΝΟ ένα JSON αντικείμενο με {count} ιστορίες στη μορφή {{"stories": ["πρώτη ιστορία", "δεύτερη ιστορία"]}}, '
+                     "χωρίς επιπλέον εξηγήσεις ή σχόλια χρονισμού.")
         
         prompt = f"""
-        Γράψε μια συναισθηματική ιστορία ακριβώς {duration} δευτερολέπτων για {topic}.
+        {intro}
 
         Δομή και Χρονισμός:
         - Η ιστορία ΠΡΕΠΕΙ να έχει ΑΚΡΙΒΩΣ {optimal_sentences} προτάσεις (ΟΧΙ ΠΕΡΙΣΣΟΤΕΡΕΣ, ΟΧΙ ΛΙΓΟΤΕΡΕΣ)
@@ -41,57 +230,122 @@ class GreekStoryGenerator:
         - ΥΠΟΧΡΕΩΤΙΚΑ γράψε ΟΛΕΣ τις {optimal_sentences} προτάσεις - ΜΗΝ σταματήσεις νωρίτερα
         - Κάθε πρόταση πρέπει να τελειώνει με τελεία και να είναι ολοκληρωμένη
 
-        Επέστρεψε μόνο το κείμενο της ιστορίας, χωρίς επιπλέον εξηγήσεις ή σχόλια χρονισμού.
+        {reply}
+        """
+        
+        request = dict(
+            model="gpt-4",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT if count is None else BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=800 * (count or 1),
+            temperature=0.7,
+            n=Config.STORY_CANDIDATES if count is None else 1
+        )
+        if seed is not None:
+            request["seed"] = seed
+        return request
+    
+    def _pick_story(self, candidates, topic, duration, attempt, seed):
+        """The first candidate that passes _check_story (None if none does); records the outcome."""
+        outcomes = []
+        story = None
+        for content in candidates:
+            story, problem, predicted = self._check_story(content, duration)
+            outcomes.append({"problem": problem, "predicted": None if predicted is None else round(predicted, 1)})
+            if story:
+                break
+        self._record_attempt(topic, duration, attempt, seed, outcomes=outcomes, received=len(candidates))
+        return story
+    
+    def _check_story(self, content, duration):
+        """Clean up a generated story and check it: (story, None, predicted seconds)
+        if it passes, (None, problem, predicted seconds or None) if not.
+        
+        A story that passes is added to the near-duplicate index, so later
+        candidates (even in the same batch) are checked against it too.
         """
+        optimal_sentences = STORY_SENTENCES
+        story = (content or "").strip()
+        
+        # Clean up any remaining timing annotations or numbering
+        story = re.sub(r'\d+\.\s*', '', story)  # Remove numbering
+        story = re.sub(r'\(\d+\s*δευτ\.\)', '', story)  # Remove timing
+        story = re.sub(r'[""]', '', story)  # Remove quotes
+        story = re.sub(r'\s+', ' ', story)  # Fix spacing
+        story = story.strip()
+        
+        # Verify we have complete sentences (a few extra are fine)
+        sentences = story.split('.')
+        sentences = [s.strip() for s in sentences if s.strip()]
+        if len(sentences) < optimal_sentences:
+            return None, f"{len(sentences)} sentences instead of {optimal_sentences}", None
+        
+        # A story cut off mid-sentence (e.g. at max_tokens) has no closing punctuation
+        if not STORY_ENDING.search(story):
+            return None, "unfinished last sentence", None
+        
+        # Predict the narration length before paying for TTS and rendering
+        length_ok, predicted = narration_length.check_length(story, duration)
+        if not length_ok:
+            return None, f"narrated in about {predicted:.0f}s instead of {duration}s", predicted
+        
+        # Reject near-duplicates of any earlier story before TTS and rendering are paid for
+        if self.story_index is not None:
+            duplicate = self.story_index.find_duplicate(story, exempt=self._cached_ids)
+            if duplicate:
+                return None, f"near-duplicate of an earlier story ({duplicate[1]:.0%} similar)", predicted
+            # Once served again, the story is not exempt again within this run
+            self._cached_ids.discard(self.story_index.add(story))
         
+        return story, None, predicted
+    
+    def _record_attempt(self, topic, duration, attempt, seed, outcomes=(), received=0, error=None, batch=False):
+        """Print a call's outcome and append it to Config.STORY_ATTEMPTS_LOG.
+        
+        outcomes holds the checked stories of the received ones: candidates
+        up to the accepted one, or every story of a batch.
+        """
+        accepted = [index for index, outcome in enumerate(outcomes) if outcome["problem"] is None]
+        problems = "; ".join(outcome["problem"] for outcome in outcomes if outcome["problem"] is not None)
+        if error is not None:
+            summary = f"failed: {error}"
+        elif batch:
+            summary = f"{len(accepted)}/{received} stories accepted" + (f", rejected: {problems}" if problems else "")
+        elif accepted:
+            summary = f"candidate {accepted[0] + 1}/{received} accepted"
+        else:
+            summary = f"rejected: {problems}"
+        print(f"📝 Story call {attempt + 1}/{Config.STORY_RETRIES + 1}: {summary}")
+        
+        record = {
+            "time": time.time(),
+            "topic": topic,
+            "duration": duration,
+            "attempt": attempt,
+            "seed": seed,
+            "backend": self.backend.name,
+            "batch": batch,
+            "received": received,
+            "candidates": list(outcomes),
+            "accepted": accepted,
+            "error": None if error is None else str(error)
+        }
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "Είσαι ένας ειδικός συγγραφέας ελληνικών ιστοριών για social media. Δημιουργείς πλήρεις, συναισθηματικές ιστορίες 50-60 δευτερολέπτων για βίντεο. Κάθε πρόταση είναι υπολογισμένη να διαβάζεται σε περίπου 5 δευτερόλεπτα. Χρησιμοποιείς πλήρεις, περιεκτικές προτάσεις. Επιστρέφεις μόνο το καθαρό κείμενο της ιστορίας, χωρίς σχόλια. ΠΑΝΤΑ τελειώνεις την ιστορία με την 12η πρόταση και ΠΑΝΤΑ κλείνεις με τελεία. ΑΠΑΓΟΡΕΥΕΤΑΙ να κόψεις την ιστορία στη μέση."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=800,
-                temperature=0.7
-            )
-            
-            story = response.choices[0].message.content.strip()
-            
-            # Clean up any remaining timing annotations or numbering
-            story = re.sub(r'\d+\.\s*', '', story)  # Remove numbering
-            story = re.sub(r'\(\d+\s*δευτ\.\)', '', story)  # Remove timing
-            story = re.sub(r'[""]', '', story)  # Remove quotes
-            story = re.sub(r'\s+', ' ', story)  # Fix spacing
-            story = story.strip()
-            
-            # Verify we have complete sentences - if not, regenerate
-            sentences = story.split('.')
-            sentences = [s.strip() for s in sentences if s.strip()]
-            if len(sentences) != optimal_sentences:
-                print(f"Warning: Story has {len(sentences)} sentences instead of {optimal_sentences}")
-                # Try to regenerate with more explicit instructions
-                if len(sentences) < optimal_sentences:
-                    print("Story too short, attempting regeneration...")
-                    return self.generate_story(topic, duration)  # Retry once
-            
-            # Ensure the story ends with a period
-            if not story.endswith('.'):
-                story += '.'
-            
-            return story
-            
-        except Exception as e:
-            print(f"Σφάλμα στη δημιουργία ιστορίας: {e}")
-            return None
+            directory = os.path.dirname(Config.STORY_ATTEMPTS_LOG)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _lock, open(Config.STORY_ATTEMPTS_LOG, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not record story attempt: {e}")
     
     def generate_story_variations(self, topic, count=3):
-        """Generate multiple story variations for the same topic."""
-        stories = []
-        for i in range(count):
-            story = self.generate_story(topic)
-            if story:
-                stories.append(story)
-        return stories
+        """Generate multiple story variations for the same topic, several per request."""
+        async def collect():
+            return [story async for _, story in self.generate_story_batches(topic, count) if story]
+        return asyncio.run(collect())
     
     def get_story_themes(self):
         """Return a list of popular Greek story themes for social media."""
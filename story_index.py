@@ -0,0 +1,169 @@
+"""
+Near-duplicate detection for generated stories (MinHash with LSH banding).
+
+Stories are reduced to word 3-gram shingles after case folding and accent
+stripping ("Θάλασσα" and "θαλασσα" are the same word), and each story to a
+MinHash signature of NUM_PERM values: the share of equal values between
+two signatures estimates the Jaccard similarity of their shingle sets.
+Signatures are split into BANDS bands whose hashes are kept in memory
+buckets, so a new story is only compared with the few stories sharing a
+bucket. Checking a story against the whole corpus takes well under a
+millisecond.
+
+The index is an append-only JSON lines file (one signature per story), so
+adding a story never rewrites it and processes generating stories in
+parallel see each other's additions.
+
+    python story_index.py output/stories/*.txt   # index existing stories
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+import numpy as np
+from config import Config
+
+_lock = threading.Lock()
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: stories about 40% similar or more share a bucket
+ROWS = NUM_PERM // BANDS
+PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, PRIME, size=NUM_PERM).astype(np.uint64)[:, None]
+_B = _rng.randint(0, PRIME, size=NUM_PERM).astype(np.uint64)[:, None]
+WORD = re.compile(r"\w+")
+COMBINING = re.compile(r"[\u0300-\u036f]+")  # Accents and diaeresis once decomposed
+
+def normalize_words(text):
+    """Words of text, case folded and without accents (final sigma folds to σ)."""
+    return WORD.findall(COMBINING.sub("", unicodedata.normalize('NFD', text)).casefold())
+
+def shingles(words):
+    """Hashes of the SHINGLE_WORDS-grams of normalized words."""
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    return np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype=np.uint64)
+
+def minhash(words):
+    """MinHash signature (NUM_PERM uint32 values) of normalized words."""
+    hashes = shingles(words)
+    return ((_A * hashes[None, :] + _B) % PRIME).min(axis=1).astype(np.uint32)
+
+def story_id(words):
+    """Stable id of a story: a hash of its normalized words."""
+    return hashlib.sha256(" ".join(words).encode('utf-8')).hexdigest()[:16]
+
+class StoryIndex:
+    def __init__(self, path=None, threshold=None):
+        """path: the JSON lines index (default Config.STORY_INDEX_PATH).
+        threshold: estimated Jaccard similarity from which stories are duplicates."""
+        self.path = path or Config.STORY_INDEX_PATH
+        self.threshold = Config.DUPLICATE_THRESHOLD if threshold is None else threshold
+        self.signatures = {}
+        self.previews = {}
+        self._buckets = defaultdict(list)
+        self._offset = 0
+        self._refresh()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def find_duplicate(self, text, exempt=()):
+        """(story id, estimated similarity) of the most similar indexed story at or above the threshold, else None.
+
+        A story indexed with exactly the same words is a duplicate with
+        similarity 1.0, unless its id is in exempt (e.g. stories the LLM
+        response cache is expected to serve again).
+        """
+        self._refresh()
+        words = normalize_words(text)
+        own_id = story_id(words)
+        if own_id in self.signatures and own_id not in exempt:
+            return own_id, 1.0
+        signature = minhash(words)
+        best = None
+        for candidate in self._candidates(signature):
+            if candidate == own_id:
+                continue
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def add(self, text):
+        """Index a story; returns its id (already indexed stories are left as they are)."""
+        words = normalize_words(text)
+        new_id = story_id(words)
+        self._refresh()
+        if new_id in self.signatures:
+            return new_id
+        signature = minhash(words)
+        record = {"id": new_id, "signature": signature.tolist(), "time": time.time(), "preview": text[:80]}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _lock:
+            # One short append per story, so concurrent writers never interleave lines
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._insert(new_id, signature, record["preview"])
+        return new_id
+
+    def _candidates(self, signature):
+        found = set()
+        for band in range(BANDS):
+            found.update(self._buckets.get((band, signature[band * ROWS:(band + 1) * ROWS].tobytes()), ()))
+        return found
+
+    def _insert(self, new_id, signature, preview):
+        if new_id in self.signatures:
+            return
+        self.signatures[new_id] = signature
+        self.previews[new_id] = preview
+        for band in range(BANDS):
+            self._buckets[(band, signature[band * ROWS:(band + 1) * ROWS].tobytes())].append(new_id)
+
+    def _refresh(self):
+        """Read lines appended to the index file since the last read (by any process)."""
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # Leave a partly written last line for the next refresh
+        complete = data.rfind(b"\n") + 1
+        self._offset += complete
+        for line in data[:complete].decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+                self._insert(record["id"], np.array(record["signature"], dtype=np.uint32), record.get("preview", ""))
+            except (ValueError, KeyError):
+                continue
+
+def main():
+    index = StoryIndex()
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if story_id(normalize_words(text)) in index.signatures:
+            print(f"♻️ {path}: already indexed")
+            continue
+        duplicate = index.find_duplicate(text)
+        if duplicate:
+            print(f"♊ {path}: {duplicate[1]:.0%} similar to {index.previews[duplicate[0]][:50]}...")
+        index.add(text)
+    print(f"📚 {len(index)} stories indexed in {index.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Caption cues and the SRT, WebVTT and ASS formats they are stored in.
+
+A Cue holds integer millisecond times and its text (lines joined with
+"\\n"; ASS override tags are kept as is). Each format is parsed with a
+single compiled regex pass over the whole file and written with one join,
+so re-timing large batches of caption files costs little more than the
+file I/O. The edit operations (shift, scale, retime) work in place on a
+list of cues.
+
+ASS files are only read here; ass_subtitles.write_ass writes them, since
+they carry the caption style.
+"""
+
+import re
+from pathlib import Path
+
+_TIME = r"(?:(\d+):)?(\d{2}):(\d{2})[,.](\d{3})"
+# Timing line (VTT cue settings ignored), then the text: every following line up to a blank one.
+# Index and identifier lines before the timing line are skipped by not matching them.
+CUE_BLOCK = re.compile(
+    r"^[ \t]*" + _TIME + r"[ \t]*-->[ \t]*" + _TIME + r"[^\n]*((?:\n[ \t]*\S[^\n]*)*)",
+    re.M
+)
+ASS_DIALOGUE = re.compile(
+    r"^Dialogue:[^,]*,(\d+):(\d{2}):(\d{2})\.(\d{2}),(\d+):(\d{2}):(\d{2})\.(\d{2}),(?:[^,\n]*,){6}([^\n]*)$",
+    re.M
+)
+
+class Cue:
+    """One caption: start and end in milliseconds, and its text."""
+    __slots__ = ("start", "end", "text")
+
+    def __init__(self, start, end, text=""):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    @classmethod
+    def from_seconds(cls, start, end, text=""):
+        return cls(max(0, int(round(start * 1000))), max(0, int(round(end * 1000))), text)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __eq__(self, other):
+        if not isinstance(other, Cue):
+            return NotImplemented
+        return (self.start, self.end, self.text) == (other.start, other.end, other.text)
+
+    def __repr__(self):
+        return f"Cue({self.start}, {self.end}, {self.text!r})"
+
+def as_cues(items):
+    """Cue objects from Cues or (start, end, text) tuples in seconds."""
+    return [item if isinstance(item, Cue) else Cue.from_seconds(*item) for item in items]
+
+def _normalize(content):
+    return content.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+
+def parse_srt(content):
+    """Cues of SRT text (WebVTT cue blocks parse the same way)."""
+    cues = []
+    for h1, m1, s1, ms1, h2, m2, s2, ms2, text in CUE_BLOCK.findall(_normalize(content)):
+        cues.append(Cue(
+            ((int(h1 or 0) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(ms1),
+            ((int(h2 or 0) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(ms2),
+            text.strip()
+        ))
+    return cues
+
+parse_vtt = parse_srt
+
+def parse_ass(content):
+    """Cues of an ASS script's Dialogue events, in file order."""
+    cues = []
+    for h1, m1, s1, cs1, h2, m2, s2, cs2, text in ASS_DIALOGUE.findall(_normalize(content)):
+        cues.append(Cue(
+            ((int(h1) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(cs1) * 10,
+            ((int(h2) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(cs2) * 10,
+            text.rstrip()
+        ))
+    return cues
+
+def srt_time(ms):
+    return "%02d:%02d:%02d,%03d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+def vtt_time(ms):
+    return "%02d:%02d:%02d.%03d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+def ass_time(ms):
+    centiseconds = (max(0, ms) + 5) // 10
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+def format_srt(cues):
+    return "".join([
+        f"{index}\n{srt_time(cue.start)} --> {srt_time(cue.end)}\n{cue.text}\n\n"
+        for index, cue in enumerate(cues, 1)
+    ])
+
+def format_vtt(cues):
+    return "WEBVTT\n\n" + "".join([
+        f"{vtt_time(cue.start)} --> {vtt_time(cue.end)}\n{cue.text}\n\n" for cue in cues
+    ])
+
+PARSERS = {".srt": parse_srt, ".vtt": parse_vtt, ".ass": parse_ass, ".ssa": parse_ass}
+FORMATTERS = {".srt": format_srt, ".vtt": format_vtt}
+
+def read(captions_file):
+    """Cues of an .srt, .vtt or .ass file (by extension)."""
+    parser = PARSERS.get(Path(captions_file).suffix.lower())
+    if parser is None:
+        raise ValueError(f"Unsupported caption format: {captions_file}")
+    with open(captions_file, 'r', encoding='utf-8-sig') as f:
+        return parser(f.read())
+
+def write(cues, captions_file):
+    """Write cues to an .srt or .vtt file (by extension); returns its path."""
+    formatter = FORMATTERS.get(Path(captions_file).suffix.lower())
+    if formatter is None:
+        raise ValueError(f"Unsupported caption format for writing: {captions_file}")
+    path = Path(captions_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(formatter(cues))
+    return str(path)
+
+def shift(cues, offset):
+    """Move every cue by offset milliseconds (times stop at zero)."""
+    for cue in cues:
+        cue.start = max(0, cue.start + offset)
+        cue.end = max(0, cue.end + offset)
+    return cues
+
+def scale(cues, factor, origin=0):
+    """Stretch cue times by factor around origin (milliseconds), e.g. to fit a new narration length."""
+    for cue in cues:
+        cue.start = max(0, int(round(origin + (cue.start - origin) * factor)))
+        cue.end = max(0, int(round(origin + (cue.end - origin) * factor)))
+    return cues
+
+def retime(cues, timings):
+    """Give the cues new (start, end) times in seconds, such as speech_timing.time_sentences returns."""
+    for cue, (start, end) in zip(cues, timings):
+        cue.start = max(0, int(round(start * 1000)))
+        cue.end = max(0, int(round(end * 1000)))
+    return cues
+
+def plain_text(cues, separator=" "):
+    """The spoken text of the cues: lines joined, ASS tags and line breaks removed."""
+    return separator.join(
+        " ".join(re.sub(r"\{[^}]*\}", "", cue.text).replace("\\N", "\n").replace("\\n", "\n").split())
+        for cue in cues
+    )
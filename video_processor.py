@@ -1,126 +1,454 @@
 import os
 import subprocess
 from pathlib import Path
-import ffmpeg
+from config import Config
+from background_cache import BackgroundCache
+import mezzanine
+import loop_builder
+import chunked_render
+import media_probe
+import ffmpeg_runner
+import loudness
+import music_bed
+import frame_analysis
+import ass_subtitles
+from encoding_profiles import get_profile
+from output_targets import get_targets, SRT_PLAY_RES_Y
 
 class VideoProcessor:
-    def __init__(self, font_path=None):
-        self.font_path = font_path or "C:/Windows/Fonts/DejaVuSans.ttf"
-        self.ffmpeg_path = "C:/Program Files/ffmpeg-7.1.1-full_build/bin/ffmpeg.exe"
-        self.ffprobe_path = "C:/Program Files/ffmpeg-7.1.1-full_build/bin/ffprobe.exe"
+    def __init__(self, font_path=None, profile=None):
+        self.font_path = font_path or str(Path(Config.FONTS_DIR) / "DejaVuSans.ttf")
+        self.profile = get_profile(profile)
         self._verify_ffmpeg()
+        self.ffmpeg_path = self.toolchain.ffmpeg
+        self.ffprobe_path = self.toolchain.ffprobe
+        self.background_cache = BackgroundCache()
+        self.probe = media_probe.get_probe(self.ffprobe_path)
     
     def _verify_ffmpeg(self):
         """Verify FFmpeg is available"""
         try:
-            subprocess.run([self.ffmpeg_path, '-version'], capture_output=True)
-            print("✅ FFmpeg is available")
-            # Configure ffmpeg-python to use this path
-            ffmpeg._run.DEFAULT_FFMPEG_PATH = self.ffmpeg_path
-            ffmpeg._probe.DEFAULT_FFPROBE_PATH = self.ffprobe_path
-        except Exception as e:
-            raise RuntimeError(f"FFmpeg is not available at {self.ffmpeg_path}. Please install FFmpeg first.") from e
+            self.toolchain = ffmpeg_runner.toolchain()
+        except (RuntimeError, OSError, subprocess.SubprocessError) as e:
+            raise RuntimeError(f"FFmpeg is not available. Please install FFmpeg first or set FFMPEG_PATH.") from e
+        print(f"✅ FFmpeg is available: {self.toolchain.version}")
+        if not self.toolchain.has_libass:
+            print("⚠️ This FFmpeg build has no libass; captions can't be burned in")
+        else:
+            # Limit fontconfig to the bundled fonts and build its cache before the first render
+            ass_subtitles.warm_font_cache(self.toolchain.ffmpeg)
     
-    def prepare_background_video(self, input_video, target_duration, output_path):
-        """Create a looped background video of the target duration"""
+    def prepare_background_video(self, input_video, target_duration, crossfade=None):
+        """Create a seamlessly looped background video of the target duration.
+
+        The clip's loop unit is encoded once and extended to any length by
+        stream copy; both are kept in the background cache, so preparing the
+        same clip again returns the cached file without encoding. A loop
+        unit given as input_video (see prepare_loop_unit) is only extended.
+        """
         try:
-            # Get video duration
-            probe = ffmpeg.probe(input_video)
-            duration = float(probe['streams'][0]['duration'])
-            
-            # Calculate number of loops needed
-            loops_needed = int(target_duration / duration) + 1
-            
-            # Create filter complex for seamless looping
-            stream = ffmpeg.input(input_video)
-            stream = ffmpeg.filter(stream, 'loop', loop=-1)  # Loop infinitely
-            stream = ffmpeg.trim(stream, duration=target_duration)  # Trim to exact duration
-            stream = ffmpeg.setpts(stream, 'PTS-STARTPTS')  # Reset timestamps
-            
-            # Save the looped video
-            stream = ffmpeg.output(
-                stream, 
-                str(output_path),
-                vcodec='libx264',
-                preset='medium',
-                crf=23,
-                video_bitrate='2500k'
-            )
+            if loop_builder.is_loop_unit(input_video):
+                # Crossfading the unit again would cost a second encode and a double fade
+                looped = loop_builder.extend_loop_unit(
+                    input_video,
+                    float(target_duration),
+                    self.ffmpeg_path,
+                    self.ffprobe_path,
+                    self.background_cache
+                )
+            else:
+                looped = loop_builder.build_looped_background(
+                    input_video,
+                    float(target_duration),
+                    crossfade,
+                    self.ffmpeg_path,
+                    self.ffprobe_path,
+                    self.background_cache
+                )
+            if looped:
+                print(f"✅ Video looped successfully: {looped}")
+            return looped
             
-            print(f"🔄 Creating looped video of {target_duration} seconds...")
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-            print(f"✅ Video looped successfully: {output_path}")
-            return str(output_path)
-            
-        except Exception as e:
+        except (subprocess.CalledProcessError, ValueError, OSError) as e:
             print(f"❌ Error creating looped background: {e}")
+            if getattr(e, 'stderr', None):
+                print(f"Stderr: {e.stderr}")
             return None
     
-    def create_final_video(self, background_video, audio_file, captions_file, output_file):
-        """Create the final video with audio and captions"""
+    def prepare_loop_unit(self, input_video, crossfade=None):
+        """Return the clip's seamless loop unit, suitable for -stream_loop renders."""
         try:
+            return loop_builder.build_loop_unit(
+                input_video,
+                crossfade,
+                self.ffmpeg_path,
+                self.ffprobe_path,
+                self.background_cache
+            )
+        except (subprocess.CalledProcessError, ValueError, OSError) as e:
+            print(f"❌ Error creating loop unit: {e}")
+            return None
+    
+    def create_final_video(self, background_video, audio_file, captions_file, output_file, profile=None, music=None):
+        """Create the final video from an already looped background, with audio and captions.
+
+        Same filtergraph as create_video_single_pass, without -stream_loop:
+        the background is expected to cover the narration.
+        """
+        try:
+            profile = get_profile(profile or self.profile)
             print(f"🎬 Creating video: {Path(output_file).name}")
             print("This may take a few minutes...")
             
-            # Prepare filter complex for adding captions
-            filter_complex = [
-                f"subtitles='{captions_file}':force_style='FontName={self.font_path},FontSize=20,PrimaryColour=white,OutlineColour=black,Outline=2'"
+            # Mezzanines already match the final profile, so fps/scale are skipped for them
+            video_filter = ",".join(self._background_filters(background_video, profile) + [
+                self._caption_filter(captions_file, background_video)
+            ])
+            graph = f"[0:v]{video_filter}[v]"
+            audio_input, audio_map, audio_args = audio_file, '1:a', profile.audio_args()
+            music_track = self._music_track(audio_file, music)
+            if music_track:
+                audio_input = self._audio_stem(audio_file, profile, music_track)
+                if not audio_input:
+                    return None
+                audio_args = ['-c:a', 'copy']
+            else:
+                audio_filter = self._loudness_filter(audio_file)
+                if audio_filter:
+                    graph += f";[1:a]{audio_filter}[a]"
+                    audio_map = '[a]'
+            
+            args = [
+                '-i', str(background_video),
+                '-i', str(audio_input),
+                '-filter_complex', graph,
+                '-map', '[v]',
+                '-map', audio_map,
+                *profile.video_args(),
+                *audio_args,
+                '-movflags', '+faststart',
+                '-shortest',
+                '-y', str(output_file)
             ]
             
-            # Create the final video with audio and captions
-            stream = ffmpeg.input(background_video)
-            audio = ffmpeg.input(audio_file)
+            ffmpeg_runner.run_ffmpeg(
+                args,
+                progress=ffmpeg_runner.progress_printer(Path(output_file).name),
+                duration=self._get_video_duration(audio_file),
+                ffmpeg_path=self.ffmpeg_path
+            )
+            return str(output_file)
+            
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Error creating final video: {e}")
+            print(f"Stderr: {e.stderr}")
+            return None
+
+    def create_video_single_pass(self, background_video, audio_file, captions_file, output_file, duration=None, threads=None, profile=None, music=None):
+        """Create the final video in one ffmpeg run, without a looped intermediate.
+
+        The background is looped by the demuxer (-stream_loop) and trimmed to the
+        audio length, then fps, scale, captions and the audio mux share a single
+        filtergraph, so every reel costs one libx264 encode instead of two.
+        threads caps encoder and filter threads when several renders share a box;
+        profile selects draft, final or archive encoding (default: the processor's);
+        music (a track, or True to pick one from the library) adds a ducked music bed.
+        """
+        try:
+            profile = get_profile(profile or self.profile)
+            print(f"🎬 Creating video (single pass, {profile.name}): {Path(output_file).name}")
+            
+            # Trim to the narration length; fall back to -shortest if it can't be probed
+            if duration is None:
+                duration = self._get_video_duration(audio_file)
+                if duration is None:
+                    print("⚠️ Using -shortest instead of an exact trim")
             
-            # Apply filters and combine with audio
-            stream = ffmpeg.filter(stream, 'fps', fps=30)
-            stream = ffmpeg.filter(stream, 'scale', 1080, 1920)  # Portrait mode for social media
-            stream = ffmpeg.filter_complex(stream, filter_complex)
+            video_filter = ",".join(self._background_filters(background_video, profile) + [
+                self._caption_filter(captions_file, background_video)
+            ])
+            graph = f"[0:v]{video_filter}[v]"
+            audio_input, audio_map, audio_args = audio_file, '1:a', profile.audio_args()
+            music_track = self._music_track(audio_file, music)
+            if music_track:
+                # The premixed stem is cached, so the music chain never re-runs here
+                audio_input = self._audio_stem(audio_file, profile, music_track)
+                if not audio_input:
+                    return None
+                audio_args = ['-c:a', 'copy']
+            else:
+                # Second loudnorm pass runs in this same encode (measurement is cached)
+                audio_filter = self._loudness_filter(audio_file)
+                if audio_filter:
+                    graph += f";[1:a]{audio_filter}[a]"
+                    audio_map = '[a]'
             
-            # Output the final video
-            stream = ffmpeg.output(
-                stream,
-                audio,
-                str(output_file),
-                acodec='aac',
-                vcodec='libx264',
-                preset='medium',
-                crf=23,
-                video_bitrate='2500k',
-                audio_bitrate='192k'
-            )
+            args = []
+            if threads:
+                args += ['-filter_threads', str(threads)]
+            args += [
+                '-stream_loop', '-1',    # Loop the background while decoding
+                '-i', str(background_video),
+                '-i', str(audio_input),
+                '-filter_complex', graph,
+                '-map', '[v]',
+                '-map', audio_map,
+                *profile.video_args(),
+                *audio_args,
+                '-movflags', '+faststart'
+            ]
+            if threads:
+                args += ['-threads', str(threads)]
+            args += ['-t', f"{duration:.3f}"] if duration else ['-shortest']
+            args += ['-y', str(output_file)]
             
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+            ffmpeg_runner.run_ffmpeg(
+                args,
+                progress=ffmpeg_runner.progress_printer(Path(output_file).name),
+                duration=duration,
+                ffmpeg_path=self.ffmpeg_path
+            )
             return str(output_file)
             
-        except Exception as e:
+        except subprocess.CalledProcessError as e:
             print(f"❌ Error creating final video: {e}")
+            print(f"Stderr: {e.stderr}")
             return None
 
+    def create_video_chunked(self, background_video, audio_file, captions_file, output_file, duration=None, chunks=None, profile=None, music=None):
+        """Create the final video by encoding GOP-aligned chunks in parallel.
+
+        Opt-in low-latency mode for single reels: wall-clock time drops with
+        the number of cores, at the cost of one stream-copied looped background.
+        """
+        try:
+            profile = get_profile(profile or self.profile)
+            print(f"🎬 Creating video (parallel chunks, {profile.name}): {Path(output_file).name}")
+            if duration is None:
+                duration = self.probe.get_duration(audio_file)
+            
+            looped = self.prepare_background_video(background_video, duration)
+            if not looped:
+                return None
+            
+            video_filter = ",".join(self._background_filters(looped, profile) + [
+                self._caption_filter(captions_file, looped)
+            ])
+            audio_input, audio_filter, audio_args = audio_file, self._loudness_filter(audio_file), None
+            music_track = self._music_track(audio_file, music)
+            if music_track:
+                audio_input = self._audio_stem(audio_file, profile, music_track)
+                if not audio_input:
+                    return None
+                audio_filter, audio_args = None, ['-c:a', 'copy']
+            return chunked_render.render_chunked(
+                looped,
+                audio_input,
+                video_filter,
+                output_file,
+                duration,
+                chunks=chunks,
+                profile=profile,
+                audio_filter=audio_filter,
+                audio_args=audio_args,
+                ffmpeg_path=self.ffmpeg_path,
+                ffprobe_path=self.ffprobe_path
+            )
+            
+        except (subprocess.CalledProcessError, RuntimeError, ValueError) as e:
+            print(f"❌ Error creating final video: {e}")
+            if getattr(e, 'stderr', None):
+                print(f"Stderr: {e.stderr}")
+            return None
+
+    def create_video_multi_output(self, background_video, audio_file, captions_file, output_file,
+                                  targets=None, duration=None, threads=None, profile=None, music=None):
+        """Render several output targets (aspect ratios, cover, preview) in one ffmpeg run.
+
+        The background is decoded, looped and brought to the profile's format
+        once, then split into a crop/scale/caption branch per target. The
+        narration (with its music bed, if any) is encoded to AAC once and
+        stream-copied into every video. Returns {target name: output path}.
+        """
+        try:
+            profile = get_profile(profile or self.profile)
+            targets = get_targets(targets)
+            print(f"🎬 Creating {len(targets)} outputs ({profile.name}): {', '.join(t.name for t in targets)}")
+            
+            # Every output is cut to the narration, so the length must be known
+            if duration is None:
+                duration = self._get_video_duration(audio_file)
+                if duration is None:
+                    return None
+            audio_stem = self._audio_stem(audio_file, profile, self._music_track(audio_file, music))
+            if not audio_stem:
+                return None
+            
+            head = ",".join(self._background_filters(background_video, profile) + [f"split={len(targets)}"])
+            graph = [f"[0:v]{head}" + "".join(f"[b{i}]" for i in range(len(targets)))]
+            outputs = {}
+            output_args = []
+            for i, target in enumerate(targets):
+                filters = []
+                if target.kind == "cover":
+                    filters += [f"trim=start={target.start}", "setpts=PTS-STARTPTS"]
+                filters += target.branch_filters(profile.width, profile.height, profile)
+                if target.captions:
+                    filters.append(self._caption_filter(captions_file, background_video, target))
+                graph.append(f"[b{i}]{','.join(filters) or 'null'}[v{i}]")
+                
+                path = target.output_path(output_file)
+                output_args += ['-map', f"[v{i}]"]
+                if target.kind == "cover":
+                    output_args += ['-frames:v', '1', '-q:v', '2', '-update', '1']
+                else:
+                    output_args += profile.video_args()
+                    output_args += ['-map', '1:a', '-c:a', 'copy'] if target.kind == "video" else ['-an']
+                    output_args += ['-movflags', '+faststart']
+                    if threads:
+                        output_args += ['-threads', str(threads)]
+                    output_args += ['-t', f"{min(duration, target.length or duration):.3f}"]
+                output_args.append(path)
+                outputs[target.name] = path
+            
+            args = ['-y']
+            if threads:
+                args += ['-filter_threads', str(threads)]
+            args += [
+                '-stream_loop', '-1',
+                '-i', str(background_video),
+                '-i', str(audio_stem),
+                '-filter_complex', ";".join(graph),
+                *output_args
+            ]
+            ffmpeg_runner.run_ffmpeg(
+                args,
+                progress=ffmpeg_runner.progress_printer(Path(output_file).name),
+                duration=duration,
+                ffmpeg_path=self.ffmpeg_path
+            )
+            return outputs
+            
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"❌ Error creating outputs: {e}")
+            if getattr(e, 'stderr', None):
+                print(f"Stderr: {e.stderr}")
+            return None
+
+    def _audio_stem(self, audio_file, profile, music_track=None):
+        """Narration (and music bed) encoded once to AAC (cached) for stream copy into renders."""
+        audio_filter = self._loudness_filter(audio_file)
+        if music_track:
+            return music_bed.mixed_stem(
+                audio_file,
+                music_track,
+                profile.audio_args(),
+                audio_filter,
+                self.ffmpeg_path,
+                self.ffprobe_path,
+                self.background_cache
+            )
+        
+        def build(path):
+            ffmpeg_runner.run_ffmpeg(
+                ['-i', str(audio_file), '-vn', *(['-af', audio_filter] if audio_filter else []), *profile.audio_args(), '-y', path],
+                ffmpeg_path=self.ffmpeg_path
+            )
+            return True
+        
+        return self.background_cache.get_or_create(
+            audio_file,
+            build,
+            suffix=".m4a",
+            kind="audio_stem",
+            audio_bitrate=profile.audio_bitrate,
+            loudness=audio_filter
+        )
+
+    def _music_track(self, audio_file, music):
+        """Resolve music (a track path, or True/"auto" to pick from the library) to a file."""
+        if not music:
+            return None
+        if music is True or music == "auto":
+            track = music_bed.pick_track(audio_file, cache=self.background_cache)
+            if not track:
+                print(f"⚠️ No music tracks in {Config.MUSIC_DIR}, using narration only")
+            return track
+        if not os.path.exists(music):
+            print(f"⚠️ Music track not found: {music}, using narration only")
+            return None
+        return str(music)
+
+    def _caption_filter(self, captions_file, background_video, target=None):
+        """subtitles filter burning captions (placed per cue, laid out for target) with the bundled fonts."""
+        placed = self._placed_captions(captions_file, background_video, target)
+        if not placed and target and ass_subtitles.is_ass(captions_file):
+            placed = ass_subtitles.retarget(captions_file, target)
+        return ass_subtitles.subtitles_filter(placed or captions_file, self._caption_force_style(target))
+
+    def _placed_captions(self, captions_file, background_video, target=None):
+        """Captions with per-cue position/contrast tags for this background (None if disabled or failed)."""
+        if not Config.CAPTION_AUTO_PLACEMENT:
+            return None
+        return frame_analysis.place_captions(
+            captions_file,
+            background_video,
+            target=target,
+            ffmpeg_path=self.ffmpeg_path,
+            cache=self.background_cache
+        )
+
+    def _loudness_filter(self, audio_file):
+        """Second-pass loudnorm filter for the narration (None when disabled)."""
+        return loudness.normalization_filter(audio_file, self.ffmpeg_path, self.background_cache)
+
+    def ingest_background(self, input_video):
+        """Normalize a source clip to the render-ready mezzanine format (once)."""
+        return mezzanine.normalize_clip(input_video, self.ffmpeg_path, self.background_cache)
+
+    def _background_filters(self, background_video, profile=None):
+        """fps/scale filters needed to bring a background to the profile's output format."""
+        profile = get_profile(profile or self.profile)
+        if mezzanine.is_normalized(background_video) and profile.matches_mezzanine():
+            return []
+        return profile.scale_filters()
+
+    def _caption_force_style(self, target=None):
+        """ASS style overrides used when burning SRT captions (.ass files carry their own).
+
+        Sizes are in script units, which libass scales with the output height,
+        so the same style renders proportionally in every encoding profile.
+        An output target rescales them for its aspect ratio and sets its margin.
+        """
+        scale = target.caption_scale if target else 1.0
+        style = (
+            f"FontName=DejaVu Sans,FontSize={Config.CAPTION_FONT_SIZE * scale:.3g},"
+            f"PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,Outline={Config.CAPTION_OUTLINE_WIDTH * scale:.3g}"
+        )
+        if target and target.caption_margin is not None:
+            style += f",MarginV={round(target.caption_margin * SRT_PLAY_RES_Y)}"
+        return style
+
+    def _escape_filter_path(self, path):
+        """Escape a file path for use inside an ffmpeg filter argument."""
+        return ass_subtitles.escape_filter_path(path)
+
     def _check_ffmpeg(self):
         """Check if ffmpeg is installed and accessible."""
         try:
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, check=True)
+            ffmpeg_runner.toolchain()
             print("✅ FFmpeg is available")
             return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        except (RuntimeError, OSError, subprocess.SubprocessError):
             print("❌ FFmpeg not found. Please install ffmpeg first.")
             print("Download from: https://ffmpeg.org/download.html")
             return False
     
     def _get_video_duration(self, video_path):
-        """Get the duration of a video file in seconds."""
+        """Get the duration of a media file in seconds (parsed in-process, cached)."""
         try:
-            cmd = [
-                'ffmpeg',
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return float(result.stdout.strip())
-        except (subprocess.CalledProcessError, ValueError) as e:
+            return self.probe.get_duration(video_path)
+        except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as e:
             print(f"⚠️ Could not get video duration: {e}")
             return None
 
@@ -136,8 +464,7 @@ class VideoProcessor:
         # Create a complex filter to loop the video
         filter_complex = f"[0:v]loop={loop_count}:1:0[v];[v]trim=0:{required_duration}[v_trim];[v_trim]setpts=PTS-STARTPTS[v_out]"
         
-        cmd = [
-            'ffmpeg',
+        args = [
             '-i', input_video,
             '-filter_complex', filter_complex,
             '-map', '[v_out]',
@@ -148,7 +475,7 @@ class VideoProcessor:
         
         try:
             print(f"🔄 Looping video to reach {required_duration} seconds...")
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=self.ffmpeg_path)
             print(f"✅ Video looped successfully: {output_path}")
             return str(output_path)
         except subprocess.CalledProcessError as e:
@@ -191,8 +518,7 @@ class VideoProcessor:
             font_path = self._get_greek_font_path()
         
         # Build ffmpeg command
-        cmd = [
-            'ffmpeg',
+        args = [
             '-i', background_video,  # Background video
             '-i', audio_file,        # Greek audio
             '-vf', self._build_subtitle_filter(caption_file, font_path),
@@ -209,7 +535,12 @@ class VideoProcessor:
             print(f"🎬 Δημιουργία βίντεο: {output_filename}")
             print("Αυτό μπορεί να πάρει λίγα λεπτά...")
             
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ffmpeg_runner.run_ffmpeg(
+                args,
+                progress=ffmpeg_runner.progress_printer(output_filename),
+                duration=required_duration,
+                ffmpeg_path=self.ffmpeg_path
+            )
             
             # Clean up temporary looped video if it exists
             if bg_duration < required_duration:
@@ -229,29 +560,22 @@ class VideoProcessor:
     def _build_subtitle_filter(self, caption_file, font_path):
         """Build the subtitle filter for ffmpeg with Greek font support."""
         
-        # Escape the caption file path for ffmpeg
-        escaped_caption_file = caption_file.replace('\\', '\\\\').replace(':', '\\:')
-        
-        subtitle_filter = f"subtitles='{escaped_caption_file}'"
-        
-        if font_path and os.path.exists(font_path):
-            escaped_font_path = font_path.replace('\\', '\\\\')
-            subtitle_filter += f":force_style='FontName=DejaVu Sans,FontSize={Config.CAPTION_FONT_SIZE},PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,Outline={Config.CAPTION_OUTLINE_WIDTH}'"
-        
-        return subtitle_filter
+        # Bundled fonts are passed as fontsdir; .ass captions carry their own style
+        force_style = self._caption_force_style() if font_path and os.path.exists(font_path) else None
+        return ass_subtitles.subtitles_filter(caption_file, force_style)
     
     def _get_greek_font_path(self):
         """Try to find a Greek-compatible font on the system."""
         
         # Common Greek font locations
         possible_fonts = [
+            # Bundled fonts directory
+            str(Path(Config.FONTS_DIR) / "DejaVuSans.ttf"),
+            str(Path(Config.FONTS_DIR) / "greek_font.ttf"),
             # Windows
             "C:/Windows/Fonts/DejaVuSans.ttf",
             "C:/Windows/Fonts/arial.ttf",
             "C:/Windows/Fonts/calibri.ttf",
-            # Local fonts directory
-            str(Path(Config.FONTS_DIR) / "DejaVuSans.ttf"),
-            str(Path(Config.FONTS_DIR) / "greek_font.ttf"),
             # Linux/Mac (if running in WSL or cross-platform)
             "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
             "/System/Library/Fonts/Helvetica.ttc"
@@ -270,8 +594,7 @@ class VideoProcessor:
         
         output_path = Path(Config.OUTPUT_DIR) / output_filename
         
-        cmd = [
-            'ffmpeg',
+        args = [
             '-f', 'lavfi',
             '-i', f'color={color}:size=1080x1920:duration={duration}:rate=30',
             '-c:v', 'libx264',
@@ -282,7 +605,7 @@ class VideoProcessor:
         
         try:
             print(f"🎨 Δημιουργία φόντου βίντεο: {output_filename}")
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=self.ffmpeg_path)
             print(f"✅ Φόντο βίντεο δημιουργήθηκε: {output_path}")
             return str(output_path)
             
@@ -291,22 +614,11 @@ class VideoProcessor:
             return None
     
     def get_video_info(self, video_path):
-        """Get information about a video file."""
-        
-        cmd = [
-            'ffmpeg',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            video_path
-        ]
+        """Get information about a video file (duration, format and streams)."""
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            import json
-            return json.loads(result.stdout)
-        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            return self.probe.probe(video_path)
+        except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as e:
             print(f"Σφάλμα στην ανάλυση βίντεο: {e}")
             return None
     
@@ -315,8 +627,7 @@ class VideoProcessor:
         
         output_path = Path(Config.OUTPUT_DIR) / output_filename
         
-        cmd = [
-            'ffmpeg',
+        args = [
             '-i', video_path,
             '-vn',  # No video
             '-acodec', 'mp3',
@@ -325,7 +636,7 @@ class VideoProcessor:
         ]
         
         try:
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ffmpeg_runner.run_ffmpeg(args, ffmpeg_path=self.ffmpeg_path)
             print(f"🎵 Ήχος εξάχθηκε: {output_path}")
             return str(output_path)
         except subprocess.CalledProcessError as e: